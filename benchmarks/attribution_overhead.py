@@ -0,0 +1,86 @@
+# benchmarks/attribution_overhead.py
+"""
+Cost of tree-path feature attributions (core.explainer.forest_contributions)
+over plain predict_proba on the loaded RandomForest, per batch size, and a
+check that bias + contributions reproduces predict_proba exactly.
+
+    python -m benchmarks.attribution_overhead [batch sizes...]   (default: 1 100 1000)
+
+Rows are drawn from the stored training matrix when there is one, otherwise
+from the test_samples vectors with noise. Exits with status 1 if the
+attributions do not add up to the model's probabilities.
+"""
+import os
+import sys
+import glob
+import time
+
+import numpy as np
+
+from core import classifier
+from core.explainer import forest_contributions, _leaf_paths
+from core.training import TRAINING_X_PATH
+
+REPEATS = 5
+TOLERANCE = 1e-9
+
+
+def _best_ms(fn, repeats=REPEATS):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def sample_rows(n, rng):
+    member = classifier.members[0]
+    width = member.scaler.mean_.shape[0]
+    if os.path.exists(TRAINING_X_PATH):
+        X = np.load(TRAINING_X_PATH, mmap_mode="r")
+        if X.shape[1] == width:
+            return np.asarray(X[rng.integers(0, len(X), n)], dtype=np.float64)
+    paths = [p for p in sorted(glob.glob("test_samples/*")) if os.path.isfile(p)]
+    base = np.array([member.vector(classifier.vector_parts({}, p)) for p in paths], dtype=np.float64)
+    rows = base[rng.integers(0, len(base), n)]
+    return rows * rng.uniform(0.5, 1.5, rows.shape)
+
+
+def main(sizes):
+    model = classifier.members[0].model
+    if model is None:
+        print("[!] No model loaded")
+        return 1
+    rng = np.random.default_rng(0)
+
+    start = time.perf_counter()
+    _leaf_paths(model)
+    print(f"[+] Leaf path table: {(time.perf_counter() - start) * 1000:.1f} ms once per loaded model "
+          f"({len(model.estimators_)} trees, {model.n_features_in_} features, {model.n_classes_} classes)\n")
+
+    header = f"{'batch':>6} {'proba ms':>9} {'attrib ms':>10} {'overhead':>9} {'per sample':>11} {'max error':>10}"
+    print(header)
+    print("-" * len(header))
+    worst = 0.0
+    for n in sizes:
+        X = classifier.members[0].scaler.transform(sample_rows(n, rng))
+        proba_ms = _best_ms(lambda: model.predict_proba(X))
+        attrib_ms = _best_ms(lambda: forest_contributions(model, X))
+        bias, contributions = forest_contributions(model, X)
+        error = float(np.abs(bias + contributions.sum(axis=1) - model.predict_proba(X)).max())
+        worst = max(worst, error)
+        print(f"{n:>6} {proba_ms:>9.2f} {attrib_ms:>10.2f} {attrib_ms / proba_ms:>+8.0%} "
+              f"{attrib_ms / n:>8.3f} ms {error:>10.1e}")
+
+    # predict_batch still takes the probabilities from predict_proba and runs
+    # the attributions on top, so the overhead is the whole attribution column.
+    if worst > TOLERANCE:
+        print(f"\n[!] Attributions do not reproduce predict_proba (max error {worst:.1e})")
+        return 1
+    print(f"\n[+] Attributions are exact (max error {worst:.1e})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main([int(n) for n in sys.argv[1:]] or [1, 100, 1000]))
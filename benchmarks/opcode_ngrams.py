@@ -0,0 +1,80 @@
+# benchmarks/opcode_ngrams.py
+"""
+Per-sample latency of the hashed opcode n-gram block against its budget
+(core.opcodes.LATENCY_BUDGET_MS), next to the existing extract_assembly pass.
+
+    python -m benchmarks.opcode_ngrams [files...]   (default: test_samples/* plus synthetic worst cases)
+
+The budget applies to the first call on each sample (cold: a scan sees
+every sample once); the best of REPEATS warm calls is shown next to it.
+Exits with status 1 if any sample's first call exceeds the budget.
+"""
+import os
+import sys
+import glob
+import time
+
+import numpy as np
+
+from core.features import extract_assembly
+from core.opcodes import opcode_ngram_vector, LATENCY_BUDGET_MS, DEFAULT_WIDTH
+
+REPEATS = 5
+
+
+def synthetic_cases():
+    """Inputs with no usable headers, where the whole buffer is treated as code."""
+    rng = np.random.default_rng(0)
+    return [
+        ("random-64MB", rng.integers(0, 256, 64 * 1024 * 1024, dtype=np.uint8).tobytes()),
+        ("nop-sled-16MB", b"\x90" * (16 * 1024 * 1024)),
+        ("invalid-16MB", b"\x0f\x0b\xff\xff" * (4 * 1024 * 1024)),
+    ]
+
+
+def _timings_ms(fn, repeats=REPEATS):
+    """(first call, best of `repeats` calls) in ms."""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times[0] * 1000, min(times) * 1000
+
+
+def main(paths):
+    cases = []
+    for path in paths:
+        with open(path, "rb") as f:
+            cases.append((os.path.basename(path), f.read()))
+    if not paths:
+        cases = [(os.path.basename(p), open(p, "rb").read())
+                 for p in sorted(glob.glob("test_samples/*")) if os.path.isfile(p)]
+        cases += synthetic_cases()
+
+    header = f"{'sample':<24} {'size MB':>8} {'cold ms':>8} {'warm ms':>8} {'asm ms':>9} {'nonzero':>8}"
+    print(header)
+    print("-" * len(header))
+    latencies = []
+    for name, content in cases:
+        cold_ms, warm_ms = _timings_ms(lambda: opcode_ngram_vector(content))
+        # extract_assembly walks the full buffer with instruction objects; time it once
+        asm_ms = _timings_ms(lambda: extract_assembly(content), repeats=1)[0] \
+            if len(content) < 4 * 1024 * 1024 else None
+        nonzero = np.count_nonzero(opcode_ngram_vector(content))
+        latencies.append(cold_ms)
+        print(f"{name[:24]:<24} {len(content) / 1e6:>8.2f} {cold_ms:>8.2f} {warm_ms:>8.2f} "
+              f"{asm_ms if asm_ms is None else round(asm_ms, 2)!s:>9} {nonzero:>5}/{DEFAULT_WIDTH}")
+
+    latencies = np.array(latencies)
+    print(f"\n[+] Opcode n-grams, first call: p50 {np.percentile(latencies, 50):.2f} ms, "
+          f"p95 {np.percentile(latencies, 95):.2f} ms, max {latencies.max():.2f} ms "
+          f"(budget {LATENCY_BUDGET_MS:.0f} ms per sample)")
+    if latencies.max() > LATENCY_BUDGET_MS:
+        print("[!] Latency budget exceeded")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
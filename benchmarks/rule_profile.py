@@ -0,0 +1,52 @@
+# benchmarks/rule_profile.py
+"""
+Per-rule match time of a rule set over a set of samples, slowest first.
+
+    python -m benchmarks.rule_profile [--rules behaviors] [files/dirs...]   (default: test_samples/*)
+
+Extraction runs once per sample up front, so the table only measures rule
+evaluation: the shared literal pass per scope plus each rule's own regexes and
+condition.
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+
+from core.features import extract_features_from_file
+from core.analysis import format_features
+from core.pipeline import iter_sample_paths
+from core.rules import get_ruleset
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Profile rule evaluation")
+    parser.add_argument("--rules", default="behaviors", help="Rule file under rules/ (default: behaviors)")
+    parser.add_argument("--top", type=int, default=15, help="Rows to show (default: 15)")
+    parser.add_argument("paths", nargs="*")
+    args = parser.parse_args(argv)
+
+    paths = list(iter_sample_paths(args.paths)) if args.paths else \
+        sorted(p for p in glob.glob("test_samples/*") if os.path.isfile(p))
+    ruleset = get_ruleset(args.rules)
+    samples = [(p, format_features(extract_features_from_file(p) or {})) for p in paths]
+
+    start = time.perf_counter()
+    matched = 0
+    for path, features in samples:
+        matched += len(ruleset.match(path, features))
+    elapsed = time.perf_counter() - start
+    total_mb = sum(os.path.getsize(p) for p, _ in samples) / 1e6
+
+    print(f"[+] {len(ruleset)} rules x {len(samples)} samples ({total_mb:.1f} MB): "
+          f"{elapsed * 1000:.1f} ms, {matched} matches")
+    header = f"{'rule':<28} {'calls':>6} {'total ms':>9} {'mean ms':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, calls, total, mean_ms in ruleset.profile(args.top):
+        print(f"{name[:28]:<28} {calls:>6} {total * 1000:>9.2f} {mean_ms:>8.3f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,64 @@
+# benchmarks/string_storage.py
+"""
+Memory and report size of extracted strings: plain list of str vs StringTable.
+
+    python -m benchmarks.string_storage [files...]   (default: test_samples/*)
+"""
+import os
+import sys
+import glob
+import json
+import time
+import tracemalloc
+
+from core.features import _extract_strings, is_ignored_string
+from core.report_generator import DEFAULT_STRING_LIMIT
+
+
+def legacy_extract_strings(binary_data, min_len=4):
+    """The previous per-byte extractor, kept here as the baseline."""
+    result = []
+    current = ""
+    for b in binary_data:
+        if 32 <= b <= 126:
+            current += chr(b)
+        else:
+            if len(current) >= min_len and not is_ignored_string(current):
+                result.append(current)
+            current = ""
+    if len(current) >= min_len and not is_ignored_string(current):
+        result.append(current)
+    return result
+
+
+def _measure(build):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, retained, peak, elapsed
+
+
+def main(paths):
+    header = (f"{'file':<24} {'strings':>8} {'unique':>7} {'list MB':>8} {'table MB':>9} "
+              f"{'list s':>7} {'table s':>8} {'report KB (all)':>16} {'report KB (top)':>16}")
+    print(header)
+    print("-" * len(header))
+    for path in paths:
+        with open(path, "rb") as f:
+            content = f.read()
+
+        as_list, list_mem, _, list_time = _measure(lambda: legacy_extract_strings(content))
+        table, table_mem, _, table_time = _measure(lambda: _extract_strings(content))
+
+        full_report = len(json.dumps(as_list, indent=4))
+        bounded_report = len(json.dumps(table.to_report(DEFAULT_STRING_LIMIT), indent=4))
+        print(f"{os.path.basename(path)[:24]:<24} {len(as_list):>8} {table.unique_count:>7} "
+              f"{list_mem / 1e6:>8.2f} {table_mem / 1e6:>9.2f} {list_time:>7.3f} {table_time:>8.3f} "
+              f"{full_report / 1024:>16.1f} {bounded_report / 1024:>16.1f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or sorted(p for p in glob.glob("test_samples/*") if os.path.isfile(p)))
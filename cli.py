@@ -1,69 +1,259 @@
+import os
 import argparse
-from core.features import extract_features_from_file
-from core.classifier import predict_family, predict_proba
-from core.parser import extract_functions
-from core.deobfuscator import explain_code
-from core.report_generator import generate_json_report
-from core.utils import get_sha256
+from core.analysis import analyze_sample, format_features  # noqa: F401  (format_features kept for callers)
+from core.report_generator import write_json_report, DEFAULT_STRING_LIMIT
+from core.supervisor import SupervisedPool, DEFAULT_WALL_TIME, DEFAULT_CPU_TIME, DEFAULT_RSS_MB, DEFAULT_MAX_TASKS
+from core.workqueue import DEFAULT_QUEUE_PATH, DEFAULT_LEASE, DEFAULT_CLAIM_BATCH
+from core.report_store import DEFAULT_STORE_PATH, PROTOCOLS
+from core.scheduler import Scheduler, CostModel, parse_priorities, DEFAULT_HISTORY_PATH, FAST_LANE_MS
+from core.batch_summary import DEFAULT_SUMMARY_BASE, FORMATS
 
-def format_features(raw_features):
-    """
-    Convert raw extracted features into a dictionary compatible with classifier.
-    Ensures all keys exist and sets are converted to lists.
-    """
-    feature_dict = {}
 
-    if not isinstance(raw_features, dict):
-        # If it's a set or list, wrap it as a dictionary under a default key
-        raw_features = {"strings": list(raw_features)}
-
-    for key in ("protocols", "permissions", "files", "strings", "imports"):
-        value = raw_features.get(key, [])
-        # Convert sets to lists
-        if isinstance(value, set):
-            value = list(value)
-        feature_dict[key] = value
-
-    return feature_dict
-
-
-def predict(file_path):
+def predict(file_path, string_limit=DEFAULT_STRING_LIMIT, string_sampling="top", pool=None,
+            store=None, json_report=True, sha256=None):
     print(f"[+] Analyzing {file_path}")
 
-    # Step 1: Extract features
-    raw_features = extract_features_from_file(file_path)
-    if not raw_features:
-        print("[!] No features extracted. Unsupported or binary-only file.")
-        raw_features = {}  # fallback to empty
-    features = format_features(raw_features)
+    if pool is not None:
+        report = pool.submit(file_path, sha256=sha256).result()
+    else:
+        report = analyze_sample(file_path, sha256, string_limit=string_limit, string_sampling=string_sampling)
+    if json_report:
+        write_json_report(report)
+    if store is not None:
+        store.add(report)
 
-    # Step 2: Model prediction
-    family = predict_family(features, file_path)
-    confidence = predict_proba(features, file_path)
+    prediction = report["prediction"]
+    print(f"[+] Predicted Malware Family: {prediction['malware_family']} "
+          f"(Confidence: {prediction['confidence']:.2f})")
+    if "file_type" in report:
+        timings = report.get("timings", {})
+        print(f"[+] File type: {report['file_type']['kind']} ({report['file_type']['route']} extractor, "
+              f"{(timings.get('sniff', 0) + timings.get('extract', 0)) * 1000:.1f} ms)")
+    for layer in report.get("decode_chain", []):
+        print(f"[+] Decoded layer {layer['depth']}: {layer['encoding']} -> {layer['kind']} ({layer['size']} bytes"
+              f"{', truncated' if layer['truncated'] else ''})")
+    print("[+] JSON Report generated." if json_report else f"[+] Report stored in {store.path}")
+    return report
 
-    # Step 3: Extract code functions & explanations if file is Python
-    try:
-        with open(file_path, "r", errors="ignore") as f:
-            code = f.read()
-            functions = extract_functions(code)
-            explanation = explain_code(code)
-    except Exception:
-        functions = []
-        explanation = "Binary executable – static code explanation not available."
 
+def run_query(args):
+    import json
+    import time
+    from core.report_store import ReportStore, format_rows
 
-    # Step 4: SHA256
-    sha256 = get_sha256(file_path)
-
-    # Step 5: Generate report
-    generate_json_report(file_path, features, functions, explanation, family, confidence, sha256)
-
-    print(f"[+] Predicted Malware Family: {family} (Confidence: {confidence:.2f})")
-    print("[+] JSON Report generated.")
+    with ReportStore(args.store or DEFAULT_STORE_PATH) as store:
+        start = time.perf_counter()
+        try:
+            rows = store.query(family=args.family, min_confidence=args.min_confidence,
+                               max_confidence=args.max_confidence, risk_level=args.risk, since=args.since,
+                               until=args.until, sha256=args.sha256, file_type=args.type, protocol=args.protocol,
+                               string=args.string, imported=args.imported, match=args.match,
+                               limit=args.limit, full=args.json)
+        except ValueError as e:
+            print(f"[!] {e}")
+            return
+        elapsed = time.perf_counter() - start
+    if args.json:
+        print(json.dumps([r["report"] for r in rows], indent=4))
+    else:
+        print(format_rows(rows))
+        print(f"[+] {len(rows)} reports in {elapsed * 1000:.1f} ms"
+              + (f" (limit {args.limit})" if args.limit and len(rows) == args.limit else ""))
 
 # Entry point
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Malware analyzer")
-    parser.add_argument("--file", required=True, help="Path to malware sample file")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--file", help="Path to malware sample file")
+    source.add_argument("--watch", nargs="+", metavar="DIR",
+                        help="Watch inbox directories and analyze samples as they arrive")
+    source.add_argument("--batch", nargs="+", metavar="PATH",
+                        help="Analyze every file under these files/directories with the async pipeline")
+    source.add_argument("--enqueue", nargs="+", metavar="PATH_OR_SHA256",
+                        help="Add samples (files, directories or SHA-256s under --sample-root) to the shared queue")
+    source.add_argument("--queue-worker", action="store_true",
+                        help="Claim and analyze samples from the shared queue until no job is queued or leased")
+    source.add_argument("--queue-status", action="store_true", help="Print the shared queue's job counts")
+    source.add_argument("--query", action="store_true",
+                        help="Search the report store (see the report store options)")
+    source.add_argument("--import-reports", nargs="*", metavar="PATH",
+                        help="Bulk-import JSON reports (default: reports/) into the report store")
+    source.add_argument("--summary", nargs="+", metavar="PATH",
+                        help="Summarize reports (JSON/JSONL files, directories, or report stores named explicitly) into one run summary")
+    parser.add_argument("--max-strings", type=int, default=DEFAULT_STRING_LIMIT,
+                        help=f"Strings kept in the report (default: {DEFAULT_STRING_LIMIT}, 0 = all)")
+    parser.add_argument("--string-sampling", choices=["top", "reservoir"], default="top",
+                        help="Report the most frequent strings (top) or a uniform reservoir sample")
+    parser.add_argument("--workers", type=int,
+                        help="Analysis workers (default: 2 for --watch, all cores for --batch)")
+    limits = parser.add_argument_group("per-sample limits (--batch, --watch, --file --isolate)")
+    limits.add_argument("--time-limit", type=float, default=DEFAULT_WALL_TIME,
+                        help=f"Wall-clock seconds per sample before its worker is killed (default: {DEFAULT_WALL_TIME:g}, 0 = none)")
+    limits.add_argument("--cpu-limit", type=int, default=DEFAULT_CPU_TIME,
+                        help=f"CPU seconds per sample (default: {DEFAULT_CPU_TIME}, 0 = none)")
+    limits.add_argument("--memory-limit", type=int, default=DEFAULT_RSS_MB,
+                        help=f"Worker RSS limit in MB (default: {DEFAULT_RSS_MB}, 0 = none)")
+    limits.add_argument("--max-tasks-per-worker", type=int, default=DEFAULT_MAX_TASKS,
+                        help=f"Samples before a worker is recycled (default: {DEFAULT_MAX_TASKS}, 0 = never)")
+    limits.add_argument("--isolate", action="store_true",
+                        help="With --file, also analyze in a supervised worker under the limits above")
+    scheduling = parser.add_argument_group("scheduling (--batch, --watch, --queue-worker)")
+    scheduling.add_argument("--fast-lane-ms", type=float, default=FAST_LANE_MS,
+                            help=f"Samples estimated below this take the fast lane (default: {FAST_LANE_MS:g})")
+    scheduling.add_argument("--fast-workers", type=int,
+                            help="Workers that serve the fast lane first (default: a quarter, at least 1)")
+    scheduling.add_argument("--priority", action="append", metavar="PATH=LEVEL",
+                            help="Samples under PATH (e.g. an analyst inbox) go to priority lane LEVEL >= 1, "
+                                 "highest first; repeatable")
+    scheduling.add_argument("--lookahead", type=int,
+                            help="Samples handed to the scheduler ahead of the workers (default: 4 x workers; at least 64 for --batch, 16 for --watch)")
+    scheduling.add_argument("--cost-history", default=DEFAULT_HISTORY_PATH,
+                            help=f"Per-type timing history used to estimate cost (default: {DEFAULT_HISTORY_PATH})")
+    batch = parser.add_argument_group("batch mode")
+    batch.add_argument("--queue-size", type=int,
+                       help="Bound of each inter-stage queue (default: 2 x workers)")
+    batch.add_argument("--readers", type=int, default=4,
+                       help="Concurrent file reads/hashes (default: 4)")
+    distributed = parser.add_argument_group("distributed mode (--enqueue, --queue-worker, --queue-status)")
+    distributed.add_argument("--queue", default=DEFAULT_QUEUE_PATH,
+                             help=f"SQLite queue file, on storage every node can reach (default: {DEFAULT_QUEUE_PATH})")
+    distributed.add_argument("--sample-root",
+                             help="Sample directory: --enqueue stores SHA-256s and paths under it relative to it, "
+                                  "and each --queue-worker resolves them against its own copy")
+    distributed.add_argument("--lease", type=float, default=DEFAULT_LEASE,
+                             help=f"Seconds a claimed job stays leased without a heartbeat (default: {DEFAULT_LEASE:g})")
+    distributed.add_argument("--claim-batch", type=int, default=DEFAULT_CLAIM_BATCH,
+                             help=f"Jobs claimed per queue transaction (default: {DEFAULT_CLAIM_BATCH})")
+    distributed.add_argument("--keep-polling", action="store_true",
+                             help="Keep a --queue-worker running when the queue is empty")
+    distributed.add_argument("--retry-failed", action="store_true",
+                             help="With --enqueue or --queue-status, put failed jobs back in the queue")
+    reports = parser.add_argument_group("report store (--query, --import-reports; --store with any analysis mode)")
+    reports.add_argument("--store", nargs="?", const=DEFAULT_STORE_PATH, metavar="PATH",
+                         help=f"Also write reports into this indexed SQLite store (default: {DEFAULT_STORE_PATH})")
+    reports.add_argument("--no-json-reports", action="store_true",
+                         help="With --store, write reports only into the store, not reports/*.json")
+    reports.add_argument("--family", help="Only this predicted family")
+    reports.add_argument("--min-confidence", type=float, help="Only confidence >= this")
+    reports.add_argument("--max-confidence", type=float, help="Only confidence below this")
+    reports.add_argument("--risk", help="Only this risk level")
+    reports.add_argument("--since", help="Only scans since a time: 30d, 12h, 2024-05-01, ...")
+    reports.add_argument("--until", help="Only scans before a time (same formats as --since)")
+    reports.add_argument("--sha256", help="Only this sample")
+    reports.add_argument("--type", help="Only this detected file type (pe, elf, python, ...)")
+    reports.add_argument("--protocol", type=str.upper, choices=PROTOCOLS, help="Only samples with this protocol")
+    reports.add_argument("--string", help="Only samples with this phrase in their strings")
+    reports.add_argument("--imported", metavar="NAME", help="Only samples importing this library/module")
+    reports.add_argument("--match", metavar="FTS5_QUERY",
+                         help="Raw FTS5 query over strings, imports, protocols, behaviors and rules")
+    reports.add_argument("--limit", type=int, default=50, help="Reports shown (default: 50, 0 = all)")
+    reports.add_argument("--json", action="store_true", help="Print the full stored reports as JSON")
+    reports.add_argument("--jobs", type=int, help="Processes parsing reports for --import-reports (default: all cores)")
+    summaries = parser.add_argument_group("run summary (--summary; --summary-out with --batch)")
+    summaries.add_argument("--summary-out", metavar="BASE",
+                           help=f"Write the summary to BASE.txt/.html/.pdf (default for --summary: {DEFAULT_SUMMARY_BASE})")
+    summaries.add_argument("--summary-formats", default=",".join(FORMATS),
+                           help=f"Comma-separated summary formats (default: {','.join(FORMATS)})")
+    watch = parser.add_argument_group("watch mode")
+    watch.add_argument("--poll-interval", type=float, default=2.0,
+                       help="Seconds between directory scans when polling (default: 2)")
+    watch.add_argument("--settle", type=float, default=2.0,
+                       help="Seconds a file must stay unchanged before it is analyzed (default: 2)")
+    watch.add_argument("--no-inotify", action="store_true", help="Always poll, even where inotify exists")
+    watch.add_argument("--metrics-file", default="reports/watch_metrics.json",
+                       help="Where queue depth and latency metrics are written")
+    watch.add_argument("--metrics-interval", type=float, default=30.0,
+                       help="Seconds between metrics updates (default: 30)")
     args = parser.parse_args()
-    predict(args.file)
+    string_limit = args.max_strings or None
+    limit_options = {"wall_time": args.time_limit or None, "cpu_time": args.cpu_limit or None,
+                     "rss_mb": args.memory_limit or None, "max_tasks": args.max_tasks_per_worker or None}
+    if args.no_json_reports and not args.store:
+        parser.error("--no-json-reports needs --store")
+    store = None
+    if args.store and not (args.query or args.import_reports is not None):
+        from core.report_store import ReportStore
+        store = ReportStore(args.store)
+    json_report = not args.no_json_reports
+    try:
+        scheduler_options = {"cost_model": CostModel(args.cost_history), "fast_lane_ms": args.fast_lane_ms,
+                             "fast_workers": args.fast_workers, "priorities": parse_priorities(args.priority)}
+    except ValueError as e:
+        parser.error(f"--priority: {e}")
+    summary_formats = [f.strip() for f in args.summary_formats.split(",") if f.strip()]
+    if set(summary_formats) - set(FORMATS):
+        parser.error(f"--summary-formats: choose from {', '.join(FORMATS)}")
+    if args.summary_out and not (args.summary or args.batch):
+        parser.error("--summary-out needs --summary or --batch")
+
+    if args.query:
+        run_query(args)
+    elif args.import_reports is not None:
+        from core.report_store import ReportStore, iter_report_files
+        with ReportStore(args.store or DEFAULT_STORE_PATH) as report_store:
+            added, skipped, invalid = report_store.import_files(iter_report_files(args.import_reports or ["reports"]),
+                                                                jobs=args.jobs)
+            print(f"[+] Imported {added} reports into {report_store.path} "
+                  f"({skipped} already stored, {invalid} unreadable or not reports; {report_store.count()} total)")
+    elif args.summary:
+        from core.batch_summary import summarize
+        _, written = summarize(args.summary, args.summary_out or DEFAULT_SUMMARY_BASE, summary_formats)
+        print(f"[+] Summary written: {', '.join(written)}")
+    elif args.watch:
+        from core.watcher import FolderWatcher
+        os.makedirs(os.path.dirname(args.metrics_file) or ".", exist_ok=True)
+        workers = args.workers or 2
+        scheduler = Scheduler(workers, **scheduler_options)
+        with SupervisedPool(workers, string_limit=string_limit, string_sampling=args.string_sampling,
+                            scheduler=scheduler, **limit_options) as pool:
+            FolderWatcher(
+                args.watch,
+                lambda path, sha256: predict(path, pool=pool, sha256=sha256, store=store, json_report=json_report),
+                # more handler threads than workers, so the scheduler has samples to order
+                workers=args.lookahead or max(16, workers * 4),
+                poll_interval=args.poll_interval,
+                settle=args.settle,
+                use_inotify=not args.no_inotify,
+                metrics_path=args.metrics_file,
+                metrics_interval=args.metrics_interval,
+                extra_metrics=lambda: {"workers": pool.worker_stats(), "lanes": scheduler.lane_stats()},
+            ).run()
+        scheduler.cost_model.save()
+    elif args.batch:
+        import asyncio
+        from core.pipeline import run_batch
+        summary = None
+        if args.summary_out:
+            from core.batch_summary import BatchSummary
+            summary = BatchSummary(f"Batch summary: {', '.join(args.batch)}")
+        asyncio.run(run_batch(args.batch, workers=args.workers, readers=args.readers,
+                              queue_size=args.queue_size, string_limit=string_limit,
+                              string_sampling=args.string_sampling, store=store, json_reports=json_report,
+                              lookahead=args.lookahead, scheduler_options=scheduler_options,
+                              summary=summary, **limit_options))
+        if summary is not None:
+            print(f"[+] Summary written: {', '.join(summary.render(args.summary_out, summary_formats))}")
+    elif args.enqueue or args.queue_status:
+        from core.workqueue import WorkQueue
+        queue = WorkQueue(args.queue)
+        if args.enqueue:
+            added, skipped, unresolved = queue.enqueue(args.enqueue, sample_root=args.sample_root)
+            print(f"[+] Enqueued {added} samples ({skipped} already queued, {unresolved} not found)")
+        if args.retry_failed:
+            print(f"[+] Re-queued {queue.requeue_failed()} failed jobs")
+        print(f"[+] Queue {args.queue}: {queue.stats()}")
+        queue.close()
+    elif args.queue_worker:
+        from core.workqueue import run_worker
+        run_worker(args.queue, workers=args.workers, claim_batch=args.claim_batch, lease=args.lease,
+                   idle_exit=not args.keep_polling, sample_root=args.sample_root, string_limit=string_limit,
+                   string_sampling=args.string_sampling, scheduler_options=scheduler_options, **limit_options)
+    elif args.isolate:
+        with SupervisedPool(1, string_limit=string_limit, string_sampling=args.string_sampling,
+                            **limit_options) as pool:
+            predict(args.file, pool=pool, store=store, json_report=json_report)
+    else:
+        predict(args.file, string_limit=string_limit, string_sampling=args.string_sampling,
+                store=store, json_report=json_report)
+    if store is not None:
+        store.close()
@@ -0,0 +1,181 @@
+# compress_model.py
+"""
+Compress the published RandomForest and export the smallest variant that is
+still accurate enough.
+
+    python compress_model.py                         # report the accuracy/latency/size curve
+    python compress_model.py --max-drop 0.01 --export models/malware_pipeline_small.pkl
+
+Variants combine a tree subset, a depth limit and leaf merging (core.compression).
+Each is scored on train_model.py's held-out split of the stored training
+matrix: accuracy, agreement with the full model, single-sample and batch
+latency, node count and pickled size.
+
+A few dozen held-out rows cannot tell variants a few points apart, so a
+variant must also agree with the full model on --min-agreement of them,
+and nothing is exported from fewer than MIN_HELD_OUT rows, or when the
+pipeline does not record (train_model.py's "held_out") that those rows
+were really held out: the baseline pickle and update_model.py's grown
+forests were fitted on them.
+"""
+import io
+import pickle
+import argparse
+import logging
+import itertools
+import math
+import time
+
+import joblib
+import numpy as np
+
+from core.compression import compress_forest, node_count
+from core.feature_index import ExtendedFeatures
+from core.training import (BASE_WIDTH, holdout_record, load_or_build_dataset, pipeline_version, publish_pipeline,
+                           split_holdout)
+from train_model import BASE_DIR, MODEL_PATH, RANDOM_STATE
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+TREE_COUNTS = [None, 100, 50, 25, 10, 5]
+DEPTHS = [None, 12, 10, 8, 6, 4]
+BATCH_SIZE = 1000
+REPEATS = 5
+MIN_HELD_OUT = 30
+DEFAULT_MIN_AGREEMENT = 0.97
+
+
+def held_out_split(pipeline, X, y):
+    """
+    train_model.train()'s held-out split (core.training.split_holdout) of the
+    stored matrix: (X_test, y_test, problem), where problem says why the rows
+    may not have been held out from this pipeline, or is None.
+    """
+    _, test_idx = split_holdout(y, random_state=RANDOM_STATE)
+    recorded = pipeline.get("held_out")
+    if recorded is None:
+        problem = "the pipeline records no held-out split"
+    elif recorded != holdout_record(X, y, test_idx):
+        problem = "the stored training matrix no longer gives the pipeline's held-out split"
+    else:
+        problem = None
+    return pipeline["scaler"].transform(X[test_idx]), pipeline["label_encoder"].transform(y[test_idx]), problem
+
+
+def _best_ms(fn, repeats=REPEATS):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def measure(name, model, X_test, y_test, reference):
+    batch = X_test[np.arange(BATCH_SIZE) % len(X_test)]
+    pred = model.predict(X_test)
+    buffer = io.BytesIO()
+    pickle.dump(model, buffer, protocol=pickle.HIGHEST_PROTOCOL)
+    return {
+        "name": name,
+        "model": model,
+        "accuracy": float((pred == y_test).mean()),
+        "agreement": float((pred == reference).mean()),
+        "sample_ms": _best_ms(lambda: model.predict_proba(X_test[:1])),
+        "batch_ms": _best_ms(lambda: model.predict_proba(batch)),
+        "nodes": node_count(model),
+        "bytes": buffer.tell(),
+    }
+
+
+def format_curve(rows):
+    header = (f"{'variant':<28} {'acc':>6} {'agree':>6} {'1-sample ms':>11} "
+              f"{f'{BATCH_SIZE}-batch ms':>13} {'nodes':>7} {'size KB':>8}")
+    lines = [header, "-" * len(header)]
+    for r in rows:
+        lines.append(f"{r['name']:<28} {r['accuracy']:>6.3f} {r['agreement']:>6.3f} {r['sample_ms']:>11.2f} "
+                     f"{r['batch_ms']:>13.2f} {r['nodes']:>7} {r['bytes'] / 1024:>8.1f}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compress the RandomForest pipeline")
+    parser.add_argument("--model", default=MODEL_PATH, help=f"Pipeline to compress (default: {MODEL_PATH})")
+    parser.add_argument("--max-drop", type=float, default=0.01,
+                        help="Allowed held-out accuracy loss vs. the full model (default: 0.01)")
+    parser.add_argument("--target-accuracy", type=float,
+                        help="Absolute held-out accuracy to meet instead of --max-drop")
+    parser.add_argument("--min-agreement", type=float, default=DEFAULT_MIN_AGREEMENT,
+                        help=f"Share of held-out predictions a variant must have in common with the full model "
+                             f"(default: {DEFAULT_MIN_AGREEMENT})")
+    parser.add_argument("--merge-by-prediction", action="store_true",
+                        help="Also merge sibling leaves that predict the same class (lossy)")
+    parser.add_argument("--jobs", type=int,
+                        help="n_jobs of the compressed models (default: keep the original's)")
+    parser.add_argument("--export", metavar="PATH",
+                        help="Publish the smallest variant meeting the target as a pipeline at PATH")
+    args = parser.parse_args()
+
+    pipeline = joblib.load(args.model)
+    forest = pipeline["model"]
+    if not hasattr(forest, "estimators_"):
+        logging.error("[!] %s does not hold a tree ensemble", args.model)
+        return
+    opcode_width = pipeline.get("opcode_ngram_width", 0)
+    X, y = load_or_build_dataset(BASE_DIR, reuse=True, opcode_width=opcode_width,
+                                 extended=ExtendedFeatures(pipeline.get("extended_features", ())))
+    if X is None:
+        return
+    X_test, y_test, problem = held_out_split(pipeline, X, y)
+    if problem:
+        logging.warning("[!] %s: the scores below may be measured on training rows", problem)
+    reference = forest.predict(X_test)
+    logging.info("[+] Held-out split: %d samples; full model: %d trees, %d nodes",
+                 len(y_test), len(forest.estimators_), node_count(forest))
+
+    rows = [measure("full", forest, X_test, y_test, reference)]
+    for n_trees, depth in itertools.product(TREE_COUNTS, DEPTHS):
+        if n_trees is None and depth is None:
+            continue
+        if n_trees is not None and n_trees >= len(forest.estimators_):
+            continue
+        model = compress_forest(forest, n_trees=n_trees, max_depth=depth,
+                                merge_by_prediction=args.merge_by_prediction)
+        if args.jobs is not None:
+            model.n_jobs = args.jobs
+        name = f"trees={n_trees or len(forest.estimators_)} depth={depth or 'full'}"
+        rows.append(measure(name, model, X_test, y_test, reference))
+    logging.info("[+] Accuracy / latency / size curve:\n%s", format_curve(rows))
+
+    full = rows[0]["accuracy"]
+    logging.info("[+] Full model held-out accuracy %.3f ± %.3f (95%%, %d samples)",
+                 full, 1.96 * math.sqrt(full * (1 - full) / len(y_test)), len(y_test))
+    target = args.target_accuracy if args.target_accuracy is not None else full - args.max_drop
+    meeting = [r for r in rows if r["accuracy"] >= target and r["agreement"] >= args.min_agreement]
+    if not meeting:
+        logging.info("[!] No variant reaches %.3f held-out accuracy with %.3f agreement",
+                     target, args.min_agreement)
+        return
+    best = min(meeting, key=lambda r: (r["bytes"], r["sample_ms"]))
+    logging.info("[+] Smallest variant with accuracy >= %.3f and agreement >= %.3f: %s "
+                 "(%.1f KB, %.1fx smaller, %.2f ms per sample)", target, args.min_agreement,
+                 best["name"], best["bytes"] / 1024, rows[0]["bytes"] / best["bytes"], best["sample_ms"])
+
+    if args.export:
+        if problem:
+            logging.error("[!] Not exporting: %s. Retrain with train_model.py first.", problem)
+            return
+        if len(y_test) < MIN_HELD_OUT:
+            logging.error("[!] Not exporting: %d held-out samples are too few to choose a variant (need %d)",
+                          len(y_test), MIN_HELD_OUT)
+            return
+        version = max(pipeline_version(args.export), pipeline.get("version", 1)) + 1
+        publish_pipeline(dict(pipeline, model=best["model"], version=version,
+                              base_width=pipeline.get("base_width", BASE_WIDTH),
+                              opcode_ngram_width=opcode_width, compressed_from=args.model,
+                              compression=best["name"]), args.export)
+        logging.info("[+] Saved pipeline v%d to %s", version, args.export)
+
+
+if __name__ == "__main__":
+    main()
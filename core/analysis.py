@@ -0,0 +1,116 @@
+# core/analysis.py
+import time
+from datetime import datetime, timezone
+
+from core.features import extract_features_from_file
+from core.filetype import detect, route
+from core.classifier import predict, required_targets
+from core.feature_graph import REPORT_NODES
+from core.parser import extract_functions
+from core.deobfuscator import explain_code
+from core.report_generator import build_json_report, DEFAULT_STRING_LIMIT
+from core.utils import get_sha256
+from core import progress
+
+TOP_FEATURES = 5     # feature attributions kept in each report
+
+
+def format_features(raw_features):
+    """
+    Convert raw extracted features into a dictionary compatible with classifier.
+    Ensures all keys exist and sets are converted to lists. Values the
+    extractor derived on the way (file size, entropy, opcode blocks) are kept
+    under "derived" for core.classifier.vector_parts.
+    """
+    feature_dict = {}
+
+    if not isinstance(raw_features, dict):
+        # If it's a set or list, wrap it as a dictionary under a default key
+        raw_features = {"strings": list(raw_features)}
+
+    for key in ("protocols", "permissions", "files", "strings", "imports"):
+        value = raw_features.get(key, [])
+        # Convert sets to lists
+        if isinstance(value, set):
+            value = list(value)
+        feature_dict[key] = value
+    if raw_features.get("derived"):
+        feature_dict["derived"] = raw_features["derived"]
+
+    return feature_dict
+
+
+def analyze_sample(file_path, sha256=None, string_limit=DEFAULT_STRING_LIMIT, string_sampling="top"):
+    """
+    Run the full static analysis of one sample and return its report dict
+    (not yet written). Per-stage wall-clock times are kept under "timings".
+    """
+    timings = {}
+
+    # Step 1: Detect the file type from its content, then extract features
+    progress.stage("sniff")
+    start = time.perf_counter()
+    kind = detect(file_path)
+    timings["sniff"] = time.perf_counter() - start
+
+    progress.stage("extract")
+    start = time.perf_counter()
+    # only what the loaded models and the report use (core.feature_graph)
+    raw_features = extract_features_from_file(file_path, kind, targets=required_targets() | set(REPORT_NODES))
+    if not raw_features:
+        print("[!] No features extracted. Unsupported or binary-only file.")
+        raw_features = {}  # fallback to empty
+    features = format_features(raw_features)
+    timings["extract"] = time.perf_counter() - start
+
+    # Step 2: Model prediction
+    progress.stage("predict")
+    start = time.perf_counter()
+    prediction = predict(features, file_path, top_features=TOP_FEATURES)
+    family, confidence = prediction["label"], prediction["confidence"]
+    features.pop("derived", None)   # vector inputs only, not report content
+    timings["predict"] = time.perf_counter() - start
+
+    # Step 3: Extract code functions & explanations if file is Python
+    # (the Python extractor already parsed the source once; reuse its result)
+    progress.stage("explain")
+    start = time.perf_counter()
+    if "functions" in raw_features and "explanation" in raw_features:
+        functions = raw_features["functions"]
+        explanation = raw_features["explanation"]
+    else:
+        try:
+            with open(file_path, "r", errors="ignore") as f:
+                code = f.read()
+                functions = extract_functions(code)
+                explanation = explain_code(code)
+        except Exception:
+            functions = []
+            explanation = "Binary executable – static code explanation not available."
+    timings["explain"] = time.perf_counter() - start
+
+    # Step 4: SHA256
+    if sha256 is None:
+        progress.stage("hash")
+        start = time.perf_counter()
+        sha256 = get_sha256(file_path)
+        timings["hash"] = time.perf_counter() - start
+
+    # Step 5: Build report
+    progress.stage("report")
+    start = time.perf_counter()
+    report = build_json_report(file_path, features, functions, explanation, family, confidence, sha256,
+                               string_limit=string_limit, string_sampling=string_sampling,
+                               probabilities=prediction["probabilities"], model_outputs=prediction["models"],
+                               top_features=prediction.get("top_features"))
+    timings["report"] = time.perf_counter() - start
+
+    report["analyzed_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    report["file_type"] = {"kind": kind, "route": route(kind)}
+    if raw_features.get("decode_chain"):
+        # payloads unwrapped by core.decoder; their features are already merged above
+        report["decode_chain"] = raw_features["decode_chain"]
+    if raw_features.get("feature_graph"):
+        report["feature_graph"] = raw_features["feature_graph"]
+    report["timings"] = {k: round(v, 4) for k, v in timings.items()}
+    return report
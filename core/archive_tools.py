@@ -1,21 +1,162 @@
+import io
 import os
+import gzip
+import bz2
+import lzma
+import tarfile
 import zipfile
 import tempfile
 
-def extract_from_archive(zip_path):
+from .string_table import StringTable
+from .feature_graph import member_targets, merge_summaries
+
+MAX_DEPTH = 3                          # archives nested deeper are not unpacked
+MAX_MEMBERS = 1000
+MAX_UNPACKED_BYTES = 256 * 1024 * 1024 # per archive, against decompression bombs
+
+_STREAMS = {"gzip": gzip.open, "bzip2": bz2.open, "xz": lzma.open}
+
+
+def _inside(root, name):
+    target = os.path.realpath(os.path.join(root, name))
+    return target.startswith(os.path.realpath(root) + os.sep)
+
+
+def _extract_zip(path, tmp_dir):
+    with zipfile.ZipFile(path, 'r') as zip_ref:
+        budget = MAX_UNPACKED_BYTES
+        for info in zip_ref.infolist()[:MAX_MEMBERS]:
+            if info.is_dir() or not _inside(tmp_dir, info.filename) or info.file_size > budget:
+                continue
+            budget -= info.file_size
+            zip_ref.extract(info, tmp_dir)
+
+
+def _extract_tar(path, tmp_dir):
+    with tarfile.open(path, 'r:*') as tar:
+        budget = MAX_UNPACKED_BYTES
+        members = []
+        for member in tar:
+            if len(members) >= MAX_MEMBERS:
+                break
+            if member.isfile() and _inside(tmp_dir, member.name) and member.size <= budget:
+                budget -= member.size
+                members.append(member)
+        # only regular files are selected; the "data" filter also drops unsafe modes where available
+        options = {"filter": "data"} if hasattr(tarfile, "data_filter") else {}
+        tar.extractall(tmp_dir, members=members, **options)
+
+
+def _extract_stream(path, kind, tmp_dir):
+    """A single gzip/bzip2/xz-compressed file: unpack it under its own name, bounded."""
+    name = os.path.splitext(os.path.basename(path))[0] or "payload"
+    with _STREAMS[kind](path, 'rb') as src, open(os.path.join(tmp_dir, name), 'wb') as dst:
+        budget = MAX_UNPACKED_BYTES
+        while budget > 0:
+            chunk = src.read(min(budget, 1024 * 1024))
+            if not chunk:
+                break
+            dst.write(chunk)
+            budget -= len(chunk)
+
+
+def _members_in_memory(content, kind):
+    """(name, bytes) of each regular member of an in-memory archive, under the same limits."""
+    budget = MAX_UNPACKED_BYTES
+    if kind in ("zip", "apk", "jar"):
+        with zipfile.ZipFile(io.BytesIO(content)) as zip_ref:
+            for info in zip_ref.infolist()[:MAX_MEMBERS]:
+                if info.is_dir() or info.file_size > budget:
+                    continue
+                with zip_ref.open(info) as member:
+                    data = member.read(budget)
+                budget -= len(data)
+                yield info.filename, data
+    elif kind == "tar":
+        with tarfile.open(fileobj=io.BytesIO(content), mode="r:*") as tar:
+            for count, member in enumerate(tar):
+                if count >= MAX_MEMBERS:
+                    break
+                if member.isfile() and member.size <= budget:
+                    data = tar.extractfile(member).read(budget)
+                    budget -= len(data)
+                    yield member.name, data
+    else:
+        with _STREAMS[kind](io.BytesIO(content), 'rb') as src:
+            yield "payload", src.read(budget)
+
+
+def merge_features(features, sub_feat):
+    """Fold one member's features into the archive's: lists concatenate, string tables merge, counts add."""
+    for k, v in sub_feat.items():
+        current = features.get(k)
+        if current is None:
+            features[k] = list(v) if isinstance(v, (list, set)) else v
+        elif isinstance(v, StringTable):
+            features[k] = StringTable.merge([current, v]) if isinstance(current, StringTable) else v
+        elif isinstance(v, (list, set)):
+            features[k] = list(current) + list(v)
+        elif isinstance(v, str):
+            if v not in current.split("\n"):
+                features[k] = f"{current}\n{v}"
+        elif isinstance(v, (int, float)):
+            features[k] = current + v
+    return features
+
+
+def _merge_member(features, sub_feat):
+    """merge_features for an archive member, summing its feature graph summary instead of keeping the first."""
+    sub_feat.pop("derived", None)
+    summary = sub_feat.pop("feature_graph", None)
+    if summary:
+        merge_summaries(features.setdefault("feature_graph", {}), summary)
+    return merge_features(features, sub_feat)
+
+
+def extract_from_archive(archive_path, kind="zip", depth=0, targets=None):
+    """
+    Analyze every file inside a zip/apk/jar, tar(.gz/.bz2/.xz) or single
+    compressed stream and merge their features. Members escaping the
+    extraction directory, and anything past MAX_MEMBERS/MAX_UNPACKED_BYTES,
+    are skipped. Binary members compute only the report fields of `targets`
+    (core.feature_graph.member_targets).
+    """
     from .features import extract_features_from_file  # ✅ move import inside
 
     features = {}
+    if depth >= MAX_DEPTH:
+        return features
+    targets = member_targets(targets)
     with tempfile.TemporaryDirectory() as tmp_dir:
         try:
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                zip_ref.extractall(tmp_dir)
+            if kind in ("zip", "apk", "jar"):
+                _extract_zip(archive_path, tmp_dir)
+            elif kind == "tar" or tarfile.is_tarfile(archive_path):
+                _extract_tar(archive_path, tmp_dir)
+            else:
+                _extract_stream(archive_path, kind, tmp_dir)
             for root, _, files in os.walk(tmp_dir):
-                for file in files:
+                for file in sorted(files):
                     full_path = os.path.join(root, file)
-                    sub_feat = extract_features_from_file(full_path)
-                    for k, v in sub_feat.items():
-                        features[k] = features.get(k, 0) + v
-        except Exception:
-            pass
+                    sub_feat = extract_features_from_file(full_path, depth=depth + 1, targets=targets)
+                    _merge_member(features, sub_feat)
+        except Exception as e:
+            print(f"[!] Archive extraction error: {e}")
+    return features
+
+
+def extract_from_archive_bytes(content, kind="zip", depth=0, targets=None):
+    """extract_from_archive for an archive held in memory (e.g. a decoded payload); nothing is written to disk."""
+    from .features import extract_features_from_bytes
+
+    features = {}
+    if depth >= MAX_DEPTH:
+        return features
+    targets = member_targets(targets)
+    try:
+        for name, data in _members_in_memory(content, kind):
+            _merge_member(features, extract_features_from_bytes(data, os.path.basename(name), depth=depth + 1,
+                                                                targets=targets))
+    except Exception as e:
+        print(f"[!] Archive extraction error: {e}")
     return features
@@ -0,0 +1,326 @@
+# core/batch_summary.py
+"""
+One summary per run, built by streaming over per-sample reports.
+
+BatchSummary.add() folds one report at a time into fixed-size aggregates:
+family distribution, confidence histograms, risk levels, file types, aborted
+samples, stage time totals, the most frequent indicators (strings, imports,
+protocols, behaviors, matched rules) and the slowest samples. Indicator
+vocabularies are unbounded, so they are tracked with Misra-Gries counters of
+TOP_CAPACITY entries (TopK): memory stays constant however many reports are
+read, and an indicator seen in more than ~2/TOP_CAPACITY of the samples is
+kept, its count low by at most that fraction.
+
+    python cli.py --summary reports/                       (the JSON/JSONL reports under reports/)
+    python cli.py --summary reports/reports.sqlite         (a report store, named explicitly)
+    python cli.py --batch samples/ --summary-out reports/run42   (summarize the batch as it runs)
+
+render() writes <base>.txt, <base>.html and <base>.pdf.
+"""
+import os
+import json
+import html
+import heapq
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+DEFAULT_SUMMARY_BASE = "reports/batch_summary"
+FORMATS = ("text", "html", "pdf")
+TOP_CAPACITY = 5000         # tracked tokens per indicator kind
+TOP_SHOWN = 20              # indicators and families listed per table
+SLOWEST_SHOWN = 20
+HISTOGRAM_BINS = 10
+LOW_CONFIDENCE = 0.5
+INDICATORS = ("strings", "imports", "protocols", "behaviors", "rules")
+
+
+class TopK:
+    """
+    Misra-Gries frequent items with batched decrements: at most `capacity`
+    counters whatever the stream length. When the table is full, the median
+    count is subtracted from every counter at once (freeing at least half of
+    them), so a stream of unique tokens costs amortized O(1) per token.
+    """
+
+    def __init__(self, capacity=TOP_CAPACITY):
+        self.capacity = capacity
+        self.counts = {}
+        self.discarded = 0          # total subtracted: the bound on every count's error
+
+    def add(self, token):
+        counts = self.counts
+        if token in counts:
+            counts[token] += 1
+            return
+        if len(counts) >= self.capacity:
+            cut = sorted(counts.values())[len(counts) // 2]
+            self.discarded += cut
+            self.counts = counts = {k: c - cut for k, c in counts.items() if c > cut}
+        counts[token] = 1
+
+    def top(self, n):
+        return heapq.nlargest(n, self.counts.items(), key=lambda kv: kv[1])
+
+
+def _indicators(report):
+    """{kind: set of tokens} of one report, each token counted once per sample."""
+    details = report.get("technical_details") or {}
+    features = details.get("features_extracted") or {}
+    summary = report.get("summary") or {}
+    return {
+        "strings": set(features.get("strings") or []),
+        "imports": set(features.get("imports") or []),
+        "protocols": set(features.get("protocols") or []),
+        "behaviors": set(summary.get("likely_behaviors") or []),
+        "rules": set(details.get("matched_rules") or []),
+    }
+
+
+class BatchSummary:
+    def __init__(self, title="Batch summary"):
+        self.title = title
+        self.samples = 0
+        self.families = Counter()
+        self.family_confidence = defaultdict(lambda: [0.0, 0])   # family -> [confidence sum, low-confidence samples]
+        self.histogram = [0] * HISTOGRAM_BINS
+        self.risk = Counter()
+        self.file_types = Counter()
+        self.aborted = Counter()
+        self.stage_time = Counter()
+        self.total_time = 0.0
+        self.bytes_decoded = 0
+        self.decoded_samples = 0
+        self.indicators = {kind: TopK() for kind in INDICATORS}
+        self._slowest = []          # min-heap of (seconds, seq, file, family)
+        self.first = self.last = None
+
+    def add(self, report):
+        """Fold one report dict into the summary; non-reports are ignored. True if counted."""
+        if not isinstance(report, dict) or "prediction" not in report:
+            return False
+        self.samples += 1
+        prediction = report.get("prediction") or {}
+        family = str(prediction.get("malware_family", "Unknown"))
+        confidence = float(prediction.get("confidence") or 0.0)
+        self.families[family] += 1
+        entry = self.family_confidence[family]
+        entry[0] += confidence
+        entry[1] += confidence < LOW_CONFIDENCE
+        self.histogram[min(HISTOGRAM_BINS - 1, max(0, int(confidence * HISTOGRAM_BINS)))] += 1
+        self.risk[(report.get("summary") or {}).get("risk_level", "Unknown")] += 1
+        self.file_types[(report.get("file_type") or {}).get("kind", "unknown")] += 1
+        if "status" in report:
+            self.aborted[report["status"]] += 1
+
+        timings = report.get("timings") or {}
+        seconds = sum(timings.values()) if timings else (report.get("aborted") or {}).get("elapsed_s", 0.0)
+        for stage, t in timings.items():
+            self.stage_time[stage] += t
+        self.total_time += seconds
+        item = (seconds, self.samples, report.get("file", "?"), family)
+        if len(self._slowest) < SLOWEST_SHOWN:
+            heapq.heappush(self._slowest, item)
+        elif item > self._slowest[0]:
+            heapq.heapreplace(self._slowest, item)
+
+        chain = report.get("decode_chain") or []
+        if chain:
+            self.decoded_samples += 1
+            self.bytes_decoded += sum(layer.get("size", 0) for layer in chain)
+
+        for kind, tokens in _indicators(report).items():
+            counter = self.indicators[kind]
+            for token in tokens:
+                counter.add(str(token))
+
+        stamp = report.get("analyzed_at")
+        if stamp:
+            self.first = min(self.first or stamp, stamp)
+            self.last = max(self.last or stamp, stamp)
+        return True
+
+    def slowest(self):
+        return sorted(self._slowest, reverse=True)
+
+    # --- rendering -----------------------------------------------------------
+    def sections(self):
+        """The summary as (heading, column names, rows) tables shared by every format."""
+        n = self.samples or 1
+        overview = [("Samples", self.samples),
+                    ("Analysis time (summed)", f"{self.total_time:.1f} s"),
+                    ("Mean per sample", f"{self.total_time / n * 1000:.0f} ms"),
+                    ("Aborted", ", ".join(f"{c} {s}" for s, c in self.aborted.most_common()) or "none"),
+                    ("Samples with decoded payloads", self.decoded_samples)]
+        if self.first:
+            overview.append(("Analyzed", f"{self.first} .. {self.last}"))
+        tables = [("Overview", ("", ""), overview)]
+
+        tables.append(("Families", ("family", "samples", "share", "mean confidence", f"below {LOW_CONFIDENCE}"),
+                       [(f, c, f"{c / n:.1%}", f"{self.family_confidence[f][0] / c:.2f}",
+                         self.family_confidence[f][1])
+                        for f, c in self.families.most_common(TOP_SHOWN)]))
+        width = 1.0 / HISTOGRAM_BINS
+        tables.append(("Confidence", ("range", "samples", "share"),
+                       [(f"{i * width:.1f}-{(i + 1) * width:.1f}", c, f"{c / n:.1%}")
+                        for i, c in enumerate(self.histogram)]))
+        tables.append(("Risk levels", ("risk", "samples", "share"),
+                       [(r, c, f"{c / n:.1%}") for r, c in self.risk.most_common()]))
+        tables.append(("File types", ("type", "samples", "share"),
+                       [(t, c, f"{c / n:.1%}") for t, c in self.file_types.most_common(TOP_SHOWN)]))
+        if self.stage_time:
+            tables.append(("Stage time", ("stage", "total s", "mean ms"),
+                           [(s, f"{t:.1f}", f"{t / n * 1000:.1f}") for s, t in self.stage_time.most_common()]))
+        for kind in INDICATORS:
+            rows = self.indicators[kind].top(TOP_SHOWN)
+            if rows:
+                tables.append((f"Top {kind}", (kind[:-1] if kind.endswith("s") else kind, "samples", "share"),
+                               [(token, c, f"{c / n:.1%}") for token, c in rows]))
+        tables.append(("Slowest samples", ("seconds", "family", "file"),
+                       [(f"{s:.2f}", family, path) for s, _, path, family in self.slowest()]))
+        return tables
+
+    def _generated(self):
+        return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
+
+    def to_text(self):
+        lines = [self.title, "=" * len(self.title), f"Generated {self._generated()}", ""]
+        for heading, columns, rows in self.sections():
+            lines += [heading, "-" * len(heading)]
+            cells = [[str(c) for c in row] for row in rows]
+            widths = [min(60, max([len(str(columns[i]))] + [len(r[i]) for r in cells]))
+                      for i in range(len(columns))]
+            if any(columns):
+                lines.append("  ".join(str(c).ljust(w) for c, w in zip(columns, widths)).rstrip())
+            for row in cells:
+                lines.append("  ".join(c[:60].ljust(w) for c, w in zip(row, widths)).rstrip())
+            lines.append("")
+        return "\n".join(lines)
+
+    def to_html(self):
+        esc = html.escape
+        n = self.samples or 1
+        parts = [f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{esc(self.title)}</title><style>"
+                 "body{font-family:sans-serif;margin:2em;color:#222}table{border-collapse:collapse;margin:0 0 2em}"
+                 "td,th{border:1px solid #ccc;padding:3px 8px;text-align:left;font-size:13px;max-width:40em;"
+                 "overflow-wrap:anywhere}th{background:#eee}.bar{background:#4a7fb5;height:10px}"
+                 "</style></head><body>",
+                 f"<h1>{esc(self.title)}</h1><p>Generated {self._generated()}</p>"]
+        for heading, columns, rows in self.sections():
+            parts.append(f"<h2>{esc(heading)}</h2><table>")
+            # a bar per row wherever the second column is a sample count
+            bars = len(columns) > 1 and columns[1] == "samples"
+            if any(columns):
+                parts.append("<tr>" + "".join(f"<th>{esc(str(c))}</th>" for c in columns)
+                             + ("<th></th>" if bars else "") + "</tr>")
+            for row in rows:
+                parts.append("<tr>" + "".join(f"<td>{esc(str(c))}</td>" for c in row))
+                if bars:
+                    parts.append(f"<td style='width:12em'><div class='bar' style='width:{100 * row[1] / n:.1f}%'>"
+                                 "</div></td>")
+                parts.append("</tr>")
+            parts.append("</table>")
+        parts.append("</body></html>")
+        return "".join(parts)
+
+    def to_pdf(self, path):
+        from fpdf import FPDF
+
+        def latin1(value, limit=90):
+            # the core PDF fonts are Latin-1 only
+            return str(value)[:limit].encode("latin-1", "replace").decode("latin-1")
+
+        pdf = FPDF()
+        pdf.set_auto_page_break(True, margin=15)
+        pdf.add_page()
+        pdf.set_font("Arial", "B", 16)
+        pdf.cell(0, 10, latin1(self.title), ln=1)
+        pdf.set_font("Arial", "", 9)
+        pdf.cell(0, 6, f"Generated {self._generated()}", ln=1)
+        usable = pdf.w - pdf.l_margin - pdf.r_margin
+        for heading, columns, rows in self.sections():
+            pdf.ln(3)
+            pdf.set_font("Arial", "B", 12)
+            pdf.cell(0, 8, latin1(heading), ln=1)
+            # the last column (names, paths, tokens) gets what the fixed-width ones leave
+            fixed = 28 if len(columns) > 2 else 60
+            widths = [fixed] * (len(columns) - 1)
+            widths.append(max(30, usable - sum(widths)))
+            if heading.startswith("Top") or heading in ("Families", "Risk levels", "File types"):
+                widths = [widths[-1]] + widths[:-1]      # wide first column: the name
+            if any(columns):
+                pdf.set_font("Arial", "B", 8)
+                for c, w in zip(columns, widths):
+                    pdf.cell(w, 5, latin1(c), border=1)
+                pdf.ln()
+            pdf.set_font("Arial", "", 8)
+            for row in rows:
+                for c, w in zip(row, widths):
+                    pdf.cell(w, 5, latin1(c, int(w / 1.6)), border=1)
+                pdf.ln()
+        pdf.output(path, "F")
+
+    def render(self, base=DEFAULT_SUMMARY_BASE, formats=FORMATS):
+        """Write <base>.txt/.html/.pdf for the requested formats; returns the paths written."""
+        os.makedirs(os.path.dirname(base) or ".", exist_ok=True)
+        written = []
+        for fmt in formats:
+            if fmt == "text":
+                path = base + ".txt"
+                with open(path, "w") as f:
+                    f.write(self.to_text())
+            elif fmt == "html":
+                path = base + ".html"
+                with open(path, "w") as f:
+                    f.write(self.to_html())
+            elif fmt == "pdf":
+                path = base + ".pdf"
+                self.to_pdf(path)
+            else:
+                raise ValueError(f"unknown summary format {fmt!r} (one of {', '.join(FORMATS)})")
+            written.append(path)
+        return written
+
+
+def iter_reports(paths):
+    """
+    Report dicts from files/directories, one at a time: *.json (one report
+    each) and *.jsonl (one per line). Report stores (*.sqlite,
+    core.report_store) are read, read-only, only when named explicitly: a
+    directory walk skips them, since after --batch --store reports/ holds
+    every report both as JSON and in reports/reports.sqlite.
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            files = (os.path.join(root, name) for root, _, names in os.walk(path) for name in sorted(names))
+        else:
+            files = [path]
+        for file in files:
+            try:
+                if file.endswith(".jsonl"):
+                    with open(file) as f:
+                        for line in f:
+                            if line.strip():
+                                try:
+                                    yield json.loads(line)
+                                except ValueError:
+                                    continue
+                elif file.endswith(".json"):
+                    with open(file) as f:
+                        yield json.load(f)
+                elif file == path and os.path.isfile(file):
+                    from core.report_store import ReportStore
+                    with ReportStore(file, readonly=True) as store:
+                        yield from store.iter_reports()
+            except (OSError, ValueError) as e:
+                print(f"[!] Skipping {file}: {e}")
+
+
+def summarize(paths, base=DEFAULT_SUMMARY_BASE, formats=FORMATS, title=None):
+    """Stream the reports under `paths` into a BatchSummary and render it. Returns (summary, paths written)."""
+    summary = BatchSummary(title or f"Batch summary: {', '.join(paths)}")
+    start = time.perf_counter()
+    for report in iter_reports(paths):
+        summary.add(report)
+    print(f"[+] Summarized {summary.samples} reports in {time.perf_counter() - start:.1f}s")
+    return summary, summary.render(base, formats)
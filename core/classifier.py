@@ -1,14 +1,40 @@
 # core/classifier.py
+"""
+Model inference.
 
+The vector is built once per sample (entropy, string fallback and opcode block
+included) and every loaded model scores it from a single predict_proba call.
+By default the only model is the RandomForest pipeline in MODEL_PATH. A
+deployment can blend several pipelines by dropping models/ensemble.json next
+to it:
+
+    {"members": [
+        {"name": "random_forest", "path": "malware_pipeline.pkl", "weight": 0.7},
+        {"name": "svm", "path": "svm.pkl", "weight": 0.3}
+    ]}
+
+Probabilities are aligned by family name and averaged with the given weights.
+Pipelines and the ensemble config are reloaded when their files change.
+"""
 import joblib
 import os
 import json
+
+import numpy as np
+
 from core.utils import shannon_entropy, extract_printable_strings
 from core.behavior_summary import generate_human_readable_summary
+from core.string_table import StringTable
+from core.opcodes import opcode_ngrams_from_file
+from core.explainer import forest_contributions, supports_contributions, top_contributions
+from core.training import feature_names
+from core.feature_graph import targets_for
+from core.feature_index import ExtendedFeatures, sample_tokens
 
-def pad_missing_features(vector):
+def pad_missing_features(vector, expected_length=None):
     """Ensure vector matches model input length."""
-    expected_length = scaler.mean_.shape[0]  # scaler tells exact expected input size
+    if expected_length is None:
+        expected_length = scaler.mean_.shape[0]  # scaler tells exact expected input size
     current_length = len(vector)
 
     if current_length < expected_length:
@@ -18,19 +44,161 @@ def pad_missing_features(vector):
 
 
 
-MODEL_PATH = os.path.join(os.path.dirname(__file__), '../models/malware_pipeline.pkl')
-FEATURES_PATH = os.path.join(os.path.dirname(__file__), '../models/primary_features.json')
+MODELS_DIR = os.path.join(os.path.dirname(__file__), '../models')
+MODEL_PATH = os.path.join(MODELS_DIR, 'malware_pipeline.pkl')
+ENSEMBLE_PATH = os.path.join(MODELS_DIR, 'ensemble.json')
+FEATURES_PATH = os.path.join(MODELS_DIR, 'primary_features.json')
+
+
+def _file_stamp(path):
+    try:
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+    except OSError:
+        return None
+
+
+class ModelMember:
+    """One published pipeline ({model, scaler, label_encoder, ...}) and its ensemble weight."""
+
+    def __init__(self, name, path, weight=1.0):
+        self.name = name
+        self.path = path
+        self.weight = float(weight)
+        self.model = None
+        self.scaler = None
+        self.label_encoder = None
+        self.version = 0
+        self.base_width = None          # width before the optional opcode block (None: older pipelines)
+        self.opcode_ngram_width = 0
+        self.extended = ExtendedFeatures()  # token presence columns (core.feature_index), after the opcodes
+        self._stamp = None
+
+    @property
+    def loaded(self):
+        return self.model is not None and self.scaler is not None and self.label_encoder is not None
+
+    def reload_if_changed(self):
+        """
+        Reload when the file has been replaced (e.g. by update_model.py).
+        Pipelines are swapped atomically, so a stat() check per prediction is enough.
+        """
+        stamp = _file_stamp(self.path)
+        if stamp is None or stamp == self._stamp:
+            return False
+        try:
+            pipeline = joblib.load(self.path)
+            self.model, self.scaler, self.label_encoder = \
+                pipeline["model"], pipeline["scaler"], pipeline["label_encoder"]
+            self.version = pipeline.get("version", 1)
+            self.base_width = pipeline.get("base_width")
+            self.opcode_ngram_width = pipeline.get("opcode_ngram_width", 0)
+            self.extended = ExtendedFeatures(pipeline.get("extended_features", ()))
+        except Exception:
+            self.model = self.scaler = self.label_encoder = None
+            self.opcode_ngram_width = 0
+            self.extended = ExtendedFeatures()
+        self._stamp = stamp
+        return True
+
+    def vector(self, parts):
+        """This member's input layout for one sample's VectorParts."""
+        width = self.scaler.mean_.shape[0]
+        if self.opcode_ngram_width or self.extended:
+            vector = pad_missing_features(list(parts.base), self.base_width)
+            if self.opcode_ngram_width:
+                vector += parts.opcodes(self.opcode_ngram_width)
+            if self.extended:
+                vector += self.extended.vector(parts.tokens())
+        else:
+            vector = list(parts.base)
+        return pad_missing_features(vector, width)
+
+    def feature_names(self):
+        names = feature_names(self.opcode_ngram_width, self.extended)
+        if self.base_width is None:   # older pipelines: names follow the scaler width
+            names = names[:self.scaler.mean_.shape[0]]
+        return names
+
+    def predict_proba(self, parts_list, explain=False):
+        """
+        (X, probabilities, contributions) for a batch, one scaler/model call each.
+        The probabilities always come from the model; with explain=True and a
+        forest model, the tree-path contributions (core.explainer) only feed
+        the explanation, and must add up to them within float rounding.
+        """
+        X = np.array([self.vector(p) for p in parts_list], dtype=np.float64)
+        X_scaled = self.scaler.transform(X)
+        probabilities = self.model.predict_proba(X_scaled)
+        if explain and supports_contributions(self.model):
+            bias, contributions = forest_contributions(self.model, X_scaled)
+            assert np.allclose(bias + contributions.sum(axis=1), probabilities, atol=1e-6), \
+                "tree-path contributions do not add up to predict_proba"
+            return X, probabilities, contributions
+        return X, probabilities, None
+
 
 # Load model/scaler/encoder
-try:
-    pipeline = joblib.load(MODEL_PATH)
-    model = pipeline["model"]
-    scaler = pipeline["scaler"]
-    label_encoder = pipeline["label_encoder"]
-except Exception:
-    model = None
-    scaler = None
-    label_encoder = None
+members = []
+_ensemble_stamp = False        # False: config never checked yet
+
+# The primary (first) member, kept as module globals for existing callers
+model = None
+scaler = None
+label_encoder = None
+model_version = 0
+
+
+def _load_members():
+    """Members from ENSEMBLE_PATH, or the single RandomForest pipeline if there is none."""
+    try:
+        with open(ENSEMBLE_PATH) as f:
+            config = json.load(f)
+        loaded = [ModelMember(m.get("name", os.path.basename(m["path"])),
+                              os.path.join(MODELS_DIR, m["path"]), m.get("weight", 1.0))
+                  for m in config["members"]]
+        if loaded:
+            return loaded
+    except FileNotFoundError:
+        pass
+    except (ValueError, KeyError, TypeError) as e:
+        print(f"[!] Ignoring invalid ensemble config {ENSEMBLE_PATH}: {e}")
+    return [ModelMember("random_forest", MODEL_PATH)]
+
+
+def reload_model_if_changed():
+    """Reload the ensemble config and any pipeline whose file changed. True if anything did."""
+    global members, _ensemble_stamp, model, scaler, label_encoder, model_version
+    changed = False
+    stamp = _file_stamp(ENSEMBLE_PATH)
+    if stamp != _ensemble_stamp:
+        members = _load_members()
+        _ensemble_stamp = stamp
+        changed = True
+    for member in members:
+        changed |= member.reload_if_changed()
+    if changed:
+        primary = members[0]
+        model, scaler, label_encoder = primary.model, primary.scaler, primary.label_encoder
+        model_version = primary.version
+    return changed
+
+
+reload_model_if_changed()
+
+
+def required_targets():
+    """
+    core.feature_graph nodes the loaded models' vectors are built from;
+    extraction can skip everything else that the report does not show.
+    """
+    reload_model_if_changed()
+    targets = set()
+    for m in members:
+        if m.loaded and m.weight > 0:
+            targets |= targets_for(m.feature_names(), m.opcode_ngram_width)
+    return targets
+
 
 # Load features used during training
 try:
@@ -40,29 +208,67 @@ except Exception:
     all_features = []
     print("[!] Warning: Could not load primary_features.json. Feature mismatch may occur.")
 
-def extract_vector(features, file_path):
+
+class VectorParts:
     """
-    Create the same feature vector layout as training (train_model.vectorize).
+    The model-independent part of a sample's vector, computed once: feature
+    counts plus file size, entropy, string and import counts. Opcode blocks
+    are computed on first use per width and cached, and so is the token set
+    the extended feature lookups read.
+    """
+
+    __slots__ = ("base", "file_path", "_opcodes", "_features", "_tokens")
+
+    def __init__(self, base, file_path, opcodes=None, features=None):
+        self.base = base
+        self.file_path = file_path
+        self._opcodes = dict(opcodes or {})     # width -> block, e.g. precomputed during extraction
+        self._features = features or {}
+        self._tokens = None
+
+    def opcodes(self, width):
+        if width not in self._opcodes:
+            self._opcodes[width] = opcode_ngrams_from_file(self.file_path, width).tolist()
+        return self._opcodes[width]
+
+    def tokens(self):
+        if self._tokens is None:
+            self._tokens = sample_tokens(self._features)
+        return self._tokens
+
+
+def vector_parts(features, file_path):
+    """
+    Create the same feature vector layout as training (core.training.vectorize).
+    Values the extractor already computed from the file's bytes (features["derived"],
+    see core.features.BINARY_GRAPH) are reused instead of reading the file again.
     """
     combined = []
+    tables = []
     for key in ("protocols", "permissions", "files", "strings", "imports"):
         v = features.get(key, [])
-        if isinstance(v, list):
+        if isinstance(v, StringTable):
+            tables.append(v)
+        elif isinstance(v, list):
             combined += [str(x) for x in v]
         elif isinstance(v, (str, int)):
             combined.append(str(v))
 
-    counts = [combined.count(f) for f in all_features]
+    counts = [combined.count(f) + sum(t.count(f) for t in tables) for f in all_features]
+    derived = features.get("derived", {})
 
-    try:
-        file_size = os.path.getsize(file_path)
-    except Exception:
-        file_size = 0
+    if "file_size" in derived:
+        file_size = derived["file_size"]
+    else:
+        try:
+            file_size = os.path.getsize(file_path)
+        except Exception:
+            file_size = 0
 
-    entropy = shannon_entropy(file_path)
+    entropy = derived["entropy"] if "entropy" in derived else shannon_entropy(file_path)
 
     # prefer strings from extractor; fallback to scanning file
-    if isinstance(features.get("strings"), list) and features.get("strings"):
+    if isinstance(features.get("strings"), (list, StringTable)) and features.get("strings"):
         num_strings = len(features.get("strings"))
     else:
         num_strings = len(extract_printable_strings(file_path))
@@ -70,33 +276,96 @@ def extract_vector(features, file_path):
     imports = features.get("imports", [])
     num_imports = len(imports) if isinstance(imports, list) else 0
 
-    vector = counts + [file_size, entropy, num_strings, num_imports]
-    vector = pad_missing_features(vector)
-    return vector
+    return VectorParts(counts + [file_size, entropy, num_strings, num_imports], file_path, derived.get("opcodes"),
+                       features)
 
 
+def extract_vector(features, file_path):
+    """The primary model's input vector for one sample."""
+    return members[0].vector(vector_parts(features, file_path))
 
-def predict_family(features, file_path):
-    if model is None or scaler is None or label_encoder is None:
-        return "Unknown (Model not loaded)"
+
+def _unknown(label):
+    return {"label": label, "confidence": 0.0, "probabilities": {}, "models": {}}
+
+
+def predict_batch(samples, top_features=0):
+    """
+    Score a batch of (features, file_path) pairs. Each vector is built once and
+    each member model runs one predict_proba over the whole batch matrix.
+
+    Returns one dict per sample:
+        {"label", "confidence", "probabilities": {family: p}, "models": {member: label}}
+    With top_features > 0, forest members also attribute the prediction to
+    their input features and "top_features" lists the strongest ones for the
+    predicted family (contributions weighted like the ensemble).
+    """
+    reload_model_if_changed()
+    active = [m for m in members if m.loaded and m.weight > 0]
+    if not active:
+        return [_unknown("Unknown (Model not loaded)") for _ in samples]
     try:
-        vector = extract_vector(features, file_path)
-        vector_scaled = scaler.transform([vector])
-        return label_encoder.inverse_transform(model.predict(vector_scaled))[0]
+        parts = [vector_parts(features, file_path) for features, file_path in samples]
+        classes = sorted({str(c) for m in active for c in m.label_encoder.classes_})
+        index = {c: i for i, c in enumerate(classes)}
+        combined = np.zeros((len(parts), len(classes)))
+        total_weight = sum(m.weight for m in active)
+        per_member = {}
+        explained = []     # (member, raw X, contributions, class columns)
+        for m in active:
+            X, proba, contributions = m.predict_proba(parts, explain=top_features > 0)
+            # model columns are encoded labels; place them by family name
+            names = m.label_encoder.inverse_transform(np.asarray(m.model.classes_, dtype=int))
+            columns = [index[n] for n in names]
+            combined[:, columns] += m.weight * proba
+            per_member[m.name] = names[np.argmax(proba, axis=1)]
+            if contributions is not None:
+                explained.append((m, X, contributions * (m.weight / total_weight), columns))
+        combined /= total_weight
     except Exception as e:
         print(f"[!] Prediction error: {e}")
-        return "Unknown (Prediction error)"
+        return [_unknown("Unknown (Prediction error)") for _ in samples]
+
+    results = []
+    for i, row in enumerate(combined):
+        best = int(np.argmax(row))
+        result = {
+            "label": classes[best],
+            "confidence": float(row[best]),
+            "probabilities": {c: round(float(p), 4) for c, p in zip(classes, row)},
+            "models": {name: str(labels[i]) for name, labels in per_member.items()} if len(active) > 1 else {},
+        }
+        if top_features:
+            result["top_features"] = _top_features(explained, i, best, top_features)
+        results.append(result)
+    return results
+
+
+def _top_features(explained, i, class_column, k):
+    """Merge the members' attributions for sample i and keep the k strongest."""
+    merged = {}
+    for m, X, contributions, columns in explained:
+        if class_column not in columns:
+            continue
+        # every non-zero feature: a weak one in two members can outrank a strong one in one
+        rows = top_contributions(contributions[i], columns.index(class_column), m.feature_names(), X[i],
+                                 k=contributions.shape[1])
+        for r in rows:
+            entry = merged.setdefault(r["feature"], dict(r, contribution=0.0))
+            entry["contribution"] = round(entry["contribution"] + r["contribution"], 4)
+    return sorted(merged.values(), key=lambda r: -abs(r["contribution"]))[:k]
+
+
+def predict(features, file_path, top_features=0):
+    """Label, confidence and full class distribution for one sample (see predict_batch)."""
+    return predict_batch([(features, file_path)], top_features)[0]
+
+
+def predict_family(features, file_path):
+    return predict(features, file_path)["label"]
 
 def predict_proba(features, file_path):
-    if model is None or scaler is None:
-        return 0.0
-    try:
-        vector = extract_vector(features, file_path)
-        vector_scaled = scaler.transform([vector])
-        return max(model.predict_proba(vector_scaled)[0])
-    except Exception as e:
-        print(f"[!] Probability prediction error: {e}")
-        return 0.0
+    return predict(features, file_path)["confidence"]
 def analyze_file(features, file_path):
     """
     Return a safe, human-readable analysis of a malware sample.
@@ -104,8 +373,9 @@ def analyze_file(features, file_path):
     result = {}
 
     # Predict family and confidence
-    result["predicted_family"] = predict_family(features, file_path)
-    result["confidence"] = predict_proba(features, file_path)
+    prediction = predict(features, file_path)
+    result["predicted_family"] = prediction["label"]
+    result["confidence"] = prediction["confidence"]
 
     # Protocol counts (from primary features)
     result["protocols"] = {k: features.get(k, 0) for k in ["HTTP", "FTP", "SMTP", "DNS"]}
@@ -117,6 +387,6 @@ def analyze_file(features, file_path):
     result["strings"] = features.get("strings", [])[:50]
 
     # Human-readable behavior summary (pseudocode)
-    result["behavior_summary"] = generate_human_readable_summary(features)
+    result["behavior_summary"] = generate_human_readable_summary(features, file_path)
 
     return result
@@ -0,0 +1,119 @@
+# core/compression.py
+"""
+Smaller variants of a fitted RandomForest/ExtraTrees classifier.
+
+Three reductions, combinable:
+  - tree subset: keep the first k trees. Bagged trees are i.i.d. replicates,
+    so any k of them are an unbiased smaller forest.
+  - depth limit: every node at max_depth becomes a leaf. Internal nodes
+    already store the class distribution of the samples reaching them, so
+    the truncated tree predicts exactly what the subtree's samples averaged.
+  - leaf merging (lossy): a split whose two children are leaves predicting
+    the same class becomes one leaf, bottom-up until nothing changes. The
+    children of a fitted split never share a class distribution (the split
+    would have gained nothing), so only merging by prediction ever applies.
+
+Trees are rebuilt through sklearn's Tree pickle state, so compressed models
+are ordinary estimators: they pickle, predict and work with core.explainer.
+"""
+import copy
+
+import numpy as np
+from sklearn.tree._tree import Tree
+
+TREE_LEAF = -1
+TREE_UNDEFINED = -2
+
+
+def _rebuild(tree, keep, leaf):
+    """
+    New Tree with only the nodes in `keep` (depth-first order preserved);
+    nodes flagged in `leaf` lose their children.
+    """
+    state = tree.__getstate__()
+    nodes, values = state["nodes"], state["values"]
+    order = np.flatnonzero(keep)
+    new_index = np.full(len(nodes), TREE_LEAF, dtype=np.int64)
+    new_index[order] = np.arange(len(order))
+
+    new_nodes = nodes[order].copy()
+    is_leaf = leaf[order] | (new_nodes["left_child"] == TREE_LEAF)
+    new_nodes["left_child"] = np.where(is_leaf, TREE_LEAF, new_index[np.maximum(new_nodes["left_child"], 0)])
+    new_nodes["right_child"] = np.where(is_leaf, TREE_LEAF, new_index[np.maximum(new_nodes["right_child"], 0)])
+    new_nodes["feature"][is_leaf] = TREE_UNDEFINED
+    new_nodes["threshold"][is_leaf] = TREE_UNDEFINED
+
+    depth = _depths(new_nodes["left_child"], new_nodes["right_child"])
+    rebuilt = Tree(tree.n_features, np.asarray(tree.n_classes, dtype=np.intp), tree.n_outputs)
+    rebuilt.__setstate__({"max_depth": int(depth.max()), "node_count": len(order),
+                          "nodes": new_nodes, "values": np.ascontiguousarray(values[order])})
+    return rebuilt
+
+
+def _depths(left, right):
+    depth = np.zeros(len(left), dtype=np.int64)
+    for node in range(len(left)):       # depth-first numbering: parents come first
+        if left[node] != TREE_LEAF:
+            depth[left[node]] = depth[right[node]] = depth[node] + 1
+    return depth
+
+
+def truncate_tree(tree, max_depth):
+    """Cut every branch at max_depth."""
+    depth = _depths(tree.children_left, tree.children_right)
+    if depth.max() <= max_depth:
+        return tree
+    return _rebuild(tree, depth <= max_depth, depth == max_depth)
+
+
+def _distribution(values):
+    totals = values.sum(axis=-1, keepdims=True)
+    return values / np.where(totals == 0, 1, totals)
+
+
+def merge_leaves(tree):
+    """Collapse splits whose children are leaves predicting the same class."""
+    left = tree.children_left.copy()
+    right = tree.children_right.copy()
+    label = _distribution(tree.value[:, 0, :]).argmax(axis=1)
+    merged = np.zeros(tree.node_count, dtype=bool)
+    # reverse depth-first order visits children before parents, so merges cascade upward
+    for node in range(tree.node_count - 1, -1, -1):
+        l, r = left[node], right[node]
+        if l == TREE_LEAF or left[l] != TREE_LEAF or left[r] != TREE_LEAF:
+            continue
+        if label[l] == label[r]:
+            left[node] = right[node] = TREE_LEAF
+            merged[node] = True
+            label[node] = label[l]
+    if not merged.any():
+        return tree
+    reachable = np.zeros(tree.node_count, dtype=bool)
+    reachable[0] = True
+    for node in range(tree.node_count):
+        if reachable[node] and left[node] != TREE_LEAF:
+            reachable[left[node]] = reachable[right[node]] = True
+    return _rebuild(tree, reachable, merged)
+
+
+def compress_forest(forest, n_trees=None, max_depth=None, merge_by_prediction=False):
+    """A copy of `forest` with the reductions applied (the original is not modified)."""
+    compressed = copy.copy(forest)
+    estimators = forest.estimators_[:n_trees] if n_trees else list(forest.estimators_)
+    compressed.estimators_ = []
+    for estimator in estimators:
+        tree = estimator.tree_
+        if max_depth is not None:
+            tree = truncate_tree(tree, max_depth)
+        if merge_by_prediction:
+            tree = merge_leaves(tree)
+        if tree is not estimator.tree_:
+            estimator = copy.copy(estimator)
+            estimator.tree_ = tree
+        compressed.estimators_.append(estimator)
+    compressed.n_estimators = len(compressed.estimators_)
+    return compressed
+
+
+def node_count(forest):
+    return sum(e.tree_.node_count for e in forest.estimators_)
@@ -0,0 +1,258 @@
+# core/decoder.py
+"""
+Bounded, in-memory unwrapping of encoded payloads.
+
+Droppers hide their real code under layers such as
+exec(zlib.decompress(base64.b64decode("..."))) or
+marshal.loads(bytes.fromhex("...")). decode_layers() finds encoded blobs in
+a layer (base64, hex, \\x escapes), decodes whole-layer encodings (zlib,
+gzip, bzip2, xz, marshal) and repeats on every result, breadth-first, until
+MAX_DEPTH, MAX_LAYERS or the MAX_DECODED_BYTES budget is reached.
+
+Layers are keyed by SHA-256: a payload repeated within a sample is visited
+once, and the decoded children of a layer are cached across samples
+(CACHE_BYTES, least recently used first out), since one loader is typically
+reused by many samples. Decoded bytes that are neither text, a known format
+nor another encoding are dropped, so random base64-looking strings do not
+become layers.
+
+marshal.loads is only run on data that starts like a code object, and the
+code object is never executed: its names and string constants become a text
+layer. marshal.loads is not hardened against hostile input, and decoding runs
+wherever extraction does: inside the supervised workers for --batch, --watch,
+the queue workers and --file --isolate, but in-process for plain --file,
+api.py, train_model.py and update_model.py, where a crafted payload that
+crashes the unmarshaller takes the whole process down. Analyze untrusted
+samples under the supervisor.
+"""
+import re
+import bz2
+import lzma
+import zlib
+import base64
+import marshal
+import hashlib
+import binascii
+import types
+from collections import OrderedDict, deque
+
+from core import filetype
+
+MAX_DEPTH = 5
+MAX_LAYERS = 32
+MAX_DECODED_BYTES = 32 * 1024 * 1024   # per sample, summed over all layers
+MIN_BLOB = 32                          # shortest encoded run worth decoding (characters)
+MIN_LAYER = 16                         # shortest decoded payload kept (bytes)
+CACHE_BYTES = 64 * 1024 * 1024
+
+# Adjacent string literals ("abc" "def", 'abc' + 'def', one per line) are joined before scanning
+_LITERAL_JOIN = re.compile(rb"""(?<=[A-Za-z0-9+/=_-])["']\s*\+?\s*\\?\s*["'](?=[A-Za-z0-9+/_-])""")
+_BLOB = re.compile(rb"[A-Za-z0-9+/_-]{%d,}={0,2}" % MIN_BLOB)
+_HEX = re.compile(rb"(?:[0-9a-fA-F]{2})+")
+_HEX_ESCAPES = re.compile(rb"(?:\\x[0-9a-fA-F]{2}){%d,}" % (MIN_BLOB // 2))
+_TEXT_ROUTES = ("python", "script")
+# Code object type byte: b"c", or b"\xe3" with the FLAG_REF bit when the object is referenced again
+_MARSHAL_CODE = (b"c", b"\xe3")
+
+_cache = OrderedDict()      # sha256 -> [(encoding, data)]
+_cache_bytes = 0
+
+
+class Layer:
+    """One decoded payload: where it came from and what it looks like."""
+    __slots__ = ("data", "encoding", "kind", "depth", "parent", "sha256", "truncated")
+
+    def __init__(self, data, encoding, kind, depth, parent, truncated=False):
+        self.data = data
+        self.encoding = encoding
+        self.kind = kind
+        self.depth = depth
+        self.parent = parent        # index of the parent layer, None for the sample itself
+        self.sha256 = hashlib.sha256(data).hexdigest()
+        self.truncated = truncated
+
+    @property
+    def analyzable(self):
+        """Text or a known format: worth passing back through feature extraction."""
+        return self.kind is not None
+
+    def summary(self):
+        return {"depth": self.depth, "encoding": self.encoding, "kind": self.kind or "encoded",
+                "size": len(self.data), "sha256": self.sha256, "parent": self.parent,
+                "truncated": self.truncated}
+
+
+def _compressed(data):
+    """Decompressor factory for whole-layer compressed data, or None."""
+    # deflate, 32K window, no preset dictionary, header checksum valid ("x = ..." text can pass the checksum alone)
+    if len(data) > 2 and data[0] == 0x78 and not data[1] & 0x20 and (data[0] << 8 | data[1]) % 31 == 0:
+        return "zlib", zlib.decompressobj
+    if data.startswith(b"\x1f\x8b"):
+        return "gzip", lambda: zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if data.startswith(b"BZh"):
+        return "bzip2", bz2.BZ2Decompressor
+    if data.startswith(b"\xfd7zXZ\x00"):
+        return "xz", lzma.LZMADecompressor
+    return None
+
+
+def _decompress(data, factory, limit):
+    """(output, truncated) with at most `limit` bytes of output."""
+    d = factory()
+    out = d.decompress(data, max_length=limit)
+    if hasattr(d, "unconsumed_tail"):       # zlib
+        return out, bool(d.unconsumed_tail)
+    return out, not d.eof and not d.needs_input
+
+
+def _code_text(code):
+    """Names and string constants of a code object and everything nested in it, one per line."""
+    lines, stack = [], [code]
+    while stack:
+        co = stack.pop()
+        lines.append(co.co_name)
+        lines.extend(co.co_names)
+        for const in co.co_consts:
+            if isinstance(const, types.CodeType):
+                stack.append(const)
+            elif isinstance(const, str) and const:
+                lines.append(const)
+            elif isinstance(const, bytes) and const:
+                lines.append(const.decode("latin1"))
+    return "\n".join(dict.fromkeys(lines)).encode("utf-8", errors="ignore")
+
+
+def _looks_marshalled(data):
+    """Starts like a marshalled code object: type byte, then a small little-endian co_argcount."""
+    return data.startswith(_MARSHAL_CODE) and len(data) >= 5 and data[2:5] == b"\0\0\0"
+
+
+def _unmarshal(data):
+    """Text of a marshalled code object, or None."""
+    if not _looks_marshalled(data):
+        return None
+    try:
+        code = marshal.loads(data)
+    except (ValueError, EOFError, TypeError, OverflowError, MemoryError, SystemError):   # random bytes can claim huge sizes or bad refs
+        return None
+    return _code_text(code) if isinstance(code, types.CodeType) else None
+
+
+def _layer_kind(data):
+    """filetype kind of decoded data; None if it is (still) encoded or unrecognizable."""
+    if _compressed(data):
+        return None
+    kind = filetype.sniff(data[:filetype.HEAD_BYTES], "")
+    return None if kind == "binary" else kind
+
+
+def _worth_keeping(data):
+    """Decoded bytes that are text, a known format, or a valid further encoding."""
+    if len(data) < MIN_LAYER:
+        return False
+    compressed = _compressed(data)
+    if compressed:
+        try:
+            return bool(_decompress(data, compressed[1], MIN_LAYER)[0])
+        except (zlib.error, OSError, EOFError, lzma.LZMAError):
+            return False
+    if _looks_marshalled(data) and _unmarshal(data) is not None:
+        return True
+    return _layer_kind(data) is not None
+
+
+def _decode_blob(blob):
+    """(encoding, bytes) for one encoded run, or None."""
+    try:
+        if blob.startswith(b"\\x"):
+            return "hex", bytes.fromhex(blob.replace(b"\\x", b"").decode())
+        if len(blob) % 2 == 0 and _HEX.fullmatch(blob):
+            return "hex", bytes.fromhex(blob.decode())
+        blob = blob.rstrip(b"=")
+        padded = blob + b"=" * (-len(blob) % 4)
+        if b"-" in blob or b"_" in blob:
+            return "base64", base64.urlsafe_b64decode(padded)
+        return "base64", base64.b64decode(padded, validate=True)
+    except (binascii.Error, ValueError):
+        return None
+
+
+def _children(data, limit):
+    """
+    Decoded children of one layer: [(encoding, data, truncated)]. A whole-layer
+    encoding wins; otherwise text layers are scanned for embedded blobs.
+    """
+    compressed = _compressed(data)
+    if compressed:
+        encoding, factory = compressed
+        try:
+            out, truncated = _decompress(data, factory, limit)
+            if len(out) >= MIN_LAYER:
+                return [(encoding, out, truncated)]
+        except (zlib.error, OSError, EOFError, lzma.LZMAError):
+            pass
+    if _looks_marshalled(data):
+        text = _unmarshal(data)
+        if text is not None:
+            return [("marshal", text, False)]
+    if filetype.route(filetype.sniff(data[:filetype.HEAD_BYTES], "")) not in _TEXT_ROUTES:
+        return []
+
+    children, tried = [], set()
+    text = _LITERAL_JOIN.sub(b"", data)
+    for pattern in (_HEX_ESCAPES, _BLOB):
+        for match in pattern.finditer(text):
+            blob = match.group()
+            if blob in tried:
+                continue
+            tried.add(blob)
+            decoded = _decode_blob(blob)
+            if decoded and _worth_keeping(decoded[1]):
+                children.append((decoded[0], decoded[1], False))
+    return children
+
+
+def _cached_children(data, limit):
+    global _cache_bytes
+    key = hashlib.sha256(data).digest()
+    if key in _cache:
+        _cache.move_to_end(key)
+        return [(encoding, out, False) for encoding, out in _cache[key]]
+    children = _children(data, limit)
+    if not any(truncated for _, _, truncated in children):
+        _cache[key] = [(encoding, out) for encoding, out, _ in children]
+        _cache_bytes += sum(len(out) for _, out, _ in children)
+        while _cache_bytes > CACHE_BYTES and _cache:
+            _, evicted = _cache.popitem(last=False)
+            _cache_bytes -= sum(len(out) for _, out in evicted)
+    return children
+
+
+def decode_layers(content, max_depth=MAX_DEPTH, max_layers=MAX_LAYERS, max_bytes=MAX_DECODED_BYTES):
+    """
+    Every payload decoded out of `content` (bytes), breadth-first, as Layers.
+    Parents precede their children; Layer.parent indexes into the result.
+    """
+    layers = []
+    seen = {hashlib.sha256(content).digest()}
+    budget = max_bytes
+    queue = deque([(content, None, 0)])
+    while queue and len(layers) < max_layers and budget > 0:
+        data, parent, depth = queue.popleft()
+        if depth >= max_depth:
+            continue
+        for encoding, out, truncated in _cached_children(data, budget):
+            digest = hashlib.sha256(out).digest()
+            if digest in seen:
+                continue
+            seen.add(digest)
+            if len(out) > budget:
+                out, truncated = out[:budget], True
+            budget -= len(out)
+            # marshal output is a listing of names and constants, not source in any language
+            kind = "text" if encoding == "marshal" else _layer_kind(out)
+            layers.append(Layer(out, encoding, kind, depth + 1, parent, truncated))
+            queue.append((out, len(layers) - 1, depth + 1))
+            if len(layers) >= max_layers or budget <= 0:
+                break
+    return layers
@@ -1,23 +1,36 @@
 # core/deobfuscator.py
+from core.rules import get_ruleset
 
-def explain_code(code):
+RULES = get_ruleset("python")
+NO_FINDINGS = "No obvious malicious behavior found. Static analysis only."
+
+
+def _analysis_features(analysis):
+    """Feature sets the rules in rules/python.json test, from core.parser.analyze_python output."""
+    calls = set(analysis.get("calls", {}))
+    return {
+        "parsed": True,
+        "calls": calls,
+        "modules": {m.split(".")[0] for m in analysis.get("imports", [])} | {c.split(".")[0] for c in calls},
+        "call_names": {c.rsplit(".", 1)[-1] for c in calls},
+    }
+
+
+def explain_code(code, analysis=None):
     """
     Provide a basic explanation of code logic.
     Only works for Python source files.
 
     Args:
         code (str): Raw source code string.
+        analysis (dict): Optional core.parser.analyze_python result for `code`;
+            when it parsed cleanly the rules use it instead of rescanning the text.
 
     Returns:
-        str: Human-readable explanation of logic.
+        str: Human-readable explanation of logic (from the first matching rule).
     """
-    if "os.system" in code or "subprocess" in code:
-        return "This code executes system commands."
-    elif "socket" in code:
-        return "This code uses networking (e.g., sending/receiving data)."
-    elif "open(" in code and "write" in code:
-        return "This code writes data to a file."
-    elif "eval(" in code or "exec(" in code:
-        return "This code dynamically executes code – possible obfuscation or injection."
+    if analysis is not None and analysis.get("syntax_error") is None:
+        matches = RULES.match(features=_analysis_features(analysis), data=b"")
     else:
-        return "No obvious malicious behavior found. Static analysis only."
+        matches = RULES.match(features={"parsed": False}, data=code.encode("latin1", errors="ignore"))
+    return matches[0]["meta"]["explanation"] if matches else NO_FINDINGS
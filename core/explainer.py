@@ -1,4 +1,9 @@
 # core/explainer.py
+import weakref
+
+import numpy as np
+from scipy import sparse
+
 
 def explain_functions(function_names):
     """
@@ -16,3 +21,111 @@ def explain_functions(function_names):
         explanation += f"{func}: {known.get(func, 'No description available.')}\n"
 
     return explanation
+
+
+# --- Forest attributions -------------------------------------------------------
+
+# forest -> (bias, leaf path matrix, node offsets); one entry per loaded forest (e.g. every
+# ensemble member), dropped when the forest itself is unloaded
+_path_cache = weakref.WeakKeyDictionary()
+
+
+def _node_probabilities(tree):
+    value = tree.value[:, 0, :]
+    totals = value.sum(axis=1, keepdims=True)
+    return value / np.where(totals == 0, 1, totals)
+
+
+def _leaf_paths(forest):
+    """
+    Per-forest constants, built once per loaded model:
+      bias    (n_classes,)   mean root class distribution over the trees
+      paths   sparse (total_nodes, n_features * n_classes); the row of each leaf
+              holds, per feature, the summed change in class distribution made
+              by the splits on that feature along the path to the leaf
+              (already divided by the number of trees)
+      offsets first node row of each tree
+    """
+    cached = _path_cache.get(forest)
+    if cached is not None:
+        return cached
+
+    n_classes = forest.n_classes_
+    width = forest.n_features_in_ * n_classes
+    n_trees = len(forest.estimators_)
+    classes = np.arange(n_classes)
+    bias = np.zeros(n_classes)
+    rows, cols, data = [np.zeros(0, dtype=np.intp)], [np.zeros(0, dtype=np.intp)], [np.zeros(0)]
+    offsets = [0]
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        probs = _node_probabilities(tree)
+        bias += probs[0]
+        split = np.flatnonzero(tree.children_left >= 0)
+        parent = np.zeros(tree.node_count, dtype=np.intp)
+        parent[tree.children_left[split]] = split
+        parent[tree.children_right[split]] = split
+        # Walk every leaf up to the root one level at a time, emitting one
+        # (leaf, feature, class) entry per split; repeated features are summed
+        # by the COO -> CSR conversion, so no dense node x width row is built
+        leaves = np.flatnonzero(tree.children_left < 0)
+        node = leaves = leaves[leaves != 0]       # a root-only tree has no splits
+        while node.size:
+            up = parent[node]
+            rows.append(np.repeat(leaves + offsets[-1], n_classes))
+            cols.append((tree.feature[up][:, None] * n_classes + classes).ravel())
+            data.append((probs[node] - probs[up]).ravel())
+            walking = up != 0
+            leaves, node = leaves[walking], up[walking]
+        offsets.append(offsets[-1] + tree.node_count)
+
+    paths = sparse.coo_matrix((np.concatenate(data) / n_trees, (np.concatenate(rows), np.concatenate(cols))),
+                              shape=(offsets[-1], width)).tocsr()
+    paths.eliminate_zeros()
+    bias /= n_trees
+    _path_cache[forest] = (bias, paths, np.array(offsets[:-1]))
+    return _path_cache[forest]
+
+
+def forest_contributions(forest, X):
+    """
+    Exact tree-path (Saabas) attributions for a RandomForest/ExtraTrees classifier.
+
+    For every sample, predict_proba(X) == bias + contributions.sum(axis=1): each
+    split on the sample's path in each tree credits its feature with the change
+    in class distribution it causes, averaged over the forest. The trees are
+    walked once (forest.apply) and a single sparse product over the
+    precomputed leaf paths covers all trees and the whole batch.
+
+    Returns (bias (n_classes,), contributions (n_samples, n_features, n_classes)).
+    """
+    bias, paths, offsets = _leaf_paths(forest)
+    leaves = forest.apply(X) + offsets                  # (n_samples, n_trees) global leaf rows
+    n_samples, n_trees = leaves.shape
+    onehot = sparse.csr_matrix((np.ones(leaves.size), leaves.ravel(), np.arange(0, leaves.size + 1, n_trees)),
+                               shape=(n_samples, paths.shape[0]))
+    contributions = (onehot @ paths).toarray()
+    return bias, contributions.reshape(n_samples, forest.n_features_in_, forest.n_classes_)
+
+
+def supports_contributions(model):
+    return hasattr(model, "estimators_") and hasattr(model, "apply") and hasattr(model, "n_classes_")
+
+
+def precompute(model):
+    """Build the leaf path table now (e.g. before forking workers that should share it)."""
+    if supports_contributions(model):
+        _leaf_paths(model)
+
+
+def top_contributions(contributions, class_index, feature_names, values, k=5):
+    """
+    The k features that moved one sample's probability for `class_index` the
+    most (either way): [{"feature", "value", "contribution"}].
+    """
+    column = contributions[:, class_index]
+    order = np.argsort(-np.abs(column))[:k]
+    return [{"feature": feature_names[i] if i < len(feature_names) else f"f{i}",
+             "value": round(float(values[i]), 4),
+             "contribution": round(float(column[i]), 4)}
+            for i in order if column[i] != 0]
@@ -0,0 +1,121 @@
+# core/feature_graph.py
+"""
+Demand-driven feature computation.
+
+Extraction is a graph of named nodes, each declaring the nodes it is computed
+from. Evaluation.compute() runs the requested targets and, recursively, only
+what they depend on, each node at most once per sample: the file is read once and
+its bytes are shared by strings, entropy, imports and opcode n-grams, while
+nodes nobody asked for (the disassembly listing, unused opcode blocks) never
+run. Evaluation.summary() records what was computed, how long it took and
+what was skipped, with the bytes each skipped scan would have read.
+
+targets_for() maps a model's feature schema (core.training.feature_names) to
+the nodes its vector needs; callers add REPORT_NODES for what the report shows.
+"""
+import time
+
+from core import progress
+
+# Nodes the report shows; core.classifier also counts the primary features over them
+REPORT_NODES = ("strings", "imports", "protocols")
+
+# Derived model features -> graph nodes their value comes from; other names are primary feature counts
+SCHEMA_NODES = {
+    "file_size": ("file_size",),
+    "entropy": ("entropy",),
+    "num_strings": ("strings",),
+    "num_imports": ("imports",),
+    "num_functions": (),
+    "num_params": (),
+}
+
+
+def targets_for(feature_names, opcode_width=0):
+    """Graph nodes needed to build a vector with these feature names (core.training.feature_names)."""
+    targets = {f"opcodes:{opcode_width}"} if opcode_width else set()
+    for name in feature_names:
+        if not name.startswith("opcode_ngram["):
+            targets.update(SCHEMA_NODES.get(name, REPORT_NODES))
+    return targets
+
+
+class FeatureGraph:
+    """Named extraction steps; inputs that are not nodes are passed to evaluation() as sources."""
+
+    def __init__(self):
+        self._nodes = {}    # name -> (inputs, fn, scans)
+
+    def node(self, name, *inputs, scans=False):
+        """
+        Register fn(*input values) as node `name`. Targets "name:param" call
+        fn(*input values, param), one memoized value per parameter. scans=True
+        marks nodes that walk the whole content, so skipping them is reported
+        in bytes.
+        """
+        def register(fn):
+            self._nodes[name] = (inputs, fn, scans)
+            return fn
+        return register
+
+    @property
+    def names(self):
+        return list(self._nodes)
+
+    def evaluation(self, **sources):
+        return Evaluation(self, sources)
+
+
+class Evaluation:
+    """Node values of one sample, computed on first get()."""
+
+    def __init__(self, graph, sources):
+        self.graph = graph
+        self.values = dict(sources)
+        self.timings = {}
+
+    def compute(self, targets):
+        for target in sorted(targets):
+            self.get(target)
+        return self
+
+    def get(self, name):
+        if name not in self.values:
+            node, _, param = name.partition(":")
+            inputs, fn, _ = self.graph._nodes[node]
+            args = [self.get(i) for i in inputs]
+            if param:
+                args.append(param)
+            progress.stage(f"extract.{node}")
+            start = time.perf_counter()
+            self.values[name] = fn(*args)
+            self.timings[name] = time.perf_counter() - start   # own time, inputs excluded
+        return self.values[name]
+
+    def summary(self):
+        """{"computed": {node: ms}, "skipped": {node: bytes it would have scanned}}"""
+        size = len(self.values.get("content") or b"")
+        computed = {name.partition(":")[0] for name in self.timings}
+        return {
+            "computed": {name: round(t * 1000, 3) for name, t in self.timings.items()},
+            "skipped": {name: size if scans else 0
+                        for name, (_, _, scans) in self.graph._nodes.items() if name not in computed},
+        }
+
+
+def merge_summaries(total, summary):
+    """Add one Evaluation.summary() (e.g. an archive member's) into `total`, in place."""
+    for part in ("computed", "skipped"):
+        into = total.setdefault(part, {})
+        for name, value in summary.get(part, {}).items():
+            into[name] = round(into.get(name, 0) + value, 3)
+    return total
+
+
+def member_targets(targets):
+    """
+    Targets for the members of an archive or other container: only the report
+    fields, since derived values such as size and entropy describe the
+    container itself.
+    """
+    return None if targets is None else {t for t in targets if t in REPORT_NODES}
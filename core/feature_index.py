@@ -0,0 +1,229 @@
+# core/feature_index.py
+"""
+Corpus-wide document frequency of strings and imports, per family.
+
+The primary features are 13 hand-picked keywords, while every sample carries
+hundreds of strings and imports. FrequencyIndex makes one streaming pass over
+the corpus and counts, for every token, how many samples of each family
+contain it. The vocabulary does not have to fit in memory: the in-memory
+counts are spilled as sorted runs (JSON lines, RUN_TOKENS tokens each) to a
+temporary directory and k-way merged at the end, so the counts are exact.
+
+select() scores each token by the mutual information between "sample
+contains it" and the family, and keeps the top k as the extended feature
+list (models/extended_features.json). Only training rows may be indexed, or
+the held-out labels take part in the selection: core.training extracts the
+corpus once, keeping each sample's tokens in a TokenSpool, and indexes the
+training split's rows from it after the split is known. Training appends one presence column
+per selected token to the vector (core.training.vectorize); at inference,
+ExtendedFeatures looks each of a sample's tokens up in a dict built once
+from the list, so the cost is one hash lookup per token.
+
+    python train_model.py --extended-features 256
+"""
+import os
+import json
+import math
+import heapq
+import shutil
+import tempfile
+from collections import Counter, defaultdict
+from itertools import groupby
+
+MODELS_DIR = os.path.join(os.path.dirname(__file__), '../models')
+EXTENDED_FEATURES_PATH = os.path.join(MODELS_DIR, 'extended_features.json')
+DEFAULT_TOP_K = 256
+DEFAULT_MIN_DF = 3           # samples a token must appear in to be considered
+RUN_TOKENS = 200000          # distinct tokens held in memory before a sorted run is written
+KINDS = ("strings", "imports")
+_COLUMN_PREFIX = {"strings": "has_string", "imports": "has_import"}
+
+
+def sample_tokens(features):
+    """{kind: set of tokens} of one feature dict, as used by both training and inference."""
+    tokens = {}
+    for kind in KINDS:
+        value = features.get(kind) or []
+        tokens[kind] = {str(v) for v in value} if not isinstance(value, (str, bytes)) else {value}
+    return tokens
+
+
+def column_name(kind, token):
+    return f"{_COLUMN_PREFIX[kind]}[{token}]"
+
+
+def _mutual_information(df, documents, total):
+    """I(token present; family) in bits, from per-family document frequencies."""
+    present = sum(df.values())
+    absent = total - present
+    if not present or not absent:
+        return 0.0
+    score = 0.0
+    for family, n in documents.items():
+        for joint, marginal in ((df.get(family, 0), present), (n - df.get(family, 0), absent)):
+            if joint:
+                score += joint / total * math.log2(joint * total / (marginal * n))
+    return score
+
+
+class FrequencyIndex:
+    """
+    Per-family document frequencies of strings and imports over a corpus,
+    accumulated with add() and merged from sorted runs on disk.
+    """
+
+    def __init__(self, run_tokens=RUN_TOKENS, tmp_dir=None):
+        self.run_tokens = run_tokens
+        self.documents = Counter()                  # family -> samples added
+        self._counts = defaultdict(Counter)         # (kind, token) -> {family: samples}
+        self._dir = tempfile.mkdtemp(prefix="feature_index_", dir=tmp_dir)
+        self._runs = []
+
+    def close(self):
+        shutil.rmtree(self._dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, family, features):
+        """Count one sample's distinct tokens towards its family."""
+        self.add_tokens(family, sample_tokens(features))
+
+    def add_tokens(self, family, tokens):
+        """add() for a sample_tokens() dict, e.g. read back from a TokenSpool."""
+        self.documents[family] += 1
+        for kind, values in tokens.items():
+            for token in values:
+                self._counts[(kind, token)][family] += 1
+        if len(self._counts) >= self.run_tokens:
+            self._spill()
+
+    def _spill(self):
+        path = os.path.join(self._dir, f"run_{len(self._runs):05d}.jsonl")
+        with open(path, "w") as f:
+            for key in sorted(self._counts):
+                f.write(json.dumps([key[0], key[1], self._counts[key]]) + "\n")
+        self._runs.append(path)
+        self._counts.clear()
+
+    def _read_run(self, path):
+        with open(path) as f:
+            for line in f:
+                kind, token, df = json.loads(line)
+                yield (kind, token), df
+
+    def items(self):
+        """((kind, token), {family: samples}) for every token, in sorted order, runs merged."""
+        if self._counts or not self._runs:
+            self._spill()
+        files = [self._read_run(path) for path in self._runs]
+        for key, group in groupby(heapq.merge(*files, key=lambda item: item[0]), key=lambda item: item[0]):
+            df = Counter()
+            for _, counts in group:
+                df.update(counts)
+            yield key, df
+
+    def select(self, k=DEFAULT_TOP_K, min_df=DEFAULT_MIN_DF):
+        """The k tokens most informative about the family, best first, as extended feature entries."""
+        total = sum(self.documents.values())
+        best = []          # min-heap of (score, kind, token, df)
+        for (kind, token), df in self.items():
+            if sum(df.values()) < min_df:
+                continue
+            entry = (_mutual_information(df, self.documents, total), kind, token, dict(df))
+            if len(best) < k:
+                heapq.heappush(best, entry)
+            elif entry > best[0]:
+                heapq.heapreplace(best, entry)
+        return [{"kind": kind, "token": token, "score": round(score, 6), "df": df}
+                for score, kind, token, df in sorted(best, reverse=True)]
+
+
+class TokenSpool:
+    """
+    Every sample's sample_tokens(), in row order, in a temporary JSON-lines
+    file, so the extraction pass can be indexed and vectorized from later.
+    """
+
+    def __init__(self, tmp_dir=None):
+        fd, self.path = tempfile.mkstemp(prefix="tokens_", suffix=".jsonl", dir=tmp_dir)
+        self._file = os.fdopen(fd, "w")
+        self.rows = 0
+
+    def add(self, features):
+        tokens = sample_tokens(features)
+        self._file.write(json.dumps({kind: sorted(values) for kind, values in tokens.items()}) + "\n")
+        self.rows += 1
+
+    def __len__(self):
+        return self.rows
+
+    def __iter__(self):
+        """sample_tokens()-style dicts (lists rather than sets), one per row."""
+        self._file.flush()
+        with open(self.path) as f:
+            for line in f:
+                yield json.loads(line)
+
+    def close(self):
+        self._file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def save_extended_features(entries, documents, path=EXTENDED_FEATURES_PATH):
+    """Write the selected tokens (FrequencyIndex.select) with the corpus size they were chosen on."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"documents": dict(documents), "features": entries}, f, indent=1)
+    os.replace(tmp, path)
+    return path
+
+
+def load_extended_features(path=EXTENDED_FEATURES_PATH):
+    """[(kind, token)] in column order, or [] if no list was saved."""
+    try:
+        with open(path) as f:
+            return [(e["kind"], e["token"]) for e in json.load(f)["features"]]
+    except (OSError, ValueError, KeyError, TypeError):
+        return []
+
+
+class ExtendedFeatures:
+    """Presence columns for a fixed token list, looked up through one dict per kind."""
+
+    def __init__(self, tokens=()):
+        self.tokens = [tuple(t) for t in tokens]
+        self._columns = {kind: {} for kind in KINDS}
+        for i, (kind, token) in enumerate(self.tokens):
+            self._columns[kind][token] = i
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def names(self):
+        return [column_name(kind, token) for kind, token in self.tokens]
+
+    def vector(self, tokens):
+        """0/1 per selected token, from a sample_tokens() dict."""
+        row = [0] * len(self.tokens)
+        for kind, columns in self._columns.items():
+            if not columns:
+                continue
+            for token in tokens.get(kind, ()):
+                i = columns.get(token)
+                if i is not None:
+                    row[i] = 1
+        return row
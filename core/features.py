@@ -1,13 +1,21 @@
 # features.py
-import os
 import re
 import pefile
 import lief
 import zipfile
 lief.logging.disable()
 
-from .parser import extract_python_features, extract_functions
-from .archive_tools import extract_from_archive
+from .parser import analyze_python
+from .deobfuscator import explain_code, NO_FINDINGS
+from .archive_tools import extract_from_archive, extract_from_archive_bytes, merge_features
+from .string_table import StringTable
+from .script_analyzer import analyze_script
+from . import decoder
+from . import filetype
+from . import progress
+from .feature_graph import FeatureGraph
+from .opcodes import opcode_ngram_vector
+from .utils import byte_entropy
 PRIMARY_FEATURES = [
     'HTTP', 'FTP', 'SMTP', 'DNS',
     'os.system', 'subprocess', 'eval', 'exec', 'open',
@@ -33,96 +41,212 @@ def extract_assembly(binary):
 
     return assembly
 
-def extract_features_from_file(file_path):
+def extract_features_from_file(file_path, kind=None, depth=0, targets=None):
     """
-    Extract features from any file type.
+    Extract features from any file type, routed on its content (core.filetype):
     Python: functions, imports, calls
+    Scripts: strings, protocols, commands (no disassembly or binary parsing)
     Archives: recursively extract contained files
     Binaries: imports, strings, protocols, low-level instructions
+
+    targets: BINARY_GRAPH nodes to compute for binaries (core.feature_graph);
+    None computes every field, as training does.
+    """
+    if kind is None:
+        progress.stage("extract.sniff")
+        kind = filetype.detect(file_path)
+    route = filetype.route(kind)
+
+    if route == "python":
+        return _extract_python(file_path, depth)
+    elif route == "script":
+        return _extract_script(file_path, kind, depth)
+    elif route == "archive":
+        return extract_from_archive(file_path, kind, depth, targets)
+    else:
+        return extract_features_from_binary(file_path, kind, targets)
+
+
+def extract_features_from_bytes(content, name="", kind=None, depth=0, decode=True, targets=None):
     """
-    ext = os.path.splitext(file_path)[-1].lower()
-
-    if ext == ".py":
-        return _extract_python(file_path)
-    elif ext in [".zip", ".tar", ".tar.gz", ".tgz"]:
-        return extract_from_archive(file_path)
-    elif ext in [".exe", ".dll", ".elf", ".so", ".msi"]:
-        return extract_features_from_binary(file_path)
+    In-memory counterpart of extract_features_from_file, for payloads that never
+    touch the disk: decoded layers (core.decoder) and members of decoded archives.
+    """
+    if kind is None:
+        kind = filetype.sniff(content[:filetype.HEAD_BYTES], name)
+    route = filetype.route(kind)
+
+    if route == "python":
+        return _python_features(filetype.decode_text(content), depth, decode)
+    elif route == "script":
+        return _script_features(filetype.decode_text(content), kind, depth, decode)
+    elif route == "archive":
+        return extract_from_archive_bytes(content, kind, depth, targets)
     else:
-        # Attempt generic binary analysis
-        return extract_features_from_binary(file_path)
+        return _binary_features(content, kind, targets=targets)
 
 
-def _extract_python(file_path):
-    """Extract Python-specific features"""
+def _merge_decoded(features, text, depth):
+    """
+    Unwrap encoded payloads in `text` (core.decoder), merge the features of every
+    decoded layer into `features` and record the chain under "decode_chain".
+    """
+    progress.stage("extract.decode")
+    layers = decoder.decode_layers(text.encode("utf-8", errors="ignore"))
+    if not layers:
+        return features
+    # decoded strings go where this extractor keeps its own (python: string_constants)
+    strings_key = "string_constants" if "string_constants" in features else "strings"
+    for layer in layers:
+        if not layer.analyzable:
+            continue
+        sub = extract_features_from_bytes(layer.data, kind=layer.kind, depth=depth, decode=False)
+        if sub.get("explanation") == NO_FINDINGS:
+            del sub["explanation"]
+        elif sub.get("explanation") and features.get("explanation") == NO_FINDINGS:
+            features["explanation"] = sub.pop("explanation")   # the payload explains what the loader did not
+        tables = [sub.pop(k) for k in ("strings", "string_constants") if k in sub]
+        if tables:
+            sub[strings_key] = StringTable.merge(tables)
+        merge_features(features, sub)
+    features["decode_chain"] = [layer.summary() for layer in layers]
+    return features
+
+
+def _extract_python(file_path, depth=0):
+    """Extract Python-specific features from a single parse of the source"""
     try:
         with open(file_path, "r", errors="ignore") as f:
             code = f.read()
-            features = extract_python_features(code)
-            features['functions'] = extract_functions(code)
-            features['imports'] = _extract_python_imports(code)
-            features['params'] = _extract_function_params(code)
-            return features
     except Exception:
         return {}
+    return _python_features(code, depth)
 
 
-def _extract_python_imports(code):
-    """Return a list of imported modules"""
-    imports = re.findall(r'^\s*import (\S+)|^\s*from (\S+) import', code, re.MULTILINE)
-    return list({m for tup in imports for m in tup if m})
+def _python_features(code, depth=0, decode=True):
+    analysis = analyze_python(code)
+    features = dict(analysis["flags"])
+    features['functions'] = analysis["functions"]
+    features['imports'] = analysis["imports"]
+    features['params'] = analysis["params"]
+    features['calls'] = analysis["calls"]
+    features['urls'] = analysis["urls"]
+    features['string_constants'] = StringTable(s for s in analysis["strings"] if s.isprintable())
+    features['explanation'] = explain_code(code, analysis)
+    if decode:
+        _merge_decoded(features, code, depth)
+    return features
 
 
-def _extract_function_params(code):
-    """Return a dict of function names and their parameters"""
-    funcs = re.findall(r'def (\w+)\((.*?)\):', code)
-    return {name: params.split(',') if params else [] for name, params in funcs}
+def _detect_protocols(text):
+    lowered = text.lower()
+    return [name for name in ("HTTP", "FTP", "SMTP", "DNS") if name.lower() in lowered]
 
 
-def extract_features_from_binary(path):
-    """
-    Safe, consistent binary feature extractor.
-    NEVER returns ellipsis (...) and ALWAYS returns all fields.
-    """
-    features = {
+def _empty_features():
+    """The fields every extractor fills, empty."""
+    return {
         "protocols": [],
         "permissions": [],
         "files": [],
-        "strings": [],
+        "strings": StringTable(),
         "imports": [],
         "assembly": []
     }
 
+
+def _extract_script(file_path, kind, depth=0):
+    """Text payloads: the fields every extractor fills plus core.script_analyzer's."""
+    try:
+        progress.stage("extract.read")
+        with open(file_path, "rb") as f:
+            text = filetype.decode_text(f.read())
+    except Exception as e:
+        print(f"[!] Script extraction error: {e}")
+        return _empty_features()
+    return _script_features(text, kind, depth)
+
+
+def _script_features(text, kind, depth=0, decode=True):
+    features = _empty_features()
+    progress.stage("extract.script")
+    features["strings"] = _extract_strings(text.encode("utf-8", errors="ignore"))
+    features["protocols"] = _detect_protocols(text)
+    features.update(analyze_script(text, kind))
+    if decode:
+        _merge_decoded(features, text, depth)
+    return features
+
+
+def extract_features_from_binary(path, kind=None, targets=None):
+    """
+    Safe, consistent binary feature extractor.
+    NEVER returns ellipsis (...) and ALWAYS returns all fields.
+    """
     try:
+        progress.stage("extract.read")
         with open(path, "rb") as f:
             content = f.read()
-            text = content.decode(errors="ignore")
+    except Exception as e:
+        print(f"[!] Binary extraction error: {e}")
+        return _empty_features()  # return safe empty structure
+    return _binary_features(content, kind, path, targets)
 
-        # --- Strings ---
-        features["strings"] = _extract_strings(content)
 
-        # --- Imports ---
-        features["imports"] = _extract_imports(path)
+# Binary extraction as a dependency graph over the file's bytes (core.feature_graph).
+# Sources: content, path (may be None) and kind (None: sniffed from content).
+BINARY_GRAPH = FeatureGraph()
+BINARY_FIELDS = ("strings", "imports", "assembly", "protocols")   # report fields; all of them when targets=None
+DERIVED_NODES = ("file_size", "entropy")                           # reused by core.classifier.vector_parts
 
-        # --- Assembly ---
-        asm = extract_assembly(content)
-        if asm:
-            features["assembly"] = asm[:200]  # limit for safety
+BINARY_GRAPH.node("text", "content")(lambda content: content.decode(errors="ignore"))
+BINARY_GRAPH.node("file_size", "content")(len)
+BINARY_GRAPH.node("entropy", "content", scans=True)(byte_entropy)
+BINARY_GRAPH.node("protocols", "text")(_detect_protocols)
+BINARY_GRAPH.node("strings", "content", scans=True)(lambda content: _extract_strings(content))   # defined below
 
-        # --- Protocol detection in strings ---
-        protocols = []
-        if "http" in text.lower(): protocols.append("HTTP")
-        if "ftp" in text.lower(): protocols.append("FTP")
-        if "smtp" in text.lower(): protocols.append("SMTP")
-        if "dns" in text.lower(): protocols.append("DNS")
 
-        features["protocols"] = protocols
+@BINARY_GRAPH.node("imports", "content", "path", "kind")
+def _binary_imports(content, path, kind):
+    return _extract_imports(content, kind or filetype.sniff(content[:filetype.HEAD_BYTES], path or ""))
+
+
+@BINARY_GRAPH.node("assembly", "content", scans=True)
+def _binary_assembly(content):
+    return extract_assembly(content)[:200]  # limit for safety
 
-        return features
 
+@BINARY_GRAPH.node("opcodes", "content", scans=True)
+def _binary_opcodes(content, width):
+    return opcode_ngram_vector(content, int(width)).tolist()
+
+
+def _binary_features(content, kind=None, path=None, targets=None):
+    """
+    Binary features of `content`, computed from BINARY_GRAPH. With `targets`,
+    only those nodes and their inputs run: the other fields stay empty, the
+    derived values computed on the way are kept under "derived" and the work
+    done and skipped under "feature_graph".
+    """
+    features = _empty_features()
+    evaluation = BINARY_GRAPH.evaluation(content=content, path=path, kind=kind)
+    try:
+        evaluation.compute(BINARY_FIELDS if targets is None else targets)
     except Exception as e:
-        print(f"[!] Binary extraction error: {e}")
-        return features  # return safe empty structure
+        print(f"[!] Binary extraction error: {e}")   # keep whatever was computed
+
+    values = evaluation.values
+    for key in BINARY_FIELDS:
+        if key in values:
+            features[key] = values[key]
+    if targets is not None:
+        derived = {key: values[key] for key in DERIVED_NODES if key in values}
+        opcodes = {int(key.partition(":")[2]): v for key, v in values.items() if key.startswith("opcodes:")}
+        if opcodes:
+            derived["opcodes"] = opcodes
+        features["derived"] = derived
+        features["feature_graph"] = evaluation.summary()
+    return features
 
 
 PE_HEADER_STRINGS = {
@@ -142,36 +266,24 @@ def is_ignored_string(s):
     return False
 
 def _extract_strings(binary_data, min_len=4):
-    result = []
-    current = ""
-
-    for b in binary_data:
-        if 32 <= b <= 126:
-            current += chr(b)
-        else:
-            if len(current) >= min_len and not is_ignored_string(current):
-                result.append(current)
-            current = ""
-
-    if len(current) >= min_len and not is_ignored_string(current):
-        result.append(current)
-
-    return result
+    """Printable ASCII runs of at least min_len bytes, collected into a StringTable."""
+    pattern = re.compile(rb'[\x20-\x7e]{%d,}' % min_len)
+    runs = (m.group().decode("latin1") for m in pattern.finditer(binary_data))
+    return StringTable(s for s in runs if not is_ignored_string(s))
 
 
 
-def _extract_imports(file_path):
-    """Extract imported functions and libraries from EXE/ELF"""
+def _extract_imports(source, kind):
+    """Extract imported functions and libraries from EXE/ELF (a path, or the file's bytes)"""
     imports = []
     try:
-        ext = os.path.splitext(file_path)[-1].lower()
-        if ext in [".exe", ".dll", ".msi"]:
-            pe = pefile.PE(file_path)
+        if kind == "pe":
+            pe = pefile.PE(source) if isinstance(source, str) else pefile.PE(data=source)
             if hasattr(pe, 'DIRECTORY_ENTRY_IMPORT'):
                 for entry in pe.DIRECTORY_ENTRY_IMPORT:
                     imports.append(entry.dll.decode())
-        elif ext in [".elf", ".so"]:
-            elf = lief.parse(file_path)
+        elif kind == "elf":
+            elf = lief.parse(source)
             if elf:
                 imports = [lib for lib in elf.libraries]
     except Exception:
@@ -0,0 +1,191 @@
+# core/filetype.py
+"""
+Content-based file-type detection.
+
+Samples are classified from their first bytes (magic numbers, shebang, text
+heuristics) rather than their extension, which MalwareBazaar drops often lack
+or fake. The extension is only a tie-breaker between text formats. Each kind
+maps to one extractor route in ROUTES:
+
+    binary   PE/ELF/unknown data: strings, imports, disassembly
+    archive  zip/apk/jar/tar/gzip: unpacked and analyzed member by member
+    python   AST-based analysis
+    script   other text (shell, batch, PowerShell, JS, VBS, plain text):
+             core.script_analyzer only, never capstone or lief
+"""
+import os
+import re
+import codecs
+import zipfile
+
+HEAD_BYTES = 4096
+
+ROUTES = {
+    "pe": "binary",
+    "elf": "binary",
+    "macho": "binary",
+    "ole": "binary",
+    "binary": "binary",
+    "zip": "archive",
+    "apk": "archive",
+    "jar": "archive",
+    "tar": "archive",
+    "gzip": "archive",
+    "bzip2": "archive",
+    "xz": "archive",
+    "python": "python",
+    "shell": "script",
+    "batch": "script",
+    "powershell": "script",
+    "javascript": "script",
+    "vbscript": "script",
+    "perl": "script",
+    "text": "script",
+}
+
+_MAGIC = [
+    (b"MZ", "pe"),
+    (b"\x7fELF", "elf"),
+    (b"PK\x03\x04", "zip"),
+    (b"PK\x05\x06", "zip"),       # empty archive
+    (b"\x1f\x8b", "gzip"),
+    (b"BZh", "bzip2"),
+    (b"\xfd7zXZ\x00", "xz"),
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "ole"),   # MSI, legacy Office
+    (b"\xcf\xfa\xed\xfe", "macho"),
+    (b"\xce\xfa\xed\xfe", "macho"),
+    (b"\xca\xfe\xba\xbe", "macho"),                 # fat binary (also Java class; both are binary)
+]
+
+
+
+def _is_pe(head):
+    """MZ header whose e_lfanew points at the PE signature inside the head."""
+    if len(head) < 0x40:
+        return False
+    e_lfanew = int.from_bytes(head[0x3c:0x40], "little")
+    return head[e_lfanew:e_lfanew + 4] == b"PE\0\0"
+
+
+# Magics short enough to start plain text need their next bytes to agree;
+# a failed check falls through to the text/binary heuristics
+_MAGIC_CHECKS = {
+    "pe": _is_pe,
+    "bzip2": lambda head: re.match(rb"BZh[1-9]", head) is not None,
+}
+
+_SHEBANGS = {
+    "python": "python", "sh": "shell", "bash": "shell", "dash": "shell", "zsh": "shell",
+    "ksh": "shell", "ash": "shell", "busybox": "shell", "node": "javascript",
+    "perl": "perl", "pwsh": "powershell", "powershell": "powershell",
+}
+
+_EXTENSIONS = {
+    ".py": "python", ".pyw": "python",
+    ".sh": "shell", ".bash": "shell",
+    ".bat": "batch", ".cmd": "batch",
+    ".ps1": "powershell", ".psm1": "powershell",
+    ".js": "javascript", ".jse": "javascript", ".mjs": "javascript",
+    ".vbs": "vbscript", ".vbe": "vbscript",
+    ".pl": "perl",
+}
+
+# Checked in order on text without a shebang or known extension
+_CONTENT_HINTS = [
+    ("batch", re.compile(r"^\s*@?echo\s+off\b|^\s*(?:set|goto|call)\s+\S|%~dp0", re.IGNORECASE | re.MULTILINE)),
+    ("powershell", re.compile(r"\b(?:Invoke-(?:Expression|WebRequest|RestMethod)|New-Object|Set-ExecutionPolicy"
+                              r"|Start-Process|\$env:|\[Convert\]::FromBase64String)", re.IGNORECASE)),
+    ("python", re.compile(r"^(?:import \w|from [\w.]+ import |def \w+\(.*\):|if __name__ == )", re.MULTILINE)),
+    ("shell", re.compile(r"^\s*(?:wget|curl|chmod|cd /tmp|rm -rf|busybox|nohup|export \w+=)\b", re.MULTILINE)),
+    ("vbscript", re.compile(r"\b(?:CreateObject|WScript\.Shell|Dim \w+)", re.IGNORECASE)),
+    ("javascript", re.compile(r"\b(?:function\s*\w*\s*\(|var \w+\s*=|ActiveXObject|document\.)")),
+]
+
+_TEXT_CONTROL = set(range(0x20)) - {0x09, 0x0a, 0x0c, 0x0d, 0x1b}
+
+
+def _decode_text(head):
+    """The head as text if it looks like UTF-8/UTF-16 text, else None."""
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        try:
+            return head.decode("utf-16")
+        except UnicodeDecodeError:
+            return None
+    if b"\x00" in head:
+        return None
+    try:
+        # final=False: a multi-byte character cut off by HEAD_BYTES is not an error
+        text = codecs.getincrementaldecoder("utf-8-sig")().decode(head, final=False)
+    except UnicodeDecodeError:
+        return None
+    control = sum(1 for b in head if b in _TEXT_CONTROL)
+    return text if control <= len(head) // 100 else None
+
+
+def decode_text(content):
+    """Whole-file text of a sample sniffed as text (BOM-aware, undecodable bytes dropped)."""
+    if content.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return content.decode("utf-16", errors="ignore")
+    return content.decode("utf-8-sig", errors="ignore")
+
+
+def _script_kind(text, name):
+    if text.startswith("#!"):
+        words = os.path.basename(text[2:].split("\n", 1)[0].strip()).split()
+        if words and words[0] == "env" and len(words) > 1:
+            words = words[1:]
+        if words:
+            interpreter = re.sub(r"[\d.]+$", "", words[0])   # python3.11 -> python
+            if interpreter in _SHEBANGS:
+                return _SHEBANGS[interpreter]
+    ext = os.path.splitext(name)[-1].lower()
+    if ext in _EXTENSIONS:
+        return _EXTENSIONS[ext]
+    for kind, pattern in _CONTENT_HINTS:
+        if pattern.search(text):
+            return kind
+    return "text"
+
+
+def _zip_kind(path):
+    """Tell APKs and JARs from plain zips by their central directory."""
+    try:
+        with zipfile.ZipFile(path) as zf:
+            names = set(zf.namelist())
+    except (zipfile.BadZipFile, OSError, ValueError):
+        return "zip"
+    if "AndroidManifest.xml" in names or "classes.dex" in names:
+        return "apk"
+    if "META-INF/MANIFEST.MF" in names:
+        return "jar"
+    return "zip"
+
+
+def sniff(head, name=""):
+    """Kind of a sample from its first bytes (and name, for text formats only)."""
+    for magic, kind in _MAGIC:
+        if head.startswith(magic) and _MAGIC_CHECKS.get(kind, bool)(head):
+            return kind
+    if head[257:262] == b"ustar":
+        return "tar"
+    text = _decode_text(head)
+    if text is None:
+        return "binary"
+    return _script_kind(text, name)
+
+
+def detect(path):
+    """Kind of the file at `path` (see ROUTES); unreadable files are "binary"."""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(HEAD_BYTES)
+    except OSError:
+        return "binary"
+    kind = sniff(head, path)
+    if kind == "zip":
+        kind = _zip_kind(path)
+    return kind
+
+
+def route(kind):
+    return ROUTES.get(kind, "binary")
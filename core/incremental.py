@@ -0,0 +1,134 @@
+# core/incremental.py
+"""
+Out-of-core training on a memory-mapped training matrix.
+
+Nothing here materializes the corpus: the scaler is fitted with partial_fit
+over chunks, class imbalance is handled with per-class sample weights instead
+of duplicated rows, and the classifier learns with partial_fit one chunk at a
+time. Peak memory is set by chunk_rows, not by the number of samples.
+
+On disk the matrix is ordered by family, so every epoch reads it as shuffled
+blocks of BLOCK_ROWS consecutive rows: each chunk mixes many families while
+reads stay sequential within a block.
+"""
+import logging
+
+import numpy as np
+from sklearn.linear_model import SGDClassifier
+from sklearn.naive_bayes import GaussianNB
+from sklearn.preprocessing import StandardScaler, LabelEncoder
+
+DEFAULT_CHUNK_ROWS = 8192
+BLOCK_ROWS = 256
+DEFAULT_EPOCHS = 5
+HOLDOUT = 0.1
+
+
+def incremental_models(random_state=42):
+    """Classifiers that support partial_fit and predict_proba, by CLI name."""
+    return {
+        "sgd": lambda: SGDClassifier(loss="log_loss", alpha=1e-4, average=True, random_state=random_state),
+        "nb": lambda: GaussianNB(),
+    }
+
+
+def _chunks(n, chunk_rows):
+    for start in range(0, n, chunk_rows):
+        yield start, min(start + chunk_rows, n)
+
+
+def _held_out(rows, fraction, random_state):
+    """Holdout flags from a hash of the row index, so every pass holds out the same rows."""
+    h = (rows.astype(np.uint64) + np.uint64(random_state)) * np.uint64(0x9E3779B97F4A7C15)
+    return (h >> np.uint64(40)).astype(np.float64) / 2.0 ** 24 < fraction
+
+
+def training_rows(n, holdout=HOLDOUT, random_state=42):
+    """Indices of the rows train_incremental() trains on (the rest are its holdout)."""
+    return np.flatnonzero(~_held_out(np.arange(n), holdout, random_state))
+
+
+def _label_counts(y, chunk_rows):
+    counts = {}
+    for start, stop in _chunks(len(y), chunk_rows):
+        labels, n = np.unique(np.asarray(y[start:stop]), return_counts=True)
+        for label, c in zip(labels, n):
+            counts[label] = counts.get(label, 0) + int(c)
+    return counts
+
+
+def balanced_weights(counts, label_encoder):
+    """Per-class weights n / (k * count_c), indexed by encoded label (sklearn's "balanced")."""
+    n, k = sum(counts.values()), len(counts)
+    return np.array([n / (k * counts[c]) for c in label_encoder.classes_])
+
+
+def _shuffled_chunks(n, chunk_rows, rng):
+    """Row index arrays of about chunk_rows rows, each drawn from random BLOCK_ROWS blocks."""
+    blocks = rng.permutation((n + BLOCK_ROWS - 1) // BLOCK_ROWS)
+    per_chunk = max(1, chunk_rows // BLOCK_ROWS)
+    for i in range(0, len(blocks), per_chunk):
+        rows = np.concatenate([np.arange(b * BLOCK_ROWS, min((b + 1) * BLOCK_ROWS, n))
+                               for b in np.sort(blocks[i:i + per_chunk])])
+        yield rows
+
+
+def train_incremental(X, y, model_name="sgd", epochs=DEFAULT_EPOCHS, chunk_rows=DEFAULT_CHUNK_ROWS,
+                      holdout=HOLDOUT, random_state=42):
+    """
+    Train on (X, y), typically memory-mapped, without loading them whole.
+    Returns (model, scaler, label_encoder, metrics) where metrics holds the
+    holdout accuracy, balanced accuracy and confusion matrix.
+    """
+    n = len(y)
+    counts = _label_counts(y, chunk_rows)
+    label_encoder = LabelEncoder().fit(sorted(counts))
+    weights = balanced_weights(counts, label_encoder)
+    classes = np.arange(len(label_encoder.classes_))
+    logging.info("[+] %d samples, %d classes; class weights: %s", n, len(classes),
+                 ", ".join(f"{c}={w:.2f}" for c, w in zip(label_encoder.classes_, weights)))
+
+    scaler = StandardScaler()
+    for start, stop in _chunks(n, chunk_rows):
+        train = ~_held_out(np.arange(start, stop), holdout, random_state)
+        if train.any():
+            scaler.partial_fit(np.asarray(X[start:stop])[train])
+
+    model = incremental_models(random_state)[model_name]()
+    rng = np.random.default_rng(random_state)
+    for epoch in range(epochs):
+        for rows in _shuffled_chunks(n, chunk_rows, rng):
+            train = ~_held_out(rows, holdout, random_state)
+            if not train.any():
+                continue
+            X_chunk = scaler.transform(np.asarray(X[rows])[train])
+            y_chunk = label_encoder.transform(np.asarray(y[rows])[train])
+            order = rng.permutation(len(y_chunk))
+            model.partial_fit(X_chunk[order], y_chunk[order], classes=classes,
+                              sample_weight=weights[y_chunk[order]])
+        logging.info("[+] Epoch %d/%d done", epoch + 1, epochs)
+
+    metrics = evaluate_incremental(model, scaler, label_encoder, X, y, chunk_rows, holdout, random_state)
+    return model, scaler, label_encoder, metrics
+
+
+def evaluate_incremental(model, scaler, label_encoder, X, y, chunk_rows=DEFAULT_CHUNK_ROWS,
+                         holdout=HOLDOUT, random_state=42):
+    """Accuracy over the held-out rows, accumulated as a confusion matrix chunk by chunk."""
+    k = len(label_encoder.classes_)
+    confusion = np.zeros((k, k), dtype=np.int64)
+    for start, stop in _chunks(len(y), chunk_rows):
+        held = _held_out(np.arange(start, stop), holdout, random_state)
+        if not held.any():
+            continue
+        y_true = label_encoder.transform(np.asarray(y[start:stop])[held])
+        y_pred = model.predict(scaler.transform(np.asarray(X[start:stop])[held]))
+        np.add.at(confusion, (y_true, y_pred), 1)
+    total = confusion.sum()
+    per_class = confusion.diagonal() / np.maximum(confusion.sum(axis=1), 1)
+    return {
+        "holdout_samples": int(total),
+        "accuracy": float(confusion.trace() / total) if total else 0.0,
+        "balanced_accuracy": float(per_class[confusion.sum(axis=1) > 0].mean()) if total else 0.0,
+        "confusion_matrix": confusion,
+    }
@@ -0,0 +1,142 @@
+# core/model_selection.py
+import time
+import logging
+
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestClassifier, ExtraTreesClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import ParameterGrid, GridSearchCV, StratifiedKFold
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.svm import SVC
+
+# Forests are scored on their out-of-bag estimate (one fit per grid point);
+# everything else goes through k-fold grid search.
+FOREST_CANDIDATES = {"random_forest", "extra_trees"}
+
+
+def candidate_models(random_state=42):
+    """Return {name: (estimator, param_grid)} for every model we compare."""
+    return {
+        "random_forest": (
+            RandomForestClassifier(oob_score=True, class_weight="balanced", random_state=random_state),
+            {"n_estimators": [100, 200, 400], "max_depth": [None, 20, 10], "max_features": ["sqrt", 0.5]},
+        ),
+        "extra_trees": (
+            ExtraTreesClassifier(bootstrap=True, oob_score=True, class_weight="balanced",
+                                 random_state=random_state),
+            {"n_estimators": [100, 200, 400], "max_depth": [None, 20], "max_features": ["sqrt", 0.5]},
+        ),
+        "svm_rbf": (
+            SVC(kernel="rbf", class_weight="balanced", random_state=random_state),
+            {"C": [0.3, 1, 3, 10], "gamma": ["scale", 0.1, 0.01]},
+        ),
+        "logistic_regression": (
+            LogisticRegression(max_iter=2000, class_weight="balanced"),
+            {"C": [0.1, 1, 10]},
+        ),
+        "knn": (
+            KNeighborsClassifier(),
+            {"n_neighbors": [3, 5, 9], "weights": ["uniform", "distance"]},
+        ),
+    }
+
+
+def _fit_oob(estimator, params, X, y):
+    est = clone(estimator).set_params(n_jobs=1, **params)
+    est.fit(X, y)
+    return params, est.oob_score_
+
+
+def _search_forest(estimator, grid, X, y, n_jobs):
+    results = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_oob)(estimator, params, X, y) for params in ParameterGrid(grid)
+    )
+    best_params, best_score = max(results, key=lambda r: r[1])
+    return best_params, best_score
+
+
+def _search_cv(estimator, grid, X, y, n_jobs, random_state):
+    # Small families (e.g. a handful of Backdoor samples) cap the number of folds
+    n_splits = max(2, min(5, np.bincount(y).min()))
+    cv = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=random_state)
+    search = GridSearchCV(estimator, grid, cv=cv, scoring="accuracy", n_jobs=n_jobs)
+    search.fit(X, y)
+    return search.best_params_, search.best_score_
+
+
+def _latency(model, X, rounds=50):
+    """Median single-sample predict_proba/predict time and amortized per-sample batch time."""
+    predict = model.predict_proba if hasattr(model, "predict_proba") else model.predict
+    singles = []
+    for row in X[:rounds]:
+        start = time.perf_counter()
+        predict(row.reshape(1, -1))
+        singles.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    predict(X)
+    batch = (time.perf_counter() - start) / len(X)
+    return float(np.median(singles)), batch
+
+
+def evaluate_candidates(X_train, y_train, X_test, y_test, names=None, n_jobs=-1, random_state=42):
+    """
+    Tune each candidate on the training split and score it on the held-out split.
+    Returns one leaderboard row (dict) per candidate.
+    """
+    rows = []
+    for name, (estimator, grid) in candidate_models(random_state).items():
+        if names and name not in names:
+            continue
+        logging.info("[+] Searching %s (%d settings)...", name, len(ParameterGrid(grid)))
+        start = time.perf_counter()
+        if name in FOREST_CANDIDATES:
+            best_params, val_score = _search_forest(estimator, grid, X_train, y_train, n_jobs)
+            val_kind = "oob"
+        else:
+            best_params, val_score = _search_cv(estimator, grid, X_train, y_train, n_jobs, random_state)
+            val_kind = "cv"
+        search_time = time.perf_counter() - start
+
+        model = clone(estimator).set_params(**best_params)
+        if "n_jobs" in model.get_params():
+            model.set_params(n_jobs=n_jobs)
+        start = time.perf_counter()
+        model.fit(X_train, y_train)
+        fit_time = time.perf_counter() - start
+
+        # Single-sample latency is what cli.py pays per file, so measure it single-threaded
+        if "n_jobs" in model.get_params():
+            model.set_params(n_jobs=1)
+        accuracy = float((model.predict(X_test) == y_test).mean())
+        single_latency, batch_latency = _latency(model, X_test)
+
+        rows.append({
+            "name": name,
+            "params": best_params,
+            "validation": val_score,
+            "validation_kind": val_kind,
+            "accuracy": accuracy,
+            "search_time": search_time,
+            "fit_time": fit_time,
+            "latency_single_ms": single_latency * 1000,
+            "latency_batch_ms": batch_latency * 1000,
+            "model": model,
+        })
+    rows.sort(key=lambda r: (-r["accuracy"], r["latency_single_ms"]))
+    return rows
+
+
+def format_leaderboard(rows):
+    header = (f"{'model':<20} {'val':>12} {'test acc':>9} {'search s':>9} {'fit s':>7} "
+              f"{'ms/sample':>10} {'ms/sample@batch':>16}  params")
+    lines = [header, "-" * len(header)]
+    for r in rows:
+        val = f"{r['validation']:.4f} ({r['validation_kind']})"
+        lines.append(
+            f"{r['name']:<20} {val:>12} {r['accuracy']:>9.4f} {r['search_time']:>9.2f} "
+            f"{r['fit_time']:>7.2f} {r['latency_single_ms']:>10.3f} {r['latency_batch_ms']:>16.4f}  "
+            f"{r['params']}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,169 @@
+# core/opcodes.py
+"""
+Hashed opcode n-gram features.
+
+Executable sections are disassembled with capstone's disasm_lite (mnemonics only,
+no instruction objects), every 1-, 2- and 3-gram of mnemonics is hashed into
+`width` buckets, and the counts are normalised to frequencies so large and small
+binaries are comparable. Each section contributes at most SECTION_BUDGET
+instructions, which keeps the cost per sample bounded (see
+benchmarks/opcode_ngrams.py for the latency budget).
+"""
+import zlib
+
+import lief
+import numpy as np
+from capstone import (Cs, CS_ARCH_X86, CS_ARCH_ARM, CS_ARCH_ARM64, CS_ARCH_MIPS,
+                      CS_MODE_32, CS_MODE_64, CS_MODE_ARM, CS_MODE_MIPS32,
+                      CS_MODE_LITTLE_ENDIAN, CS_MODE_BIG_ENDIAN)
+lief.logging.disable()
+
+DEFAULT_WIDTH = 256
+SECTION_BUDGET = 4096        # instructions per executable section
+MAX_SECTIONS = 8
+MAX_INSN_BYTES = 15          # longest x86 instruction; bounds the bytes handed to capstone
+LATENCY_BUDGET_MS = 25.0     # per sample on the first (cold) call, enforced by benchmarks/opcode_ngrams.py
+
+# Odd 64-bit multipliers give 1-, 2- and 3-grams of the same mnemonics different buckets
+_K1 = np.uint64(0x9E3779B97F4A7C15)
+_K2 = np.uint64(0xC2B2AE3D27D4EB4F)
+_K3 = np.uint64(0x165667B19E3779F9)
+
+_mnemonic_ids = {}
+_disassemblers = {}
+
+
+def _mnemonic_id(mnemonic):
+    # crc32 rather than hash(): str hashes are salted per process
+    mid = _mnemonic_ids.get(mnemonic)
+    if mid is None:
+        mid = _mnemonic_ids[mnemonic] = zlib.crc32(mnemonic.encode()) + 1
+    return mid
+
+
+def _disassembler(arch, mode):
+    md = _disassemblers.get((arch, mode))
+    if md is None:
+        md = _disassemblers[(arch, mode)] = Cs(arch, mode)
+    return md
+
+
+def _elf_arch(binary):
+    machine = binary.header.machine_type
+    is64 = binary.header.identity_class == lief.ELF.Header.CLASS.ELF64
+    big = binary.header.identity_data == lief.ELF.Header.ELF_DATA.MSB
+    arch = lief.ELF.ARCH
+    if machine == arch.X86_64:
+        return CS_ARCH_X86, CS_MODE_64
+    if machine == arch.I386:
+        return CS_ARCH_X86, CS_MODE_32
+    if machine == arch.ARM:
+        return CS_ARCH_ARM, CS_MODE_ARM
+    if machine == arch.AARCH64:
+        return CS_ARCH_ARM64, CS_MODE_ARM
+    if machine == arch.MIPS:
+        return CS_ARCH_MIPS, CS_MODE_MIPS32 | (CS_MODE_BIG_ENDIAN if big else CS_MODE_LITTLE_ENDIAN)
+    return CS_ARCH_X86, CS_MODE_64 if is64 else CS_MODE_32
+
+
+def executable_regions(content):
+    """
+    Return (arch, mode, [(address, bytes), ...]) for the executable code of a PE or ELF.
+    Unknown formats fall back to the whole buffer as x86-64, like extract_assembly.
+    """
+    try:
+        binary = lief.parse(bytes(content))
+    except Exception:
+        binary = None
+
+    regions = []
+    if isinstance(binary, lief.PE.Binary):
+        machine = binary.header.machine
+        mode = CS_MODE_32 if machine == lief.PE.Header.MACHINE_TYPES.I386 else CS_MODE_64
+        arch = CS_ARCH_X86
+        execute = lief.PE.Section.CHARACTERISTICS.MEM_EXECUTE
+        for s in binary.sections:
+            if s.has_characteristic(execute) and s.size:
+                regions.append((s.virtual_address, content[s.offset:s.offset + s.size]))
+    elif isinstance(binary, lief.ELF.Binary):
+        arch, mode = _elf_arch(binary)
+        execinstr = lief.ELF.Section.FLAGS.EXECINSTR
+        for s in binary.sections:
+            if s.has(execinstr) and s.size and s.type != lief.ELF.Section.TYPE.NOBITS:
+                regions.append((s.virtual_address, content[s.offset:s.offset + s.size]))
+        if not regions:
+            # Stripped section headers (common for packed IoT malware): use X segments
+            for seg in binary.segments:
+                if seg.type == lief.ELF.Segment.TYPE.LOAD and seg.has(lief.ELF.Segment.FLAGS.X):
+                    regions.append((seg.virtual_address,
+                                    content[seg.file_offset:seg.file_offset + seg.physical_size]))
+    else:
+        arch, mode = CS_ARCH_X86, CS_MODE_64
+        regions.append((0x1000, content))
+
+    return arch, mode, [r for r in regions[:MAX_SECTIONS] if r[1]]
+
+
+def _section_mnemonics(md, code, address, budget):
+    """
+    Up to `budget` mnemonics from one region. disasm_lite stops at the first
+    invalid byte, so decoding resumes one byte later (each skip costs budget).
+    The region is copied once into a bytearray: capstone takes a writable
+    buffer by reference, so resuming on a memoryview slice copies nothing.
+    """
+    code = memoryview(bytearray(code[:budget * MAX_INSN_BYTES]))
+    mnemonics = []
+    offset = 0
+    while offset < len(code) and len(mnemonics) < budget:
+        decoded = False
+        for _, size, mnemonic, _ in md.disasm_lite(code[offset:], address + offset,
+                                                   budget - len(mnemonics)):
+            mnemonics.append(mnemonic)
+            offset += size
+            decoded = True
+        if not decoded:
+            offset += 1
+            budget -= 1
+    return mnemonics
+
+
+def mnemonic_ngrams(ids, width=DEFAULT_WIDTH):
+    """Hash 1-3-grams of a uint64 id sequence into `width` normalised buckets."""
+    vector = np.zeros(width, dtype=np.float32)
+    if ids.size == 0:
+        return vector
+    grams = [ids * _K1]
+    if ids.size > 1:
+        grams.append(ids[:-1] * _K1 ^ ids[1:] * _K2)
+    if ids.size > 2:
+        grams.append(ids[:-2] * _K1 ^ ids[1:-1] * _K2 ^ ids[2:] * _K3)
+    hashed = np.concatenate(grams)
+    hashed ^= hashed >> np.uint64(31)
+    counts = np.bincount((hashed % np.uint64(width)).astype(np.intp), minlength=width)
+    vector[:] = counts / hashed.size
+    return vector
+
+
+def opcode_ngram_vector(content, width=DEFAULT_WIDTH, budget=SECTION_BUDGET):
+    """Fixed-width opcode 1-3-gram frequency vector for a binary's raw bytes."""
+    arch, mode, regions = executable_regions(content)
+    md = _disassembler(arch, mode)
+    ids = []
+    for address, code in regions:
+        # n-grams never span two sections
+        section_ids = [_mnemonic_id(m) for m in _section_mnemonics(md, code, address, budget)]
+        if section_ids:
+            ids.append(np.array(section_ids, dtype=np.uint64))
+    if not ids:
+        return np.zeros(width, dtype=np.float32)
+    total = sum(len(a) for a in ids)
+    return sum(mnemonic_ngrams(a, width) * (len(a) / total) for a in ids)
+
+
+def opcode_ngrams_from_file(file_path, width=DEFAULT_WIDTH, budget=SECTION_BUDGET):
+    try:
+        with open(file_path, "rb") as f:
+            content = f.read()
+    except OSError:
+        return np.zeros(width, dtype=np.float32)
+    return opcode_ngram_vector(content, width, budget)
@@ -1,4 +1,14 @@
 import ast
+import re
+from collections import Counter
+
+# Bounded character classes only, so long generated strings cannot trigger backtracking
+URL_RE = re.compile(r'\b(?:https?|ftp)://[^\s\'"<>]+', re.IGNORECASE)
+
+# Module-level behaviours flagged when the module is imported or any of its attributes is called
+FLAG_MODULES = ("subprocess", "socket", "ctypes", "shutil")
+PROTOCOL_FLAGS = {"HTTP": "http", "FTP": "ftp", "SMTP": "smtp", "DNS": "dns"}
+
 
 def extract_functions(code):
     """
@@ -31,3 +41,138 @@ def extract_python_features(code):
         "DNS": int("dns" in code.lower()),
     }
     return features
+
+
+def _dotted_name(node):
+    """'os.path.join' for an Attribute/Name chain, None for anything else (calls, subscripts...)."""
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if not isinstance(node, ast.Name):
+        return None
+    parts.append(node.id)
+    return ".".join(reversed(parts))
+
+
+def _function_params(node):
+    args = node.args
+    params = [a.arg for a in args.posonlyargs + args.args]
+    if args.vararg:
+        params.append("*" + args.vararg.arg)
+    params += [a.arg for a in args.kwonlyargs]
+    if args.kwarg:
+        params.append("**" + args.kwarg.arg)
+    return params
+
+
+def _fallback_imports(code):
+    """Line-based import scan for sources that do not parse."""
+    imports = set()
+    for line in code.splitlines():
+        words = line.strip().split()
+        if len(words) >= 2 and words[0] == "import":
+            imports.update(m.split(" as ")[0].strip() for m in " ".join(words[1:]).split(","))
+        elif len(words) >= 4 and words[0] == "from" and words[2] == "import":
+            imports.add(words[1])
+    imports.discard("")
+    return sorted(imports)
+
+
+def analyze_python(code):
+    """
+    Parse Python source once and collect everything the pipeline needs in a
+    single iterative walk of the tree: imports, function definitions with
+    their parameters, resolved call names, string constants and URLs, plus the
+    PRIMARY_FEATURES flags derived from them.
+
+    Sources that fail to parse fall back to linear substring/line scans.
+    """
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError, RecursionError, MemoryError) as e:
+        return {
+            "flags": extract_python_features(code),
+            "imports": _fallback_imports(code),
+            "functions": [f"SyntaxError: {e}"],
+            "params": {},
+            "calls": {},
+            "strings": [],
+            "urls": sorted(set(URL_RE.findall(code))),
+            "syntax_error": str(e),
+        }
+
+    imports = set()
+    aliases = {}
+    functions = []
+    params = {}
+    raw_calls = []
+    strings = []
+    identifiers = set()
+
+    # ast.walk is breadth-first with an explicit queue, so deeply nested
+    # (obfuscated) expressions cannot hit the recursion limit here.
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                imports.add(alias.name)
+                if alias.asname:
+                    aliases[alias.asname] = alias.name
+                else:
+                    head = alias.name.split(".")[0]
+                    aliases[head] = head
+        elif isinstance(node, ast.ImportFrom):
+            if node.module:
+                imports.add(node.module)
+                for alias in node.names:
+                    aliases[alias.asname or alias.name] = f"{node.module}.{alias.name}"
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            if isinstance(node, ast.FunctionDef):
+                functions.append(node.name)
+            params[node.name] = _function_params(node)
+        elif isinstance(node, ast.Call):
+            name = _dotted_name(node.func)
+            if name:
+                raw_calls.append(name)
+        elif isinstance(node, ast.Constant) and isinstance(node.value, str):
+            strings.append(node.value)
+        elif isinstance(node, ast.Name):
+            identifiers.add(node.id)
+        elif isinstance(node, ast.Attribute):
+            identifiers.add(node.attr)
+
+    # Resolve aliases once all imports are known: "sp.run" -> "subprocess.run"
+    calls = Counter()
+    for name in raw_calls:
+        head, _, rest = name.partition(".")
+        resolved = aliases.get(head, head)
+        calls[f"{resolved}.{rest}" if rest else resolved] += 1
+
+    urls = sorted({u for s in strings for u in URL_RE.findall(s)})
+    modules = {m.split(".")[0] for m in imports} | {c.split(".")[0] for c in calls}
+    call_names = set(calls)
+    tails = {c.rsplit(".", 1)[-1] for c in calls}
+    text = " ".join([" ".join(imports), " ".join(call_names), " ".join(identifiers)] + strings).lower()
+
+    flags = {
+        "os.system": int("os.system" in call_names),
+        "eval": int("eval" in call_names),
+        "exec": int("exec" in call_names),
+        "open": int("open" in tails),
+        "getenv": int("getenv" in tails),
+    }
+    for module in FLAG_MODULES:
+        flags[module] = int(module in modules)
+    for flag, needle in PROTOCOL_FLAGS.items():
+        flags[flag] = int(needle in text)
+
+    return {
+        "flags": flags,
+        "imports": sorted(imports),
+        "functions": functions,
+        "params": params,
+        "calls": dict(calls),
+        "strings": strings,
+        "urls": urls,
+        "syntax_error": None,
+    }
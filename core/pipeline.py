@@ -0,0 +1,268 @@
+# core/pipeline.py
+import os
+import time
+import asyncio
+import hashlib
+from collections import defaultdict
+
+from core import filetype
+from core.report_generator import write_json_report, DEFAULT_STRING_LIMIT
+from core.scheduler import Scheduler
+from core.supervisor import SupervisedPool, DEFAULT_WALL_TIME, DEFAULT_CPU_TIME, DEFAULT_RSS_MB, DEFAULT_MAX_TASKS
+
+READ_CHUNK = 1024 * 1024
+DEFAULT_LOOKAHEAD = 64      # samples handed to the scheduler ahead of the workers
+
+
+def iter_sample_paths(paths):
+    """Yield files from the given files/directories (recursively), lazily."""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    yield os.path.join(root, name)
+        elif os.path.isfile(path):
+            yield path
+        else:
+            print(f"[!] Not found: {path}")
+
+
+def _read_and_hash(path):
+    """
+    Stream the file once to hash it. On network storage this is also the
+    prefetch: the CPU stage then parses it from the local page cache.
+    Returns (sha256, size, kind sniffed from the first chunk).
+    """
+    sha256 = hashlib.sha256()
+    size = 0
+    kind = None
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK), b""):
+            if kind is None:
+                kind = filetype.sniff(chunk[:filetype.HEAD_BYTES], path)
+            sha256.update(chunk)
+            size += len(chunk)
+    return sha256.hexdigest(), size, kind or "text"
+
+
+class PipelineStats:
+    def __init__(self):
+        self.stage_time = defaultdict(float)
+        self.analysis_time = defaultdict(float)   # summed report["timings"] from the workers
+        self.samples = 0
+        self.failed = 0
+        self.write_errors = 0                     # reports analyzed but not written (counted in failed)
+        self.aborted = defaultdict(int)           # status -> samples cut short by the supervisor
+        self.file_types = defaultdict(lambda: [0, 0.0])   # (kind, route) -> [samples, sniff+extract seconds]
+        self.nodes = defaultdict(lambda: [0, 0.0, 0, 0])   # feature graph node -> [computed, ms, skipped, bytes]
+        self.bytes = 0
+        self.max_in_flight = 0
+        self.in_flight = 0
+        self.workers = ""                         # SupervisedPool.memory_report() at the end of the batch
+        self.lanes = ""                           # Scheduler.latency_report() at the end of the batch
+
+    def summary(self, elapsed, workers):
+        # time inside the workers; stage_time["analyze"] also counts samples waiting in the scheduler
+        cpu_busy = sum(self.analysis_time.values()) / (elapsed * workers) if elapsed else 0.0
+        lines = [
+            f"[+] Batch finished: {self.samples} samples ({self.failed} failed), "
+            f"{self.bytes / 1e6:.1f} MB in {elapsed:.2f}s ({self.samples / elapsed if elapsed else 0:.1f} samples/s)",
+            f"[+] Stage time (summed): read+hash {self.stage_time['read']:.2f}s, "
+            f"queue+analyze {self.stage_time['analyze']:.2f}s, write {self.stage_time['write']:.2f}s",
+            f"[+] Worker utilization: {cpu_busy:.0%} of {workers} processes, "
+            f"max {self.max_in_flight} samples in flight",
+        ]
+        if self.write_errors:
+            lines.append(f"[!] {self.write_errors} reports could not be written")
+        if self.aborted:
+            lines.append("[!] Aborted: " + ", ".join(f"{n} {status}" for status, n in sorted(self.aborted.items())))
+        if self.analysis_time:
+            inner = ", ".join(f"{k} {v:.2f}s" for k, v in sorted(self.analysis_time.items(), key=lambda kv: -kv[1]))
+            lines.append(f"[+] Inside analyze: {inner}")
+        if self.file_types:
+            lines.append(self.routing_table())
+        if self.nodes:
+            lines.append(self.feature_graph_table())
+        if self.lanes:
+            lines.append(self.lanes)
+        if self.workers:
+            lines.append(self.workers)
+        return "\n".join(lines)
+
+    def routing_table(self):
+        """Samples and mean sniff+extract time per detected file type."""
+        lines = ["[+] Routing by file type:", f"    {'type':<12} {'route':<8} {'samples':>8} {'extract ms':>11}"]
+        for (kind, route), (n, seconds) in sorted(self.file_types.items(), key=lambda kv: -kv[1][0]):
+            lines.append(f"    {kind:<12} {route:<8} {n:>8} {seconds / n * 1000:>11.1f}")
+        return "\n".join(lines)
+
+    def feature_graph_table(self):
+        """Per feature graph node (core.feature_graph): samples computing it and samples skipping it."""
+        lines = ["[+] Feature graph (demand-driven extraction):",
+                 f"    {'node':<12} {'computed':>8} {'mean ms':>8} {'skipped':>8} {'MB not scanned':>15}"]
+        for node, (n, ms, skipped, nbytes) in sorted(self.nodes.items(), key=lambda kv: (-kv[1][2], kv[0])):
+            mean = f"{ms / n:.1f}" if n else "-"
+            lines.append(f"    {node:<12} {n:>8} {mean:>8} {skipped:>8} {nbytes / 1e6:>15.1f}")
+        return "\n".join(lines)
+
+
+async def _producer(paths, read_q, n_readers):
+    for path in iter_sample_paths(paths):
+        await read_q.put(path)  # blocks when readers fall behind
+    for _ in range(n_readers):
+        await read_q.put(None)
+
+
+async def _reader(read_q, cpu_q, stats):
+    while True:
+        path = await read_q.get()
+        if path is None:
+            return
+        start = time.perf_counter()
+        try:
+            sha256, size, kind = await asyncio.to_thread(_read_and_hash, path)
+        except Exception as e:
+            # per item: a dead reader would leave the producer blocked on read_q
+            print(f"[!] Cannot read {path}: {e}")
+            stats.failed += 1
+            continue
+        stats.stage_time["read"] += time.perf_counter() - start
+        stats.bytes += size
+        await cpu_q.put((path, sha256, size, kind))
+
+
+async def _analyzer(cpu_q, write_q, pool, stats):
+    while True:
+        item = await cpu_q.get()
+        if item is None:
+            return
+        path, sha256, size, kind = item
+        stats.in_flight += 1
+        stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+        start = time.perf_counter()
+        try:
+            report = await asyncio.wrap_future(pool.submit(path, sha256, size=size, kind=kind))
+        except Exception as e:
+            print(f"[!] Failed to analyze {path}: {e}")
+            stats.failed += 1
+            report = None
+        finally:
+            stats.in_flight -= 1
+        stats.stage_time["analyze"] += time.perf_counter() - start
+        if report is None:
+            continue
+        if "status" in report:
+            stats.aborted[report["status"]] += 1
+        await write_q.put(report)
+
+
+async def _writer(write_q, stats, store=None, json_reports=True, summary=None):
+    while True:
+        report = await write_q.get()
+        if report is None:
+            return
+        start = time.perf_counter()
+        try:
+            if json_reports:
+                await asyncio.to_thread(write_json_report, report)
+            if store is not None:
+                await asyncio.to_thread(store.add, report)
+        except Exception as e:
+            # per item: a dead writer would leave the analyzers blocked on write_q
+            print(f"[!] Cannot write the report of {report.get('file', '?')}: {e}")
+            stats.failed += 1
+            stats.write_errors += 1
+            continue
+        finally:
+            stats.stage_time["write"] += time.perf_counter() - start
+        if summary is not None:
+            summary.add(report)
+        stats.samples += 1
+        timings = report.get("timings", {})
+        for stage, seconds in timings.items():
+            stats.analysis_time[stage] += seconds
+        if "file_type" in report:
+            entry = stats.file_types[(report["file_type"]["kind"], report["file_type"]["route"])]
+            entry[0] += 1
+            entry[1] += timings.get("sniff", 0.0) + timings.get("extract", 0.0)
+        graph = report.get("feature_graph", {})
+        for node, ms in graph.get("computed", {}).items():
+            stats.nodes[node][0] += 1
+            stats.nodes[node][1] += ms
+        for node, nbytes in graph.get("skipped", {}).items():
+            stats.nodes[node][2] += 1
+            stats.nodes[node][3] += nbytes
+
+
+async def run_batch(paths, workers=None, readers=4, queue_size=None,
+                    string_limit=DEFAULT_STRING_LIMIT, string_sampling="top",
+                    wall_time=DEFAULT_WALL_TIME, cpu_time=DEFAULT_CPU_TIME, rss_mb=DEFAULT_RSS_MB,
+                    max_tasks=DEFAULT_MAX_TASKS, store=None, json_reports=True, lookahead=None,
+                    scheduler_options=None, summary=None):
+    """
+    Analyze every sample under `paths` with three overlapping stages:
+
+      read+hash (threads) -> analyze (supervised processes) -> write report (thread)
+
+    Stages are connected by bounded asyncio queues, so a fast producer blocks
+    instead of buffering the whole batch: at most ~2 * queue_size paths and
+    `lookahead` samples are in flight at any time. The pool's scheduler
+    (core.scheduler, configured by `scheduler_options`) orders the samples
+    in flight by estimated cost, so small ones are not stuck behind large ones. Each sample is analyzed under
+    the wall-clock/CPU/RSS budgets; one that overruns is written as a partial
+    report and its worker replaced (see core.supervisor). Workers are forked
+    from a parent that already holds the model, and recycled every
+    `max_tasks` samples. Reports go to reports/*.json (json_reports) and/or
+    a core.report_store.ReportStore (store), and are folded into a
+    core.batch_summary.BatchSummary (summary) as they are written.
+    """
+    workers = workers or os.cpu_count() or 1
+    queue_size = queue_size or workers * 2
+    lookahead = lookahead or max(DEFAULT_LOOKAHEAD, workers * 4)
+    scheduler = Scheduler(workers, **(scheduler_options or {}))
+    read_q = asyncio.Queue(maxsize=queue_size)
+    cpu_q = asyncio.Queue(maxsize=queue_size)
+    write_q = asyncio.Queue(maxsize=queue_size)
+    stats = PipelineStats()
+
+    start = time.perf_counter()
+    with SupervisedPool(workers, wall_time=wall_time, cpu_time=cpu_time, rss_mb=rss_mb,
+                        string_limit=string_limit, string_sampling=string_sampling,
+                        max_tasks=max_tasks, scheduler=scheduler) as pool:
+        reader_tasks = [asyncio.create_task(_reader(read_q, cpu_q, stats)) for _ in range(readers)]
+        analyzer_tasks = [asyncio.create_task(_analyzer(cpu_q, write_q, pool, stats))
+                          for _ in range(lookahead)]
+        writer_task = asyncio.create_task(_writer(write_q, stats, store, json_reports, summary))
+
+        async def drain():
+            # Shut the stages down front to back, one sentinel per consumer
+            await _producer(paths, read_q, readers)
+            await asyncio.gather(*reader_tasks)
+            for _ in range(lookahead):
+                await cpu_q.put(None)
+            await asyncio.gather(*analyzer_tasks)
+            await write_q.put(None)
+            await writer_task
+
+        # Errors are handled per item inside the stages; anything that still
+        # kills a stage cancels the run instead of leaving the others blocked on its queue
+        stages = reader_tasks + analyzer_tasks + [writer_task]
+        shutdown = asyncio.create_task(drain())
+        for task in stages:
+            task.add_done_callback(lambda t: t.cancelled() or t.exception() is None or shutdown.cancel())
+        try:
+            await shutdown
+        except asyncio.CancelledError:
+            for task in stages:
+                task.cancel()
+            errors = [t.exception() for t in stages if t.done() and not t.cancelled() and t.exception()]
+            if errors:
+                raise errors[0]
+            raise
+        stats.workers = pool.memory_report()
+    elapsed = time.perf_counter() - start
+    stats.lanes = scheduler.latency_report()
+    scheduler.cost_model.save()
+
+    print(stats.summary(elapsed, workers))
+    return stats
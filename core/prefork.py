@@ -0,0 +1,28 @@
+# core/prefork.py
+"""
+Imported once by the fork server that core.supervisor.SupervisedPool starts
+its workers from (multiprocessing "forkserver" with this module preloaded).
+
+The fork server is a single-threaded process: it loads the models, builds
+their attribution tables, then moves every object to the gc's permanent
+generation. Each worker it forks shares those pages copy-on-write, and
+collections in the workers never touch the inherited objects, so the pages
+stay shared instead of being copied on the first gc pass. The freeze
+happens once, in the fork server; the pool's own process, with its threads,
+futures and reports in flight, is never frozen or forked.
+"""
+import gc
+import atexit
+
+from core import classifier
+from core.analysis import analyze_sample  # noqa: F401  (imports and warms every extractor)
+from core.explainer import precompute
+
+classifier.reload_model_if_changed()
+for member in classifier.members:
+    if member.loaded:
+        precompute(member.model)
+gc.collect()
+gc.freeze()
+# let interpreter shutdown collect the model and lief objects normally
+atexit.register(gc.unfreeze)
@@ -0,0 +1,21 @@
+# core/progress.py
+"""
+Stage markers for long-running analysis steps.
+
+Analysis code calls `stage("extract.imports")` before each step that may hang or
+blow up on a malformed sample. By default this does nothing; the supervised
+worker (core.supervisor) installs a hook that forwards the marker to its parent,
+so a killed worker can still say where it was stuck.
+"""
+
+_hook = None
+
+
+def set_hook(fn):
+    global _hook
+    _hook = fn
+
+
+def stage(name):
+    if _hook is not None:
+        _hook(name)
@@ -3,24 +3,31 @@
 import os
 import json
 from core.behavior_summary import generate_human_readable_summary
+from core.string_table import StringTable
 
-def sanitize(obj):
+# Strings per report; the full table stays available in memory for matching
+DEFAULT_STRING_LIMIT = 500
+
+def sanitize(obj, string_limit=DEFAULT_STRING_LIMIT, string_sampling="top"):
     if obj is ...:
         return "..."
+    if isinstance(obj, StringTable):
+        return obj.to_report(string_limit, string_sampling)
     if isinstance(obj, dict):
-        return {k: sanitize(v) for k, v in obj.items()}
-    if isinstance(obj, list):
-        return [sanitize(x) for x in obj]
-    if isinstance(obj, set):
-        return [sanitize(x) for x in obj]
+        return {k: sanitize(v, string_limit, string_sampling) for k, v in obj.items()}
+    if isinstance(obj, (list, set)):
+        return [sanitize(x, string_limit, string_sampling) for x in obj]
     return obj
 
-def generate_json_report(file_path, features, functions, explanation, family, confidence, sha256):
-    base = os.path.basename(file_path)
-    out = f"reports/{base}_report.json"
-    os.makedirs("reports", exist_ok=True)
+def report_path(file_path):
+    return f"reports/{os.path.basename(file_path)}_report.json"
+
 
-    summary = generate_human_readable_summary(features)
+def build_json_report(file_path, features, functions, explanation, family, confidence, sha256,
+                      string_limit=DEFAULT_STRING_LIMIT, string_sampling="top",
+                      probabilities=None, model_outputs=None, top_features=None):
+    """Assemble the JSON-serializable report dict without touching the disk."""
+    summary = generate_human_readable_summary(features, file_path)
 
     report = {
         "file": file_path,
@@ -36,13 +43,43 @@ def generate_json_report(file_path, features, functions, explanation, family, co
             "risk_level": summary["risk_level"]
         },
         "technical_details": {
-            "features_extracted": sanitize(features),
+            "features_extracted": sanitize(features, string_limit, string_sampling),
             "functions_found": sanitize(functions),
-            "explanation": explanation
+            "explanation": explanation,
+            "matched_rules": summary["matched_rules"]
         }
     }
 
+    if probabilities:
+        report["prediction"]["probabilities"] = probabilities
+    if model_outputs:
+        report["prediction"]["models"] = model_outputs
+    if top_features:
+        report["prediction"]["top_features"] = top_features
+
+    strings = features.get("strings")
+    if isinstance(strings, StringTable):
+        report["technical_details"]["string_stats"] = dict(
+            strings.stats(),
+            reported=strings.unique_count if string_limit is None else min(strings.unique_count, string_limit),
+            sampling=string_sampling
+        )
+    return report
+
+
+def write_json_report(report):
+    out = report_path(report["file"])
+    os.makedirs("reports", exist_ok=True)
+
     with open(out, "w") as f:
         json.dump(report, f, indent=4)
 
     print(f"[+] Report written to: {out}")
+    return out
+
+
+def generate_json_report(file_path, features, functions, explanation, family, confidence, sha256,
+                         string_limit=DEFAULT_STRING_LIMIT, string_sampling="top"):
+    report = build_json_report(file_path, features, functions, explanation, family, confidence, sha256,
+                               string_limit=string_limit, string_sampling=string_sampling)
+    return write_json_report(report)
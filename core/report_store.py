@@ -0,0 +1,317 @@
+# core/report_store.py
+"""
+Indexed local store of analysis reports.
+
+Each report is one row of a SQLite file: the columns queries filter on
+(sha256, family, confidence, risk level, file type, scan time) are indexed
+and the detected protocols kept as a bitmask,
+the text worth searching (strings, imports, protocols, behaviors, matched
+rules) goes into a contentless FTS5 index keyed by the row id, and the full
+report is kept as zlib-compressed JSON for display. Questions such as "HTTP
+samples classified as Mirai below 0.6 confidence in the last 30 days" become
+one indexed query instead of a walk over reports/*.json:
+
+    python cli.py --batch samples/ --store                         (write reports into the store too)
+    python cli.py --import-reports reports/                         (bulk import existing JSON reports)
+    python cli.py --query --family Mirai --max-confidence 0.6 --protocol HTTP --since 30d
+
+Reports without a timestamp ("analyzed_at", added by core.analysis) are dated
+by their file's mtime on import. Re-importing the same report is a no-op.
+"""
+import os
+import re
+import json
+import time
+import zlib
+import sqlite3
+import threading
+import urllib.parse
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_STORE_PATH = "reports/reports.sqlite"
+IMPORT_CHUNK = 1000          # reports per import transaction
+PROTOCOLS = ("HTTP", "FTP", "SMTP", "DNS")   # core.features._detect_protocols
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    id          INTEGER PRIMARY KEY,
+    sha256      TEXT,
+    file        TEXT NOT NULL,
+    family      TEXT COLLATE NOCASE,
+    confidence  REAL,
+    risk_level  TEXT COLLATE NOCASE,
+    file_type   TEXT COLLATE NOCASE,
+    protocols   INTEGER NOT NULL,        -- bit i set: PROTOCOLS[i] seen
+    scanned_at  REAL NOT NULL,           -- unix time
+    report      BLOB NOT NULL            -- zlib-compressed JSON
+);
+-- one row per scan; ifnull: reports of unreadable files have no sha256
+CREATE UNIQUE INDEX IF NOT EXISTS reports_scan ON reports (ifnull(sha256, ''), file, scanned_at);
+CREATE INDEX IF NOT EXISTS reports_sha256 ON reports (sha256);
+CREATE INDEX IF NOT EXISTS reports_family ON reports (family, scanned_at, confidence);
+CREATE INDEX IF NOT EXISTS reports_confidence ON reports (confidence);
+CREATE INDEX IF NOT EXISTS reports_risk ON reports (risk_level, scanned_at);
+CREATE INDEX IF NOT EXISTS reports_scanned ON reports (scanned_at);
+CREATE VIRTUAL TABLE IF NOT EXISTS report_text USING fts5(
+    strings, imports, protocols, behaviors, rules, content='', tokenize='unicode61'
+);
+"""
+
+_DURATION = re.compile(r"^(\d+(?:\.\d+)?)\s*([smhdw])$")
+_SECONDS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+
+
+def parse_time(value, now=None):
+    """Unix time for "30d"/"12h" (that long ago), an ISO date/datetime, or a number."""
+    if value is None:
+        return None
+    match = _DURATION.match(value.strip().lower())
+    if match:
+        return (now or time.time()) - float(match.group(1)) * _SECONDS[match.group(2)]
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    dt = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def _text(values):
+    return "\n".join(str(v) for v in values or [] if v is not None)
+
+
+def _row(report, scanned_at=None):
+    """(columns, fts columns) for one report dict; None if it is not an analysis report."""
+    if not isinstance(report, dict) or "prediction" not in report:
+        return None
+    prediction = report.get("prediction") or {}
+    summary = report.get("summary") or {}
+    details = report.get("technical_details") or {}
+    features = details.get("features_extracted") or {}
+    if report.get("analyzed_at"):
+        scanned_at = parse_time(report["analyzed_at"])
+    columns = (
+        report.get("sha256"),
+        report.get("file", ""),
+        prediction.get("malware_family"),
+        prediction.get("confidence"),
+        summary.get("risk_level"),
+        (report.get("file_type") or {}).get("kind"),
+        sum(1 << i for i, name in enumerate(PROTOCOLS) if name in (features.get("protocols") or [])),
+        scanned_at if scanned_at is not None else time.time(),
+        zlib.compress(json.dumps(report).encode("utf-8")),
+    )
+    text = (
+        _text(features.get("strings")),
+        _text(features.get("imports")),
+        _text(features.get("protocols")),
+        _text(summary.get("likely_behaviors")),
+        _text(details.get("matched_rules")),
+    )
+    return columns, text
+
+
+def _row_from_file(path):
+    try:
+        with open(path) as f:
+            report = json.load(f)
+        return _row(report, os.path.getmtime(path))
+    except (OSError, ValueError):
+        return None
+
+
+def _fts_phrase(text):
+    """An FTS5 string literal matching `text` as a phrase."""
+    return '"' + text.replace('"', '""') + '"'
+
+
+class ReportStore:
+    def __init__(self, path=DEFAULT_STORE_PATH, timeout=60.0, readonly=False):
+        """
+        readonly=True opens an existing store without creating or altering
+        anything; ValueError if `path` is not a report store.
+        """
+        self.path = path
+        self.readonly = readonly
+        self._lock = threading.Lock()
+        if readonly:
+            uri = "file:" + urllib.parse.quote(os.path.abspath(path)) + "?mode=ro"
+            self._db = sqlite3.connect(uri, uri=True, timeout=timeout, isolation_level=None,
+                                       check_same_thread=False)
+            try:
+                tables = {row[0] for row in self._db.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+            except sqlite3.DatabaseError as e:
+                self._db.close()
+                raise ValueError(f"not a report store: {e}")
+            if not {"reports", "report_text"} <= tables:
+                self._db.close()
+                raise ValueError("not a report store")
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # isolation_level=None: transactions are explicit; batch and watch modes write from threads
+        self._db = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        # a local file: WAL lets queries run while a scan keeps writing
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    def close(self):
+        if not self.readonly:
+            self._db.execute("PRAGMA optimize")     # keeps the planner's index statistics current
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _insert(self, rows):
+        """Insert (columns, text) rows in one transaction; duplicates are skipped. Returns rows added."""
+        added = 0
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for columns, text in rows:
+                    cursor = self._db.execute(
+                        "INSERT OR IGNORE INTO reports (sha256, file, family, confidence, risk_level, file_type, "
+                        "protocols, scanned_at, report) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", columns)
+                    if cursor.rowcount:
+                        self._db.execute("INSERT INTO report_text (rowid, strings, imports, protocols, behaviors, "
+                                         "rules) VALUES (?, ?, ?, ?, ?, ?)", (cursor.lastrowid,) + text)
+                        added += 1
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+        return added
+
+    def add(self, report):
+        """Store one report dict (as returned by core.analysis.analyze_sample). True if it was new."""
+        row = _row(report)
+        return bool(row and self._insert([row]))
+
+    def import_files(self, paths, jobs=None):
+        """
+        Bulk-import JSON report files, parsed in `jobs` processes and inserted
+        IMPORT_CHUNK per transaction. Returns (added, skipped, invalid).
+        """
+        added = skipped = invalid = 0
+        rows = []
+        with ProcessPoolExecutor(jobs) as pool:
+            for row in pool.map(_row_from_file, paths, chunksize=64):
+                if row is None:
+                    invalid += 1
+                    continue
+                rows.append(row)
+                if len(rows) >= IMPORT_CHUNK:
+                    n = self._insert(rows)
+                    added, skipped = added + n, skipped + len(rows) - n
+                    rows.clear()
+        if rows:
+            n = self._insert(rows)
+            added, skipped = added + n, skipped + len(rows) - n
+        return added, skipped, invalid
+
+    def query(self, family=None, min_confidence=None, max_confidence=None, risk_level=None,
+              since=None, until=None, sha256=None, file_type=None, protocol=None, string=None,
+              imported=None, match=None, limit=100, full=False):
+        """
+        Reports matching every given filter, newest first. family/risk_level/
+        file_type compare case-insensitively; since/until accept parse_time()
+        values. protocol is one of PROTOCOLS (tested on an indexed row's
+        bitmask, not through FTS); string and imported are phrases searched in
+        those FTS columns; match is a raw FTS5 query over all of them.
+
+        Returns dicts of the indexed columns, plus "report" with full=True.
+        Raises ValueError for an unknown protocol or a malformed match query.
+        """
+        where, params = [], []
+        for column, value in (("family", family), ("risk_level", risk_level), ("file_type", file_type)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if protocol is not None:
+            if protocol.upper() not in PROTOCOLS:
+                raise ValueError(f"unknown protocol {protocol!r} (one of {', '.join(PROTOCOLS)})")
+            where.append("protocols & ? != 0")
+            params.append(1 << PROTOCOLS.index(protocol.upper()))
+        if sha256 is not None:
+            where.append("sha256 = ?")
+            params.append(sha256.lower())
+        for clause, value in (("confidence >= ?", min_confidence), ("confidence < ?", max_confidence),
+                              ("scanned_at >= ?", parse_time(since)), ("scanned_at < ?", parse_time(until))):
+            if value is not None:
+                where.append(clause)
+                params.append(value)
+        terms = [f"{column} : {_fts_phrase(value)}"
+                 for column, value in (("strings", string), ("imports", imported))
+                 if value]
+        if match:
+            terms.append(f"({match})")
+        if terms:
+            where.append("id IN (SELECT rowid FROM report_text WHERE report_text MATCH ?)")
+            params.append(" AND ".join(terms))
+
+        sql = ("SELECT id, sha256, file, family, confidence, risk_level, file_type, scanned_at"
+               + (", report" if full else "") + " FROM reports"
+               + (" WHERE " + " AND ".join(where) if where else "")
+               + " ORDER BY scanned_at DESC LIMIT ?")
+        with self._lock:
+            try:
+                rows = self._db.execute(sql, params + [limit if limit else -1]).fetchall()
+            except sqlite3.OperationalError as e:
+                if not match:
+                    raise
+                raise ValueError(f"invalid --match query: {e}") from None
+        keys = ("id", "sha256", "file", "family", "confidence", "risk_level", "file_type", "scanned_at")
+        results = []
+        for row in rows:
+            result = dict(zip(keys, row))
+            if full:
+                result["report"] = json.loads(zlib.decompress(row[-1]))
+            results.append(result)
+        return results
+
+    def count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM reports").fetchone()[0]
+
+    def iter_reports(self, batch=1000):
+        """Every stored report dict, oldest first, fetched `batch` rows at a time."""
+        last = 0
+        while True:
+            with self._lock:
+                rows = self._db.execute("SELECT id, report FROM reports WHERE id > ? ORDER BY id LIMIT ?",
+                                        (last, batch)).fetchall()
+            if not rows:
+                return
+            for row_id, blob in rows:
+                yield json.loads(zlib.decompress(blob))
+            last = rows[-1][0]
+
+
+def iter_report_files(paths):
+    """*.json files under the given files/directories (reports/ by default layout)."""
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+            continue
+        for root, _, files in os.walk(path):
+            for name in sorted(files):
+                if name.endswith(".json"):
+                    yield os.path.join(root, name)
+
+
+def format_rows(rows):
+    """Query results as an aligned text table."""
+    lines = [f"{'scanned (UTC)':<19}  {'sha256':<16}  {'family':<16} {'conf':>5}  {'risk':<8} {'type':<8} file"]
+    for r in rows:
+        stamp = datetime.fromtimestamp(r["scanned_at"], timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        confidence = f"{r['confidence']:.2f}" if r["confidence"] is not None else "-"
+        lines.append(f"{stamp:<19}  {(r['sha256'] or '-')[:16]:<16}  {str(r['family'])[:16]:<16} {confidence:>5}  "
+                     f"{str(r['risk_level'] or '-'):<8} {str(r['file_type'] or '-'):<8} {r['file']}")
+    return "\n".join(lines)
@@ -0,0 +1,534 @@
+# core/rules.py
+"""
+YARA-lite rule engine for static indicators.
+
+Rules live in JSON files under rules/ and are compiled once into a RuleSet:
+
+    {
+        "name": "embedded_pe",
+        "tags": ["dropper"],
+        "meta": {"behavior": "Contains an embedded PE executable", "severity": 1},
+        "strings": {
+            "$stub": {"text": "This program cannot be run in DOS mode"},
+            "$mz":   {"hex": "4D 5A ?? 00"},
+            "$url":  {"regex": "https?://[a-z0-9.-]+", "nocase": true, "scope": "strings"}
+        },
+        "condition": "#stub >= 2 or ($mz and imports contains \\"kernel32\\")"
+    }
+
+Patterns are scanned over the memory-mapped sample ("scope": "file", the default)
+or over the extracted strings ("scope": "strings"). Every plain literal (text, or
+hex without wildcards) of a scope is folded into one alternation, longest first,
+that is searched once per buffer; a hit also credits the shorter literals it
+starts with, so overlapping literals are all counted. Regexes and wildcard hex
+patterns are compiled individually and their search time is charged to their
+rule, which keeps slow rules visible in RuleSet.profile().
+
+Conditions:
+    $a                  pattern matched              #a >= 2           match count
+    any of them         all of ($a, $b*)             2 of ($x*)
+    "HTTP" in protocols exact member of a feature set
+    imports contains "ws2_32"                        case-insensitive substring of any member
+    parsed              truthiness of a feature      filesize > 1MB
+    and / or / not / ( )
+"""
+import os
+import re
+import json
+import mmap
+import time
+
+from core.string_table import StringTable
+
+RULES_DIR = os.path.join(os.path.dirname(__file__), '../rules')
+SCOPES = ("file", "strings")
+_SIZE_SUFFIX = {"KB": 1024, "MB": 1024 * 1024}
+
+
+class RuleError(ValueError):
+    """Raised for a rule that does not parse or compile."""
+
+
+# --- patterns ----------------------------------------------------------------
+def _hex_to_regex(spec):
+    """
+    Translate a YARA-style hex string ("4D 5A ?? [2-4] (90 | CC)") into a bytes
+    regex. Returns (regex_source, literal_bytes_or_None).
+    """
+    tokens = re.findall(r"\[\s*\d*\s*-?\s*\d*\s*\]|\?\?|[0-9A-Fa-f]{2}|[()|]", spec)
+    if "".join(tokens).replace(" ", "") != re.sub(r"\s+", "", spec):
+        raise RuleError(f"bad hex pattern: {spec!r}")
+    parts = []
+    literal = bytearray()
+    is_literal = True
+    for tok in tokens:
+        if tok == "??":
+            parts.append(b".")
+            is_literal = False
+        elif tok.startswith("["):
+            lo, _, hi = tok[1:-1].replace(" ", "").partition("-")
+            parts.append(b".{%d,%s}" % (int(lo or 0), hi.encode() if hi else b"")
+                         if "-" in tok else b".{%d}" % int(lo))
+            is_literal = False
+        elif tok == "(":
+            parts.append(b"(?:")
+            is_literal = False
+        elif tok in ("|", ")"):
+            parts.append(tok.encode())
+            is_literal = False
+        else:
+            byte = bytes.fromhex(tok)
+            parts.append(re.escape(byte))
+            literal += byte
+    return b"".join(parts), bytes(literal) if is_literal else None
+
+
+class _Pattern:
+    __slots__ = ("rule", "name", "scope", "literal", "nocase", "regex")
+
+    def __init__(self, rule, name, spec):
+        if not name.startswith("$"):
+            raise RuleError(f"{rule}: pattern names start with '$' ({name!r})")
+        self.rule, self.name = rule, name
+        self.scope = spec.get("scope", "file")
+        if self.scope not in SCOPES:
+            raise RuleError(f"{rule}: unknown scope {self.scope!r} for {name}")
+        self.nocase = bool(spec.get("nocase", False))
+        self.literal = None
+        self.regex = None
+        flags = re.IGNORECASE if self.nocase else 0
+        if not any(k in spec for k in ("text", "hex", "regex")):
+            raise RuleError(f"{rule}: {name} needs 'text', 'hex' or 'regex'")
+        try:
+            if "text" in spec:
+                self.literal = spec["text"].encode("latin1")
+            elif "hex" in spec:
+                source, self.literal = _hex_to_regex(spec["hex"])
+                if self.literal is None:
+                    self.regex = re.compile(source, flags | re.DOTALL)
+            else:
+                self.regex = re.compile(spec["regex"].encode("latin1"), flags)
+        except (re.error, UnicodeEncodeError, RuleError) as e:
+            raise RuleError(f"{rule}: {name}: {e}")
+        if self.literal is not None and not self.literal:
+            raise RuleError(f"{rule}: {name} is empty")
+
+    def starts(self, data):
+        """Does this literal occur at the start of `data`?"""
+        head = data[:len(self.literal)]
+        return head.lower() == self.literal.lower() if self.nocase else head == self.literal
+
+
+class _LiteralMatcher:
+    """
+    All literals of one scope as a single longest-first alternation. It has no
+    capture groups (they make sre several times slower); the matched text is
+    looked up instead to find the literal and the shorter ones it starts with.
+    """
+
+    def __init__(self, patterns):
+        patterns = sorted(patterns, key=lambda p: -len(p.literal))
+        self.by_text = {}    # lowercased literal -> patterns spelled that way
+        for p in patterns:
+            self.by_text.setdefault(p.literal.lower(), []).append(p)
+        alternatives = []
+        for group in self.by_text.values():
+            if any(p.nocase for p in group):
+                alternatives.append(b"(?i:%s)" % re.escape(group[0].literal))
+            else:
+                alternatives += [re.escape(lit) for lit in dict.fromkeys(p.literal for p in group)]
+        self.regex = re.compile(b"|".join(alternatives)) if alternatives else None
+        # Shorter literals that may also start wherever a longer one matched
+        self.prefixes = {key: [q for other, group in self.by_text.items()
+                               if len(other) < len(key) and key.startswith(other) for q in group]
+                         for key in self.by_text}
+
+    def hits(self, matches):
+        """Yield (pattern, key) for every literal hit in an overlapping search."""
+        for m, key in matches:
+            text = m.group()
+            lowered = text.lower()
+            for q in self.by_text[lowered] + self.prefixes[lowered]:
+                if q.starts(text):
+                    yield q, key
+
+
+def _search_file(regex, data):
+    m = regex.search(data)
+    while m is not None:
+        yield m, None
+        m = regex.search(data, m.start() + 1)
+
+
+def _search(regex, scope, buffers):
+    if scope == "file":
+        return _search_file(regex, buffers["file"])
+    return buffers["strings"].scan(regex)
+
+
+# --- conditions --------------------------------------------------------------
+_TOKEN = re.compile(r"""
+    \s*(?:
+      (?P<str>"(?:[^"\\]|\\.)*")
+    | (?P<num>\d+(?:KB|MB)?)
+    | (?P<ref>[$#][A-Za-z0-9_]*\*?)
+    | (?P<op>==|!=|<=|>=|<|>|\(|\)|,)
+    | (?P<word>[A-Za-z_][A-Za-z0-9_.]*)
+    )""", re.VERBOSE)
+_COMPARE = {
+    "==": lambda a, b: a == b, "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b, "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b, ">=": lambda a, b: a >= b,
+}
+
+
+def _tokenize(text):
+    tokens = []
+    pos = 0
+    text = text.strip()
+    while pos < len(text):
+        m = _TOKEN.match(text, pos)
+        if m is None or m.end() == pos:
+            raise RuleError(f"unexpected input at {text[pos:pos + 20]!r}")
+        kind = m.lastgroup
+        tokens.append((kind, m.group(kind)))
+        pos = m.end()
+        while pos < len(text) and text[pos].isspace():
+            pos += 1
+    return tokens
+
+
+class _ConditionParser:
+    """Recursive-descent parser that turns a condition into a closure over a match context."""
+
+    def __init__(self, rule, text, pattern_names):
+        self.rule = rule
+        try:
+            self.tokens = _tokenize(text)
+        except RuleError as e:
+            raise RuleError(f"{rule}: {e}")
+        self.pos = 0
+        self.names = pattern_names
+
+    def parse(self):
+        fn = self._or()
+        if self.pos != len(self.tokens):
+            raise RuleError(f"{self.rule}: unexpected {self.tokens[self.pos][1]!r} in condition")
+        return fn
+
+    def _peek(self, value=None):
+        if self.pos >= len(self.tokens):
+            return None
+        tok = self.tokens[self.pos]
+        return tok if value is None or tok[1] == value else None
+
+    def _take(self, value=None, kind=None):
+        tok = self._peek()
+        if tok is None or (value is not None and tok[1] != value) or (kind is not None and tok[0] != kind):
+            want = value or kind
+            raise RuleError(f"{self.rule}: expected {want!r} in condition, got {tok[1] if tok else 'end'!r}")
+        self.pos += 1
+        return tok
+
+    def _or(self):
+        parts = [self._and()]
+        while self._peek("or"):
+            self._take("or")
+            parts.append(self._and())
+        return parts[0] if len(parts) == 1 else (lambda ctx: any(p(ctx) for p in parts))
+
+    def _and(self):
+        parts = [self._not()]
+        while self._peek("and"):
+            self._take("and")
+            parts.append(self._not())
+        return parts[0] if len(parts) == 1 else (lambda ctx: all(p(ctx) for p in parts))
+
+    def _not(self):
+        if self._peek("not"):
+            self._take("not")
+            inner = self._not()
+            return lambda ctx: not inner(ctx)
+        return self._primary()
+
+    def _pattern_set(self):
+        """'them' or '($a, $b*)' -> list of pattern names."""
+        if self._peek("them"):
+            self._take("them")
+            return list(self.names)
+        self._take("(")
+        names = []
+        while True:
+            ref = self._take(kind="ref")[1]
+            if not ref.startswith("$"):
+                raise RuleError(f"{self.rule}: expected $pattern in set, got {ref!r}")
+            names += self._expand(ref)
+            if self._peek(")"):
+                self._take(")")
+                return names
+            self._take(",")
+
+    def _expand(self, ref):
+        name = "$" + ref[1:]
+        if name.endswith("*"):
+            found = [n for n in self.names if n.startswith(name[:-1])]
+        else:
+            found = [name] if name in self.names else []
+        if not found:
+            raise RuleError(f"{self.rule}: condition references undefined {ref}")
+        return found
+
+    def _number(self):
+        text = self._take(kind="num")[1]
+        for suffix, scale in _SIZE_SUFFIX.items():
+            if text.endswith(suffix):
+                return int(text[:-len(suffix)]) * scale
+        return int(text)
+
+    def _compare(self, value_fn):
+        op = self._take(kind="op")[1]
+        if op not in _COMPARE:
+            raise RuleError(f"{self.rule}: expected a comparison, got {op!r}")
+        compare, limit = _COMPARE[op], self._number()
+        return lambda ctx: compare(value_fn(ctx), limit)
+
+    def _primary(self):
+        tok = self._peek()
+        if tok is None:
+            raise RuleError(f"{self.rule}: condition ends unexpectedly")
+        kind, value = tok
+
+        if value == "(":
+            self._take("(")
+            inner = self._or()
+            self._take(")")
+            return inner
+
+        if kind == "ref":
+            self._take()
+            name = self._expand(value)[0]
+            if value.startswith("#"):
+                return self._compare(lambda ctx: ctx.counts.get(name, 0))
+            return lambda ctx: ctx.counts.get(name, 0) > 0
+
+        if kind == "num" or value in ("any", "all"):
+            self._take()
+            need = None if value == "all" else (1 if value == "any" else self._as_int(value))
+            self._take("of")
+            names = self._pattern_set()
+            need = len(names) if need is None else need
+            return lambda ctx: sum(ctx.counts.get(n, 0) > 0 for n in names) >= need
+
+        if kind == "str":
+            self._take()
+            needle = json.loads(value)
+            self._take("in")
+            key = self._take(kind="word")[1]
+            return lambda ctx: needle in ctx.members(key)
+
+        if kind == "word":
+            self._take()
+            if value == "filesize":
+                return self._compare(lambda ctx: ctx.filesize)
+            if self._peek("contains"):
+                self._take("contains")
+                needle = json.loads(self._take(kind="str")[1]).lower()
+                return lambda ctx: any(needle in m for m in ctx.lowered(value))
+            return lambda ctx: bool(ctx.features.get(value))
+
+        raise RuleError(f"{self.rule}: unexpected {value!r} in condition")
+
+    def _as_int(self, text):
+        if not text.isdigit():
+            raise RuleError(f"{self.rule}: expected a count before 'of', got {text!r}")
+        return int(text)
+
+
+class _Context:
+    __slots__ = ("counts", "features", "filesize", "_members", "_lowered")
+
+    def __init__(self, counts, features, filesize):
+        self.counts = counts
+        self.features = features
+        self.filesize = filesize
+        self._members = {}
+        self._lowered = {}
+
+    def members(self, key):
+        if key not in self._members:
+            value = self.features.get(key) or ()
+            if isinstance(value, str):
+                value = (value,)
+            self._members[key] = value if isinstance(value, (set, frozenset, StringTable)) \
+                else {str(v) for v in value}
+        return self._members[key]
+
+    def lowered(self, key):
+        if key not in self._lowered:
+            self._lowered[key] = [str(v).lower() for v in self.members(key)]
+        return self._lowered[key]
+
+
+# --- rules -------------------------------------------------------------------
+class Rule:
+    __slots__ = ("name", "tags", "meta", "patterns", "condition", "source")
+
+    def __init__(self, spec, source=None):
+        try:
+            self.name = spec["name"]
+            condition = spec["condition"]
+        except KeyError as e:
+            raise RuleError(f"rule in {source or '<memory>'} is missing {e}")
+        self.tags = list(spec.get("tags", []))
+        self.meta = dict(spec.get("meta", {}))
+        self.source = source
+        self.patterns = [_Pattern(self.name, name, p) for name, p in spec.get("strings", {}).items()]
+        self.condition = _ConditionParser(self.name, condition, [p.name for p in self.patterns]).parse()
+
+
+class RuleSet:
+    """
+    Compiled rules. match() scans each buffer once for all literals, runs the
+    remaining regexes rule by rule, then evaluates every condition. Time spent
+    per rule (and in the shared literal pass) accumulates in self.timings.
+    """
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        names = [r.name for r in self.rules]
+        duplicates = {n for n in names if names.count(n) > 1}
+        if duplicates:
+            raise RuleError(f"duplicate rule names: {', '.join(sorted(duplicates))}")
+        patterns = [p for r in self.rules for p in r.patterns]
+        self._literals = {scope: _LiteralMatcher([p for p in patterns if p.scope == scope and p.literal is not None])
+                          for scope in SCOPES}
+        self._scopes = {p.scope for p in patterns}
+        self.timings = {}   # name -> [calls, seconds]
+
+    def __len__(self):
+        return len(self.rules)
+
+    def _charge(self, name, seconds):
+        entry = self.timings.setdefault(name, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+    def match(self, file_path=None, features=None, data=None):
+        """
+        Evaluate every rule against a sample. `data` (bytes) overrides reading
+        `file_path`; the file is memory-mapped otherwise. Returns one dict per
+        matching rule, in rule order:
+            {"rule", "tags", "meta", "counts": {"$a": n, ...}}
+        """
+        features = features or {}
+        filesize = len(data) if data is not None else _file_size(file_path) if file_path else 0
+        if "file" not in self._scopes:
+            data = b""
+        with _open_buffer(file_path, data) as buf:
+            strings = features.get("strings") or ()
+            if "strings" in self._scopes and not isinstance(strings, StringTable):
+                strings = StringTable(str(s) for s in strings)
+            buffers = {"file": buf, "strings": strings}
+            return self._evaluate(buffers, features, filesize)
+
+    def _evaluate(self, buffers, features, filesize):
+        counts = {}           # (rule, name) -> count
+        seen = {}             # strings scope: (rule, name) -> set of string indices
+
+        def credit(pattern, key):
+            ident = (pattern.rule, pattern.name)
+            if key is None:
+                counts[ident] = counts.get(ident, 0) + 1
+            else:
+                seen.setdefault(ident, set()).add(key)
+
+        for scope, matcher in self._literals.items():
+            if matcher.regex is None or (scope == "strings" and not buffers["strings"]):
+                continue
+            start = time.perf_counter()
+            for pattern, key in matcher.hits(_search(matcher.regex, scope, buffers)):
+                credit(pattern, key)
+            self._charge(f"(literals:{scope})", time.perf_counter() - start)
+
+        matches = []
+        for rule in self.rules:
+            start = time.perf_counter()
+            for p in rule.patterns:
+                if p.regex is not None and (p.scope == "file" or buffers["strings"]):
+                    for m, key in _search(p.regex, p.scope, buffers):
+                        credit(p, key)
+            rule_counts = {p.name: counts.get((rule.name, p.name), 0) or len(seen.get((rule.name, p.name), ()))
+                           for p in rule.patterns}
+            ctx = _Context(rule_counts, features, filesize)
+            matched = rule.condition(ctx)
+            self._charge(rule.name, time.perf_counter() - start)
+            if matched:
+                matches.append({"rule": rule.name, "tags": rule.tags, "meta": rule.meta,
+                                "counts": {k: v for k, v in rule_counts.items() if v}})
+        return matches
+
+    def profile(self, limit=None):
+        """[(name, calls, total_seconds, mean_ms)], slowest first."""
+        rows = [(name, calls, total, total / calls * 1000 if calls else 0.0)
+                for name, (calls, total) in self.timings.items()]
+        rows.sort(key=lambda r: -r[2])
+        return rows[:limit] if limit else rows
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+class _open_buffer:
+    """Context manager yielding `data`, or a read-only mmap of `path` (b"" if unreadable/empty)."""
+
+    def __init__(self, path, data):
+        self.path, self.data = path, data
+        self._file = self._map = None
+
+    def __enter__(self):
+        if self.data is not None:
+            return self.data
+        if self.path is None:
+            return b""
+        try:
+            self._file = open(self.path, "rb")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            return self._map
+        except (OSError, ValueError):   # ValueError: empty file cannot be mapped
+            return b""
+
+    def __exit__(self, *exc):
+        if self._map is not None:
+            self._map.close()
+        if self._file is not None:
+            self._file.close()
+
+
+def load_rules(*paths):
+    """Compile rules from JSON files (each a list of rule objects) or directories of them."""
+    rules = []
+    for path in paths:
+        files = sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith(".json")) \
+            if os.path.isdir(path) else [path]
+        for file in files:
+            with open(file) as f:
+                try:
+                    specs = json.load(f)
+                except json.JSONDecodeError as e:
+                    raise RuleError(f"{file}: {e}")
+            rules += [Rule(spec, source=file) for spec in specs]
+    return RuleSet(rules)
+
+
+_rulesets = {}
+
+
+def get_ruleset(name):
+    """The compiled rules/<name>.json, built once per process."""
+    if name not in _rulesets:
+        _rulesets[name] = load_rules(os.path.join(RULES_DIR, f"{name}.json"))
+    return _rulesets[name]
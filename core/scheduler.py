@@ -0,0 +1,303 @@
+# core/scheduler.py
+"""
+Cost-aware ordering of samples for core.supervisor.SupervisedPool.
+
+A FIFO pool lets a few huge installers at the head of a batch delay hundreds
+of small scripts behind them. Here every submitted sample gets an estimated
+analysis time from its size and detected type (CostModel, fitted on the
+per-stage timings of earlier reports and kept across runs) and goes into
+one of three lanes:
+
+  priority  analyst submissions, one FIFO queue per priority level, highest first
+  fast      samples estimated under `fast_lane_ms`, shortest first; the last
+            `fast_workers` workers take them before anything else
+  bulk      everything else, assigned to the general worker with the least
+            queued work and taken shortest first; an idle worker steals the
+            largest task from the most loaded queue, and general workers take
+            fast-lane tasks whenever the fast lane has more queued work than
+            its reserved workers can clear quickly
+
+Fast-lane workers are only reserved while fast-lane work is queued: with
+the fast lane empty they take the cheapest bulk task, whatever its cost, so
+a batch without small samples still uses every worker. Tasks waiting longer
+than `max_wait` seconds jump their queue, so large samples are not starved
+in service mode. Latency from submission to report is recorded per lane.
+"""
+import os
+import json
+import heapq
+import bisect
+import threading
+import time
+from collections import defaultdict, deque
+
+from core import filetype
+
+DEFAULT_HISTORY_PATH = "reports/scan_costs.json"
+LANES = ("priority", "fast", "bulk")
+FAST_LANE_MS = 500.0        # estimated analysis time below which a sample takes the fast lane
+STEAL_FACTOR = 4.0          # fast-lane backlog, in fast_lane_ms per fast worker, before general workers help
+DEFAULT_MAX_WAIT = 300.0    # seconds before a queued task is served ahead of shorter ones
+MIN_HISTORY = 5             # samples of a type before its own fit replaces the global one
+LATENCY_WINDOW = 10000      # latencies kept per lane for the percentiles
+
+# Until enough history exists: a fixed cost plus time per MB (binaries parse slower than text)
+_PRIOR = {"binary": (0.05, 1.0), "archive": (0.05, 1.0), "python": (0.05, 0.5), "script": (0.02, 0.5)}
+
+
+class CostModel:
+    """
+    Per-type linear model of analysis seconds = base + per_mb * size in MB,
+    fitted by least squares from completed samples' report["timings"].
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._sums = defaultdict(lambda: [0, 0.0, 0.0, 0.0, 0.0])   # kind -> [n, sx, sy, sxx, sxy]
+        if path:
+            try:
+                with open(path) as f:
+                    for kind, sums in json.load(f).items():
+                        self._sums[kind] = list(sums)
+            except (OSError, ValueError):
+                pass
+
+    @staticmethod
+    def _fit(n, sx, sy, sxx, sxy):
+        mean_x, mean_y = sx / n, sy / n
+        var = sxx / n - mean_x * mean_x
+        per_mb = max(0.0, (sxy / n - mean_x * mean_y) / var) if var > 1e-12 else 0.0
+        return max(0.0, mean_y - per_mb * mean_x), per_mb
+
+    def estimate(self, kind, size):
+        """Estimated analysis seconds of a `size`-byte sample of this filetype kind."""
+        mb = size / (1024 * 1024)
+        with self._lock:
+            sums = self._sums.get(kind)
+            if sums and sums[0] >= MIN_HISTORY:
+                base, per_mb = self._fit(*sums)
+            else:
+                base, per_mb = _PRIOR.get(filetype.route(kind) if kind else "binary", _PRIOR["binary"])
+        return base + per_mb * mb
+
+    def record(self, kind, size, seconds):
+        if not kind or seconds is None:
+            return
+        mb = size / (1024 * 1024)
+        with self._lock:
+            s = self._sums[kind]
+            s[0] += 1
+            s[1] += mb
+            s[2] += seconds
+            s[3] += mb * mb
+            s[4] += mb * seconds
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._lock:
+            data = {kind: sums for kind, sums in self._sums.items()}
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+
+class Task:
+    __slots__ = ("id", "path", "sha256", "future", "kind", "size", "cost", "lane", "priority",
+                 "submitted", "started", "stages")
+
+    def __init__(self, task_id, path, sha256, future, kind, size, cost, lane, priority):
+        self.id = task_id
+        self.path = path
+        self.sha256 = sha256
+        self.future = future
+        self.kind = kind
+        self.size = size
+        self.cost = cost            # estimated seconds
+        self.lane = lane
+        self.priority = priority
+        self.submitted = time.monotonic()
+        self.started = None
+        self.stages = []
+
+    @property
+    def lane_name(self):
+        return f"priority {self.priority}" if self.lane == "priority" else self.lane
+
+
+def parse_priorities(specs):
+    """[(absolute directory, level)] from "PATH=LEVEL" strings (analyst inboxes)."""
+    rules = []
+    for spec in specs or []:
+        path, sep, level = spec.rpartition("=")
+        if not sep or not path:
+            raise ValueError(f"expected PATH=LEVEL, got {spec!r}")
+        rules.append((os.path.abspath(path), int(level)))
+    return sorted(rules, key=lambda r: -len(r[0]))    # most specific directory first
+
+
+def priority_for(path, rules):
+    """The level of the most specific rule covering `path`, 0 if none does."""
+    path = os.path.abspath(path)
+    for root, level in rules:
+        if path == root or path.startswith(root + os.sep):
+            return level
+    return 0
+
+
+class Scheduler:
+    """
+    The pool's pending tasks, by lane (see the module docstring). push() from
+    any thread; pop(worker) from the pool's supervisor thread.
+    """
+
+    def __init__(self, workers, cost_model=None, fast_lane_ms=FAST_LANE_MS, fast_workers=None,
+                 max_wait=DEFAULT_MAX_WAIT, priorities=None):
+        self.workers = workers
+        self.cost_model = cost_model or CostModel()
+        self.fast_lane = fast_lane_ms / 1000.0
+        if fast_workers is None:
+            fast_workers = max(1, workers // 4) if workers > 1 else 0
+        self.fast_workers = max(0, min(fast_workers, workers - 1))
+        self.max_wait = max_wait
+        self.priorities = priorities or []       # parse_priorities() rules applied on push
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._priority = defaultdict(deque)      # level -> tasks, FIFO
+        self._fast = []                          # heap of (cost, seq, task)
+        self._fast_load = 0.0
+        self._bulk = [[] for _ in range(workers - self.fast_workers)]   # sorted [(cost, seq, task)]
+        self._bulk_load = [0.0] * len(self._bulk)
+        self.stolen = 0
+        self._latency = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))   # lane -> seconds
+        self._counts = defaultdict(int)
+
+    def __len__(self):
+        with self._lock:
+            return (sum(len(q) for q in self._priority.values()) + len(self._fast)
+                    + sum(len(q) for q in self._bulk))
+
+    def is_fast_worker(self, worker):
+        return worker >= self.workers - self.fast_workers
+
+    def make_task(self, task_id, path, sha256, future, priority=None, size=None, kind=None):
+        """A Task with its estimated cost and lane; size/kind are read from the file if not given."""
+        if size is None:
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                size = 0
+        if kind is None:
+            kind = filetype.detect(path)
+        if priority is None:
+            priority = priority_for(path, self.priorities)
+        cost = self.cost_model.estimate(kind, size)
+        lane = "priority" if priority > 0 else "fast" if cost < self.fast_lane else "bulk"
+        return Task(task_id, path, sha256, future, kind, size, cost, lane, priority)
+
+    def push(self, task):
+        with self._lock:
+            self._seq += 1
+            entry = (task.cost, self._seq, task)
+            if task.lane == "priority":
+                self._priority[task.priority].append(task)
+            elif task.lane == "fast" or not self._bulk:
+                heapq.heappush(self._fast, entry)
+                self._fast_load += task.cost
+            else:
+                i = min(range(len(self._bulk)), key=self._bulk_load.__getitem__)
+                bisect.insort(self._bulk[i], entry)
+                self._bulk_load[i] += task.cost
+
+    def _take_fast(self):
+        task = heapq.heappop(self._fast)[2]
+        self._fast_load -= task.cost
+        return task
+
+    def _fast_backlog(self):
+        """The fast lane holds more estimated work than its reserved workers clear within STEAL_FACTOR x fast_lane."""
+        return self._fast_load > self.fast_lane * STEAL_FACTOR * max(1, self.fast_workers)
+
+    def _take_bulk(self, i, index):
+        _, _, task = self._bulk[i].pop(index)
+        self._bulk_load[i] -= task.cost
+        return task
+
+    def _overdue(self, queue, now):
+        """Index of the oldest entry of a sorted queue if it has waited past max_wait, else None."""
+        if not queue or not self.max_wait:
+            return None
+        index = min(range(len(queue)), key=lambda k: queue[k][2].submitted)
+        return index if now - queue[index][2].submitted > self.max_wait else None
+
+    def pop(self, worker):
+        """Next task for pool slot `worker`, or None if it has nothing it may take."""
+        with self._lock:
+            for level in sorted(self._priority, reverse=True):
+                if self._priority[level]:
+                    return self._priority[level].popleft()
+            now = time.monotonic()
+            if self.is_fast_worker(worker):
+                if self._fast:
+                    return self._take_fast()
+                # nothing small queued: take the cheapest bulk task rather than sit idle
+                candidates = [(q[0][0], i) for i, q in enumerate(self._bulk) if q]
+                if candidates:
+                    _, i = min(candidates)
+                    self.stolen += 1
+                    return self._take_bulk(i, 0)
+                return None
+            own = self._bulk[worker]
+            overdue = self._overdue(own, now)
+            if overdue is not None:
+                return self._take_bulk(worker, overdue)
+            if self._fast and self._fast_backlog():
+                self.stolen += 1
+                return self._take_fast()
+            if own:
+                return self._take_bulk(worker, 0)
+            # steal the largest task of the most loaded bulk queue
+            victim = max(range(len(self._bulk)), key=self._bulk_load.__getitem__)
+            if self._bulk[victim]:
+                self.stolen += 1
+                return self._take_bulk(victim, len(self._bulk[victim]) - 1)
+            if self._fast:
+                return self._take_fast()
+            return None
+
+    def finished(self, task, report=None):
+        """Record a finished task: its lane latency, and its stage timings for the cost model."""
+        latency = time.monotonic() - task.submitted
+        with self._lock:
+            self._latency[task.lane_name].append(latency)
+            self._counts[task.lane_name] += 1
+        if report and "timings" in report and "status" not in report:
+            kind = (report.get("file_type") or {}).get("kind", task.kind)
+            self.cost_model.record(kind, task.size, sum(report["timings"].values()))
+
+    def lane_stats(self):
+        """{lane: {"samples", "p50_s", "p99_s", "max_s"}} over the recent latency window."""
+        with self._lock:
+            windows = {lane: sorted(values) for lane, values in self._latency.items()}
+            counts = dict(self._counts)
+
+        def pct(values, p):
+            return round(values[min(len(values) - 1, int(p * len(values)))], 3)
+
+        return {lane: {"samples": counts[lane], "p50_s": pct(v, 0.50), "p99_s": pct(v, 0.99),
+                       "max_s": round(v[-1], 3)}
+                for lane, v in sorted(windows.items()) if v}
+
+    def latency_report(self):
+        stats = self.lane_stats()
+        if not stats:
+            return ""
+        lines = [f"[+] Latency by lane (submitted -> report; {self.fast_workers} fast-lane workers, "
+                 f"{self.stolen} tasks stolen):",
+                 f"    {'lane':<12} {'samples':>8} {'p50 s':>8} {'p99 s':>8} {'max s':>8}"]
+        for lane, s in stats.items():
+            lines.append(f"    {lane:<12} {s['samples']:>8} {s['p50_s']:>8.2f} {s['p99_s']:>8.2f} {s['max_s']:>8.2f}")
+        return "\n".join(lines)
@@ -0,0 +1,69 @@
+# core/script_analyzer.py
+"""
+Lightweight analysis of text payloads (shell, batch, PowerShell, JS, VBS, ...).
+
+Everything here is regex work over the decoded text: no disassembly, no binary
+parsing. core.features adds the strings/protocols every extractor shares.
+"""
+import re
+
+from core.rules import get_ruleset
+
+RULES = get_ruleset("scripts")
+NO_FINDINGS = "No obvious malicious behavior found. Static analysis only."
+MAX_COMMANDS = 200
+
+_FUNCTIONS = {
+    "shell": re.compile(r"^\s*(?:function\s+)?([A-Za-z_][\w-]*)\s*\(\)\s*\{?", re.MULTILINE),
+    "batch": re.compile(r"^\s*:([A-Za-z_][\w-]*)\s*$", re.MULTILINE),
+    "powershell": re.compile(r"^\s*function\s+([\w-]+)", re.IGNORECASE | re.MULTILINE),
+    "javascript": re.compile(r"\bfunction\s+([A-Za-z_$][\w$]*)\s*\("),
+    "vbscript": re.compile(r"^\s*(?:Public\s+|Private\s+)?(?:Sub|Function)\s+(\w+)", re.IGNORECASE | re.MULTILINE),
+    "perl": re.compile(r"^\s*sub\s+(\w+)", re.MULTILINE),
+}
+
+# First word of each statement, for shell-like languages; a leading path is dropped (/usr/bin/wget -> wget)
+_STATEMENT_SPLIT = re.compile(r"[;\n|&]+|\$\(|`")
+_COMMAND = re.compile(r"^\s*(?:sudo\s+|nohup\s+|exec\s+|start\s+(?:/b\s+)?)?(?:[\w./\\:-]*[/\\])?([A-Za-z][\w.-]*)")
+_ASSIGNMENTS = re.compile(r"^(?:\w+=\S*\s*)+")
+_COMMAND_LANGUAGES = {"shell", "batch", "powershell"}
+_KEYWORDS = {"if", "then", "else", "elif", "fi", "for", "do", "done", "while", "case", "esac", "in",
+             "function", "return", "echo", "set", "rem", "goto", "call", "exit", "not", "local",
+             "param", "try", "catch", "foreach", "true", "false"}
+
+
+def _commands(text):
+    seen = []
+    for statement in _STATEMENT_SPLIT.split(text):
+        statement = _ASSIGNMENTS.sub("", statement.lstrip("@( \t"))   # FOO=1 busybox ... -> busybox ...
+        if not statement or statement.startswith(("#", "::", "//", "$")):
+            continue
+        m = _COMMAND.match(statement)
+        if m is None:
+            continue
+        name = m.group(1).lower()
+        if name not in _KEYWORDS and name not in seen:
+            seen.append(name)
+            if len(seen) >= MAX_COMMANDS:
+                break
+    return seen
+
+
+def analyze_script(text, kind):
+    """
+    Script-specific features for a decoded text sample of the given
+    core.filetype kind:
+        {"script_type", "functions", "commands", "explanation"}
+    """
+    pattern = _FUNCTIONS.get(kind)
+    functions = list(dict.fromkeys(pattern.findall(text))) if pattern else []
+    defined = {f.lower() for f in functions}
+    commands = [c for c in _commands(text) if c not in defined] if kind in _COMMAND_LANGUAGES else []
+    matches = RULES.match(data=text.encode("utf-8", errors="ignore"))
+    explanation = " ".join(m["meta"]["explanation"] for m in matches) if matches else NO_FINDINGS
+    return {
+        "script_type": kind,
+        "functions": functions,
+        "commands": commands,
+        "explanation": explanation,
+    }
@@ -0,0 +1,139 @@
+# core/string_table.py
+import random
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+# Strings are printable ASCII, so a newline can never occur inside one and is a
+# safe separator. The blob also starts and ends with it, so an exact lookup is a
+# single find() for SEPARATOR + value + SEPARATOR.
+SEPARATOR = b"\n"
+
+
+class StringTable:
+    """
+    Compact, deduplicated store for the strings extracted from a sample.
+
+    All unique strings live in one bytes blob (most frequent first), addressed
+    by an offsets array, with a parallel array of occurrence counts. len() is
+    the total number of occurrences, so it stands in for the old list of strings
+    wherever only the count mattered; iteration yields each unique string once.
+    """
+
+    __slots__ = ("_blob", "_offsets", "_counts", "_total")
+
+    def __init__(self, strings=()):
+        self._build(Counter(s.encode("latin1") if isinstance(s, str) else bytes(s) for s in strings))
+
+    @classmethod
+    def merge(cls, tables):
+        """One table holding every string of `tables`, occurrence counts summed."""
+        counter = Counter()
+        for table in tables:
+            for s, n in table.items():
+                counter[s.encode("latin1")] += n
+        merged = cls.__new__(cls)
+        merged._build(counter)
+        return merged
+
+    def _build(self, counter):
+        ordered = sorted(counter.items(), key=lambda kv: (-kv[1], kv[0]))
+
+        self._blob = SEPARATOR + b"".join(s + SEPARATOR for s, _ in ordered)
+        typecode = "I" if len(self._blob) < 2 ** 32 else "Q"
+        self._offsets = array(typecode, [len(SEPARATOR)])
+        pos = len(SEPARATOR)
+        for s, _ in ordered:
+            pos += len(s) + len(SEPARATOR)
+            self._offsets.append(pos)
+        self._counts = array("I", (n for _, n in ordered))
+        self._total = sum(self._counts)
+
+    def __len__(self):
+        return self._total
+
+    def __bool__(self):
+        return self._total > 0
+
+    @property
+    def unique_count(self):
+        return len(self._counts)
+
+    def _entry(self, i):
+        return self._blob[self._offsets[i]:self._offsets[i + 1] - len(SEPARATOR)].decode("latin1")
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._entry(i) for i in range(*index.indices(self.unique_count))]
+        if index < 0:
+            index += self.unique_count
+        if not 0 <= index < self.unique_count:
+            raise IndexError("StringTable index out of range")
+        return self._entry(index)
+
+    def __iter__(self):
+        for i in range(self.unique_count):
+            yield self._entry(i)
+
+    def items(self):
+        """Yield (string, occurrences) pairs, most frequent first."""
+        for i in range(self.unique_count):
+            yield self._entry(i), self._counts[i]
+
+    def count(self, value):
+        """Occurrences of an exact string (0 if absent)."""
+        pos = self._blob.find(SEPARATOR + value.encode("latin1", errors="ignore") + SEPARATOR)
+        if pos < 0:
+            return 0
+        return self._counts[bisect_left(self._offsets, pos + len(SEPARATOR))]
+
+    def __contains__(self, value):
+        return self.count(value) > 0
+
+    def contains_substring(self, needle, ignore_case=False):
+        """True if any string contains `needle`, searched in one pass over the blob."""
+        haystack = self._blob.lower() if ignore_case else self._blob
+        needle = needle.lower() if ignore_case else needle
+        return needle.encode("latin1", errors="ignore") in haystack
+
+    def scan(self, regex, pos=0):
+        """
+        Search a compiled bytes regex over the whole blob in one pass, yielding
+        (match, string_index). A match never spans two strings unless the
+        pattern itself can match the separator.
+        """
+        m = regex.search(self._blob, pos)
+        while m is not None:
+            yield m, bisect_left(self._offsets, m.start() + 1) - 1
+            m = regex.search(self._blob, m.start() + 1)
+
+    def top(self, n):
+        """The n most frequent strings."""
+        return self[:n]
+
+    def sample(self, n, seed=0):
+        """Reservoir sample of n unique strings, deterministic for a given seed."""
+        rng = random.Random(seed)
+        reservoir = []
+        for i in range(self.unique_count):
+            if i < n:
+                reservoir.append(i)
+            else:
+                j = rng.randint(0, i)
+                if j < n:
+                    reservoir[j] = i
+        return [self._entry(i) for i in sorted(reservoir)]
+
+    def to_report(self, limit=None, mode="top"):
+        """Bounded list of strings for reports: the top-N, or a reservoir sample."""
+        if limit is None or limit >= self.unique_count:
+            return list(self)
+        return self.sample(limit) if mode == "reservoir" else self.top(limit)
+
+    def stats(self):
+        return {"total": self._total, "unique": self.unique_count, "blob_bytes": len(self._blob)}
+
+    def nbytes(self):
+        """Approximate memory held by the table (blob plus both arrays)."""
+        return (len(self._blob) + self._offsets.itemsize * len(self._offsets)
+                + self._counts.itemsize * len(self._counts))
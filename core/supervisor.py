@@ -0,0 +1,397 @@
+# core/supervisor.py
+import gc
+import os
+import sys
+import time
+import signal
+import threading
+import multiprocessing as mp
+from concurrent.futures import Future
+from multiprocessing.connection import wait
+
+try:
+    import resource
+except ImportError:  # not available on Windows; limits then rely on the supervisor alone
+    resource = None
+
+from core import progress
+from core.analysis import analyze_sample
+from core.report_generator import DEFAULT_STRING_LIMIT
+from core.scheduler import Scheduler
+from core.utils import get_sha256
+
+DEFAULT_WALL_TIME = 120.0
+DEFAULT_CPU_TIME = 120
+DEFAULT_RSS_MB = 2048
+DEFAULT_MAX_TASKS = 500     # samples per worker before it is recycled (native parser leaks)
+_POLL = 0.05
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _rss_bytes(pid):
+    """Resident set size of `pid` from /proc (None where /proc is unavailable)."""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _memory_mb(pid):
+    """
+    {"rss", "private", "shared"} in MB for `pid`. Pages still shared
+    copy-on-write with the parent count as shared (needs smaps_rollup, Linux 4.14+).
+    """
+    rss = _rss_bytes(pid)
+    if rss is None:
+        return None
+    memory = {"rss": round(rss / 2 ** 20, 1)}
+    try:
+        fields = {}
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1])
+        memory["private"] = round((fields["Private_Clean"] + fields["Private_Dirty"]) / 1024, 1)
+        memory["shared"] = round((fields["Shared_Clean"] + fields["Shared_Dirty"]) / 1024, 1)
+    except (OSError, KeyError, ValueError):
+        pass
+    return memory
+
+
+def _forkserver_context():
+    """
+    The "forkserver" context with core.prefork preloaded. The fork server is
+    started with `python -c` and, on Python 3.11, does not apply the parent's
+    sys.path before preloading, so the repo root is put on PYTHONPATH for it;
+    otherwise the preload fails silently whenever the cwd is not the repo root.
+    """
+    paths = [p for p in os.environ.get("PYTHONPATH", "").split(os.pathsep) if p]
+    if _REPO_ROOT not in paths:
+        os.environ["PYTHONPATH"] = os.pathsep.join([_REPO_ROOT] + paths)
+    ctx = mp.get_context("forkserver")
+    ctx.set_forkserver_preload(["core.supervisor", "core.prefork"])
+    return ctx
+
+
+def _worker_main(conn, cpu_time, options):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the supervisor decides when we stop
+    if resource is not None:
+        resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+    # Loads the models here if the fork server did not (spawn, or a failed preload)
+    preloaded = "core.prefork" in sys.modules
+    import core.prefork  # noqa: F401
+    conn.send(("ready", preloaded, gc.get_freeze_count()))
+    progress.set_hook(lambda name: conn.send(("stage", name)))
+
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:  # supervisor went away
+            return
+        if task is None:
+            return
+        task_id, path, sha256 = task
+        if resource is not None and cpu_time:
+            # RLIMIT_CPU counts the whole process lifetime, so move the soft
+            # limit to "CPU used so far + budget" before every sample.
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+            soft = int(usage.ru_utime + usage.ru_stime + cpu_time) + 1
+            if hard != resource.RLIM_INFINITY:
+                soft = min(soft, hard)
+            resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+        try:
+            report = analyze_sample(path, sha256, **options)
+            conn.send(("done", task_id, report))
+        except Exception as e:
+            conn.send(("error", task_id, f"{type(e).__name__}: {e}"))
+
+
+def aborted_report(path, sha256, status, stage, stages, elapsed, limits, detail=None):
+    """Partial report for a sample whose worker was killed or crashed."""
+    family = f"Unknown (Analysis {status.replace('_', ' ')})"
+    report = {
+        "file": path,
+        "sha256": sha256,
+        "status": status,
+        "prediction": {"malware_family": family, "confidence": 0.0},
+        "summary": {
+            "predicted_family": family,
+            "confidence": 0.0,
+            "likely_behaviors": [],
+            "risk_level": "Unknown"
+        },
+        "aborted": {
+            "stage": stage,
+            "completed_stages": stages[:-1] if stages else [],
+            "elapsed_s": round(elapsed, 3),
+            "limits": limits,
+        },
+    }
+    if detail:
+        report["aborted"]["detail"] = detail
+    try:
+        report["aborted"]["file_size"] = os.path.getsize(path)
+    except OSError:
+        pass
+    return report
+
+
+class _Slot:
+    def __init__(self, ctx, cpu_time, options):
+        self.conn, child = ctx.Pipe()
+        # not daemonic: sklearn/joblib refuse to parallelize inside daemon processes
+        self.process = ctx.Process(target=_worker_main, args=(child, cpu_time, options))
+        self.process.start()
+        child.close()
+        self.ready = False       # set by the worker's "ready" message, once its models are loaded
+        self.task = None
+        self.samples = 0
+        self.memory = _memory_mb(self.process.pid) or {}
+        self.peak_rss = self.memory.get("rss", 0.0)
+
+    def sample_memory(self):
+        memory = _memory_mb(self.process.pid)
+        if memory:
+            self.memory = memory
+            self.peak_rss = max(self.peak_rss, memory["rss"])
+
+    def stats(self, state):
+        return dict(self.memory, pid=self.process.pid, state=state, samples=self.samples,
+                    peak_rss=self.peak_rss)
+
+    def retire(self):
+        """Ask an idle worker to exit (recycling); kill it if it does not."""
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=5)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class SupervisedPool:
+    """
+    Process pool where every sample runs under wall-clock, CPU and RSS budgets.
+
+    submit() returns a Future that always resolves to a report dict: the normal
+    one, or -- when the worker exceeded a budget or crashed -- a partial report
+    with status "timeout", "cpu_limit", "memory_limit" or "crashed" and the
+    analysis stage it was in. The offending worker is killed and replaced, so
+    one bad file never stalls the rest of the batch.
+
+    Where available, workers are forked from a fork server that loaded the
+    models once (see core.prefork) and share them copy-on-write. A worker
+    gets no sample before it reports ready, so model loading never counts
+    against a sample's wall-clock budget. Respawns
+    and recycles fork from that clean, single-threaded process rather than
+    from this one, whose supervisor and reader/handler threads could leave
+    locks held in the child. A worker picks up a model replaced since the
+    fork server started on its own, through classifier.reload_model_if_changed().
+    A worker is recycled after `max_tasks` samples to contain leaks in the
+    native parsers, and worker_stats() reports each worker's RSS and how much
+    of it is still shared with the parent.
+
+    Pending samples are ordered by core.scheduler (estimated cost, fast lane,
+    analyst priorities); pass a configured Scheduler to tune it.
+    """
+
+    def __init__(self, workers=None, wall_time=DEFAULT_WALL_TIME, cpu_time=DEFAULT_CPU_TIME,
+                 rss_mb=DEFAULT_RSS_MB, string_limit=DEFAULT_STRING_LIMIT, string_sampling="top",
+                 max_tasks=DEFAULT_MAX_TASKS, scheduler=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_tasks = max_tasks
+        self.wall_time = wall_time
+        self.cpu_time = cpu_time
+        self.rss_limit = rss_mb * 1024 * 1024 if rss_mb else None
+        self.limits = {"wall_time_s": wall_time, "cpu_time_s": cpu_time, "rss_mb": rss_mb}
+        self._options = {"string_limit": string_limit, "string_sampling": string_sampling}
+        # the fork server keeps the already-loaded model and parsers warm in every worker
+        self._forkserver = "forkserver" in mp.get_all_start_methods()
+        self._ctx = _forkserver_context() if self._forkserver else mp.get_context("spawn")
+        self._warned_preload = False
+        self.scheduler = scheduler if scheduler is not None else Scheduler(self.workers)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._next_id = 0
+        self.replaced = 0
+        self.recycled = 0
+        self._retired = []          # worker_stats() rows of recycled/replaced workers
+        self._slots = [self._spawn() for _ in range(self.workers)]
+        self._thread = threading.Thread(target=self._supervise, daemon=True)
+        self._thread.start()
+
+    def _spawn(self):
+        return _Slot(self._ctx, self.cpu_time, self._options)
+
+    def worker_stats(self):
+        """Memory and sample counts of the live workers, then of the ones already retired."""
+        with self._lock:
+            return [s.stats("busy" if s.task else "idle") for s in self._slots] + list(self._retired)
+
+    def memory_report(self):
+        rows = self.worker_stats()
+        if not rows:
+            return ""
+        lines = [f"[+] Workers ({self.recycled} recycled, {self.replaced} replaced):",
+                 f"    {'pid':>7} {'state':<9} {'samples':>7} {'rss MB':>8} {'peak MB':>8} {'private':>8} {'shared':>8}"]
+        for r in rows:
+            lines.append(f"    {r['pid']:>7} {r['state']:<9} {r['samples']:>7} {r.get('rss', '-')!s:>8} "
+                         f"{r['peak_rss']:>8} {r.get('private', '-')!s:>8} {r.get('shared', '-')!s:>8}")
+        return "\n".join(lines)
+
+    def submit(self, path, sha256=None, priority=None, size=None, kind=None):
+        """
+        Queue one sample. priority > 0 puts it in that analyst lane (None: from
+        the scheduler's directory rules); size/kind skip a stat/sniff if known.
+        """
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("SupervisedPool is closed")
+            self._next_id += 1
+            task_id = self._next_id
+        self.scheduler.push(self.scheduler.make_task(task_id, path, sha256, future, priority, size, kind))
+        self._wakeup.set()
+        return future
+
+    # --- supervisor thread ----------------------------------------------
+    def _assign(self):
+        for index, slot in enumerate(self._slots):
+            if slot.task is not None or not slot.ready:
+                continue
+            task = self.scheduler.pop(index)
+            if task is None:
+                continue
+            if task.sha256 is None:
+                task.sha256 = get_sha256(task.path)
+            task.started = time.monotonic()
+            slot.task = task
+            slot.conn.send((task.id, task.path, task.sha256))
+
+    def _resolve(self, task, report):
+        self.scheduler.finished(task, report)
+        task.future.set_result(report)
+
+    def _finish(self, slot, report):
+        task, slot.task = slot.task, None
+        slot.samples += 1
+        slot.sample_memory()
+        self._resolve(task, report)
+        if self.max_tasks and slot.samples >= self.max_tasks:
+            self._recycle(slot)
+
+    def _recycle(self, slot):
+        index = self._slots.index(slot)
+        slot.retire()
+        replacement = self._spawn()
+        with self._lock:
+            self._retired.append(slot.stats("recycled"))
+            self._slots[index] = replacement
+        self.recycled += 1
+
+    def _abort(self, index, status, detail=None):
+        """Kill the worker in slot `index`, resolve its task with a partial report, respawn."""
+        slot = self._slots[index]
+        task = slot.task
+        slot.kill()
+        replacement = self._spawn()
+        with self._lock:
+            self._retired.append(slot.stats(status))
+            self._slots[index] = replacement
+        self.replaced += 1
+        if task is None:
+            return
+        stage = task.stages[-1] if task.stages else "startup"
+        report = aborted_report(task.path, task.sha256, status, stage, task.stages,
+                                time.monotonic() - task.started, self.limits, detail)
+        print(f"[!] {task.path}: {status} during '{stage}', worker replaced")
+        self._resolve(task, report)
+
+    def _ready(self, slot, preloaded, frozen):
+        if self._forkserver and not (preloaded and frozen) and not self._warned_preload:
+            self._warned_preload = True
+            print(f"[!] Worker {slot.process.pid} did not inherit the fork server's models "
+                  f"(preloaded={preloaded}, frozen objects={frozen}); each worker loads its own copy")
+
+    def _drain(self, index):
+        slot = self._slots[index]
+        try:
+            while slot is self._slots[index] and slot.conn.poll():   # a recycled slot is replaced mid-loop
+                msg = slot.conn.recv()
+                if msg[0] == "ready":
+                    slot.ready = True
+                    self._ready(slot, *msg[1:])
+                elif msg[0] == "stage":
+                    if slot.task is not None:
+                        slot.task.stages.append(msg[1])
+                elif msg[0] == "done":
+                    self._finish(slot, msg[2])
+                elif msg[0] == "error":
+                    task = slot.task
+                    self._finish(slot, aborted_report(
+                        task.path, task.sha256, "error",
+                        task.stages[-1] if task.stages else "startup", task.stages,
+                        time.monotonic() - task.started, self.limits, msg[2]))
+        except (EOFError, OSError):
+            pass  # worker died mid-message; the liveness check below handles it
+
+    def _check(self, index):
+        slot = self._slots[index]
+        if not slot.process.is_alive():
+            code = slot.process.exitcode
+            status = "cpu_limit" if code == -getattr(signal, "SIGXCPU", -1) else "crashed"
+            self._abort(index, status, f"exit code {code}")
+            return
+        if slot.task is None:
+            return
+        if self.wall_time and time.monotonic() - slot.task.started > self.wall_time:
+            self._abort(index, "timeout")
+            return
+        if self.rss_limit:
+            rss = _rss_bytes(slot.process.pid)
+            if rss is not None and rss > self.rss_limit:
+                self._abort(index, "memory_limit", f"rss {rss // (1024 * 1024)} MB")
+
+    def _supervise(self):
+        while True:
+            self._assign()
+            busy = [s for s in self._slots if s.task is not None]
+            starting = [s for s in self._slots if not s.ready]
+            with self._lock:
+                idle = not busy and not len(self.scheduler)
+                if idle and self._closed:
+                    return
+            if idle and not starting:
+                self._wakeup.wait(0.5)
+                self._wakeup.clear()
+                continue
+            watched = busy + starting
+            wait([s.conn for s in watched] + [s.process.sentinel for s in watched], timeout=_POLL)
+            for index in range(len(self._slots)):
+                self._drain(index)
+                self._check(index)
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+        self._wakeup.set()
+        self._thread.join()
+        for slot in self._slots:
+            slot.retire()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
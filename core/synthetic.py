@@ -0,0 +1,467 @@
+# core/synthetic.py
+"""
+Benign, structurally valid samples for scale and performance testing.
+
+Every writer streams to a binary file object in one sequential pass, so a
+multi-GB sample costs a few MB of memory and can be written straight into a
+zip member. Content is deterministic for a given numpy Generator.
+
+    PE     PE32+ x64: .text with real x86-64 functions, .rdata with an import
+           directory (pefile-readable) and strings/URLs, .data, and a
+           high-entropy .rsrc blob standing in for packed data
+    ELF    ELF64 x86-64: PT_LOAD + PT_DYNAMIC, DT_NEEDED libraries, .dynsym
+           imports, .rodata strings, .text code, high-entropy .data
+    zip    PE/ELF/script members, optionally nesting further zips
+    script python, shell, PowerShell, batch or JavaScript text with URLs and
+           base64 blobs
+
+Family profiles bias imports, strings, entropy and script kinds, so a
+generated corpus laid out as <family>/<file> also trains a (meaningless but
+well-formed) model through train_model.py. URLs only use the reserved
+example.* domains.
+"""
+import io
+import base64
+import struct
+import zipfile
+
+import numpy as np
+
+KB = 1024
+MB = 1024 * KB
+GB = 1024 * MB
+CHUNK = 1 * MB
+PE_MAX_SIZE = 3 * GB          # PE size fields are 32-bit; stay well below 4 GB
+
+KINDS = ("pe", "elf", "zip", "script")
+SCRIPT_EXTENSIONS = {"python": ".py", "shell": ".sh", "powershell": ".ps1", "batch": ".bat", "javascript": ".js"}
+EXTENSIONS = {"pe": ".exe", "elf": "", "zip": ".zip"}
+
+FAMILIES = {
+    "netclient": {
+        "dlls": {"KERNEL32.dll": ["GetProcAddress", "LoadLibraryA", "CreateThread", "Sleep", "GetTickCount"],
+                 "WS2_32.dll": ["socket", "connect", "send", "recv", "closesocket", "WSAStartup"],
+                 "WININET.dll": ["InternetOpenA", "InternetOpenUrlA", "InternetReadFile", "HttpSendRequestA"]},
+        "libs": ["libc.so.6", "libcurl.so.4", "libssl.so.3"],
+        "functions": ["socket", "connect", "send", "recv", "getaddrinfo", "curl_easy_perform", "SSL_connect"],
+        "words": ["HTTP/1.1", "User-Agent: Mozilla/5.0", "GET /", "POST /", "Content-Length", "socket",
+                  "ftp://", "smtp.example.com", "DNS query"],
+        "entropy": 0.10,
+        "scripts": ["shell", "powershell", "python"],
+    },
+    "installer": {
+        "dlls": {"KERNEL32.dll": ["CreateFileW", "WriteFile", "CopyFileW", "GetTempPathW", "CreateProcessW"],
+                 "ADVAPI32.dll": ["RegOpenKeyExW", "RegSetValueExW", "RegCloseKey", "OpenServiceW"],
+                 "SHELL32.dll": ["ShellExecuteW", "SHGetFolderPathW"]},
+        "libs": ["libc.so.6", "libz.so.1"],
+        "functions": ["fopen", "fwrite", "rename", "chmod", "getenv", "system", "inflate"],
+        "words": ["Software\\Microsoft\\Windows\\CurrentVersion\\Run", "Program Files", "setup.log",
+                  "Extracting files", "getenv", "open", "shutil", "os.system"],
+        "entropy": 0.30,
+        "scripts": ["batch", "powershell", "shell"],
+    },
+    "packed": {
+        "dlls": {"KERNEL32.dll": ["LoadLibraryA", "GetProcAddress", "VirtualAlloc", "VirtualProtect"]},
+        "libs": ["libc.so.6"],
+        "functions": ["mmap", "mprotect", "dlopen", "dlsym"],
+        "words": ["ctypes", "exec", "eval", "VirtualAlloc"],
+        "entropy": 0.75,
+        "scripts": ["javascript", "python"],
+    },
+    "toolkit": {
+        "dlls": {"KERNEL32.dll": ["GetCommandLineW", "GetEnvironmentVariableW", "ExitProcess"],
+                 "USER32.dll": ["MessageBoxW", "GetForegroundWindow"],
+                 "MSVCRT.dll": ["printf", "malloc", "free", "strlen"]},
+        "libs": ["libc.so.6", "libm.so.6", "libpthread.so.0"],
+        "functions": ["printf", "malloc", "free", "pthread_create", "getenv", "open"],
+        "words": ["subprocess", "os.system", "eval", "exec", "getenv", "shutil", "Usage: %s [options]"],
+        "entropy": 0.05,
+        "scripts": ["python", "shell", "javascript"],
+    },
+}
+
+_SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "ze", "qu", "bar", "dex", "fon", "gil", "hob",
+              "jin", "mor", "pex", "tor", "wyn", "cfg", "srv", "tmp", "usr", "net", "log", "api", "key"]
+
+# x86-64 instructions with their immediate/displacement width, for generated function bodies
+_BODY_INSNS = [
+    (b"\xb8", 4),                 # mov eax, imm32
+    (b"\xc7\x45\xf8", 4),         # mov dword [rbp-8], imm32
+    (b"\x83\xc0", 1),             # add eax, imm8
+    (b"\x31\xc0", 0),             # xor eax, eax
+    (b"\x48\x89\xc1", 0),         # mov rcx, rax
+    (b"\x48\x8d\x0d", 4),         # lea rcx, [rip+disp32]
+    (b"\xe8", 4),                 # call rel32
+    (b"\x85\xc0", 0),             # test eax, eax
+    (b"\x75", 1),                 # jne rel8
+    (b"\x8b\x45\xfc", 0),         # mov eax, [rbp-4]
+]
+
+
+def parse_size(text):
+    """'512', '4KB', '1.5MB', '2GB' -> bytes."""
+    text = text.strip().upper().rstrip("B")
+    units = {"K": KB, "M": MB, "G": GB}
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def _align(n, alignment):
+    return (n + alignment - 1) // alignment * alignment
+
+
+def _write_exact(out, chunks, n):
+    """Write exactly n bytes taken from the (endless) chunk iterator."""
+    for chunk in chunks:
+        if n <= 0:
+            return
+        piece = chunk[:n]
+        out.write(piece)
+        n -= len(piece)
+
+
+def _random_chunks(rng):
+    while True:
+        yield rng.bytes(CHUNK)
+
+
+def _cycle(blocks):
+    while True:
+        yield from blocks
+
+
+def _word(rng):
+    return "".join(_SYLLABLES[i] for i in rng.integers(0, len(_SYLLABLES), rng.integers(2, 5)).tolist())
+
+
+def _url(rng, scheme="http"):
+    return f"{scheme}://{_word(rng)}.example.{rng.choice(['com', 'net', 'org'])}/{_word(rng)}/{_word(rng)}.php"
+
+
+def string_pool(rng, profile, n=256):
+    """Printable strings a sample embeds: profile words, URLs and identifiers."""
+    pool = list(profile["words"])
+    pool += [_url(rng, rng.choice(["http", "https", "ftp"])) for _ in range(n // 8)]
+    pool += [f"{_word(rng)}_{_word(rng)}" for _ in range(n - len(pool))]
+    return pool
+
+
+def _string_chunks(rng, pool, blocks=4, block_size=256 * KB):
+    """NUL-separated runs of pool strings: up to `blocks` distinct blocks, made on demand, then cycled."""
+    encoded = [s.encode() for s in pool]
+    made = []
+    for _ in range(blocks):
+        picks = rng.integers(0, len(encoded), block_size // 16).tolist()
+        made.append(b"\x00".join(encoded[i] for i in picks)[:block_size] + b"\x00")
+        yield made[-1]
+    yield from _cycle(made)
+
+
+def code_block(rng, size=16 * KB):
+    """x86-64 functions (prologue, random body, epilogue, int3 padding) filling `size` bytes."""
+    # random draws are made up front in bulk; per-instruction numpy calls dominate small samples
+    picks = iter(rng.integers(0, len(_BODY_INSNS), size).tolist())
+    frames = iter(rng.integers(1, 16, size // 8).tolist())
+    bodies = iter(rng.integers(4, 24, size // 8).tolist())
+    immediates = rng.bytes(4 * size)
+    out, at = bytearray(), 0
+    while len(out) < size:
+        out += b"\x55\x48\x89\xe5\x48\x83\xec" + bytes([8 * next(frames)])     # push rbp; mov rbp, rsp; sub rsp
+        for _ in range(next(bodies)):
+            opcode, width = _BODY_INSNS[next(picks)]
+            out += opcode + immediates[at:at + width]
+            at += width
+        out += b"\xc9\xc3"                                                  # leave; ret
+        out += b"\xcc" * (-len(out) % 16)
+    return bytes(out[:size])
+
+
+def _code_chunks(rng):
+    block = code_block(rng)
+    return _cycle([block * (CHUNK // len(block))])
+
+
+def _pick(rng, items, low=1):
+    return [items[i] for i in sorted(rng.choice(len(items), rng.integers(low, len(items) + 1), replace=False))]
+
+
+# --- PE ----------------------------------------------------------------------
+def _import_directory(dlls, rva):
+    """
+    Import directory for {dll: [functions]} placed at `rva`: descriptors,
+    lookup tables, address tables, hint/name entries and DLL names.
+    Returns (bytes, iat_rva, iat_size).
+    """
+    names = list(dlls)
+    thunk_sizes = [(len(dlls[d]) + 1) * 8 for d in names]
+    ilt = (len(names) + 1) * 20
+    iat = ilt + sum(thunk_sizes)
+    hints = iat + sum(thunk_sizes)
+    hint_blob, hint_offsets = bytearray(), []
+    for d in names:
+        offsets = []
+        for fn in dlls[d]:
+            offsets.append(hints + len(hint_blob))
+            hint_blob += struct.pack("<H", 0) + fn.encode() + b"\x00"
+            hint_blob += b"\x00" * (len(hint_blob) % 2)
+        hint_offsets.append(offsets)
+    dll_names = hints + len(hint_blob)
+
+    descriptors, thunks, name_blob = bytearray(), bytearray(), bytearray()
+    ilt_at, iat_at = ilt, iat
+    for d, offsets in zip(names, hint_offsets):
+        descriptors += struct.pack("<IIIII", rva + ilt_at, 0, 0, rva + dll_names + len(name_blob), rva + iat_at)
+        name_blob += d.encode() + b"\x00"
+        ilt_at += (len(offsets) + 1) * 8
+        iat_at += (len(offsets) + 1) * 8
+    descriptors += bytes(20)
+    for d, offsets in zip(names, hint_offsets):
+        thunks += b"".join(struct.pack("<Q", rva + o) for o in offsets) + bytes(8)
+    table = bytes(descriptors) + bytes(thunks) * 2 + bytes(hint_blob) + bytes(name_blob)
+    return table, rva + iat, sum(thunk_sizes)
+
+
+def write_pe(out, size, rng, profile):
+    """A PE32+ executable of about `size` bytes (at most PE_MAX_SIZE)."""
+    size = min(size, PE_MAX_SIZE)
+    file_align, sect_align, image_base = 0x200, 0x1000, 0x140000000
+    dlls = {d: _pick(rng, fns) for d, fns in profile["dlls"].items()}
+    pool = string_pool(rng, profile)
+    imports_len = len(_import_directory(dlls, 0)[0])
+    headers = _align(0x80 + 4 + 20 + 240 + 4 * 40, file_align)
+
+    body = max(size - headers, 4 * file_align)
+    blob = _align(int(body * profile["entropy"]), file_align)
+    rdata = _align(imports_len + max(int(body * 0.05), 256), file_align)
+    data_head = "\x00".join(rng.choice(pool, 16)).encode()
+    data = _align(max(min(body // 20, 64 * KB) + 1, len(data_head)), file_align)
+    text = _align(max(body - blob - rdata - data, file_align), file_align)
+
+    # (name, raw size, characteristics, head bytes, tail chunks)
+    sections = [
+        [".text", text, 0x60000020, b"", _code_chunks(rng)],
+        [".rdata", rdata, 0x40000040, None, _string_chunks(rng, pool)],
+        [".data", data, 0xC0000040, data_head, _cycle([bytes(CHUNK)])],
+        [".rsrc", blob, 0x40000040, b"", _random_chunks(rng)],
+    ]
+    sections = [s for s in sections if s[1]]
+    va, offset, layout = sect_align, headers, []
+    for section in sections:
+        layout.append((va, offset))
+        va += _align(section[1], sect_align)
+        offset += section[1]
+    size_of_image = va
+
+    rdata_rva = layout[1][0]
+    import_table, iat_rva, iat_size = _import_directory(dlls, rdata_rva)
+    sections[1][3] = import_table
+
+    dos = bytearray(0x80)
+    dos[0:2] = b"MZ"
+    struct.pack_into("<I", dos, 0x3C, 0x80)
+    stub = b"\x0e\x1f\xba\x0e\x00\xb4\x09\xcd\x21\xb8\x01\x4c\xcd\x21This program cannot be run in DOS mode.\r\r\n$"
+    dos[0x40:0x40 + len(stub)] = stub
+    coff = struct.pack("<HHIIIHH", 0x8664, len(sections), int(rng.integers(1_400_000_000, 1_700_000_000)), 0, 0, 240, 0x22)
+    directories = [(0, 0)] * 16
+    directories[1] = (rdata_rva, (len(dlls) + 1) * 20)
+    directories[12] = (iat_rva, iat_size)
+    optional = struct.pack(
+        "<HBBIIIIIQIIHHHHHHIIIIHHQQQQII",
+        0x20B, 14, 0, text, rdata + data + blob, 0, layout[0][0], layout[0][0], image_base,
+        sect_align, file_align, 6, 0, 0, 0, 6, 0, 0, size_of_image, headers, 0,
+        3, 0x8160, 0x100000, 0x1000, 0x100000, 0x1000, 0, 16,
+    ) + b"".join(struct.pack("<II", *d) for d in directories)
+    table = b"".join(struct.pack("<8sIIIIIIHHI", name.encode(), raw, rva, raw, offset, 0, 0, 0, 0, flags)
+                     for (name, raw, flags, _, _), (rva, offset) in zip(sections, layout))
+
+    header = bytes(dos) + b"PE\x00\x00" + coff + optional + table
+    out.write(header + bytes(headers - len(header)))
+    for name, raw, _, head, chunks in sections:
+        out.write(head)
+        _write_exact(out, chunks, raw - len(head))
+    return headers + sum(s[1] for s in sections)
+
+
+# --- ELF ---------------------------------------------------------------------
+def write_elf(out, size, rng, profile):
+    """An ELF64 x86-64 dynamically linked executable of about `size` bytes."""
+    base = 0x400000
+    libs = _pick(rng, profile["libs"])
+    functions = _pick(rng, profile["functions"])
+    pool = string_pool(rng, profile)
+
+    dynstr = b"\x00" + b"".join(s.encode() + b"\x00" for s in libs + functions)
+    name_at = {s: dynstr.index(b"\x00" + s.encode() + b"\x00") + 1 for s in libs + functions}
+    dynsym = bytes(24) + b"".join(struct.pack("<IBBHQQ", name_at[f], 0x12, 0, 0, 0, 0) for f in functions)
+    dynamic_len = (len(libs) + 5) * 16
+    shstrtab = b"\x00.dynstr\x00.dynsym\x00.dynamic\x00.rodata\x00.text\x00.data\x00.shstrtab\x00"
+
+    fixed = 64 + 2 * 56 + len(dynstr) + len(dynsym) + dynamic_len + len(shstrtab) + 9 * 64 + 64
+    body = max(size - fixed, 3 * KB)
+    blob = int(body * profile["entropy"])
+    rodata = max(int(body * 0.05), 256)
+    text = max(body - blob - rodata, KB)
+
+    # (name, type, flags, size, link, info, align, entsize, head, tail chunks)
+    sections = [
+        (".dynstr", 3, 2, len(dynstr), 0, 0, 1, 0, dynstr, None),
+        (".dynsym", 11, 2, len(dynsym), 1, 1, 8, 24, dynsym, None),
+        (".dynamic", 6, 3, dynamic_len, 1, 0, 8, 16, None, None),
+        (".rodata", 1, 2, rodata, 0, 0, 16, 0, b"", _string_chunks(rng, pool)),
+        (".text", 1, 6, text, 0, 0, 16, 0, b"", _code_chunks(rng)),
+        (".data", 1, 3, blob, 0, 0, 16, 0, b"", _random_chunks(rng)),
+        (".shstrtab", 3, 0, len(shstrtab), 0, 0, 1, 0, shstrtab, None),
+    ]
+    offset, offsets = 64 + 2 * 56, []
+    for s in sections:
+        offset = _align(offset, s[6])
+        offsets.append(offset)
+        offset += s[3]
+    shoff = _align(offset, 8)
+    addr = {s[0]: base + o for s, o in zip(sections, offsets)}
+
+    dynamic = b"".join(struct.pack("<qQ", 1, name_at[lib]) for lib in libs)       # DT_NEEDED
+    dynamic += struct.pack("<qQqQqQqQqQ", 5, addr[".dynstr"], 6, addr[".dynsym"],
+                           10, len(dynstr), 11, 24, 0, 0)
+    sections[2] = sections[2][:8] + (dynamic, None)
+
+    ident = b"\x7fELF" + bytes([2, 1, 1, 0]) + bytes(8)
+    ehdr = ident + struct.pack("<HHIQQQIHHHHHH", 2, 62, 1, addr[".text"], 64, shoff, 0, 64, 56, 2, 64,
+                               len(sections) + 1, len(sections))
+    end = shoff + (len(sections) + 1) * 64
+    phdrs = struct.pack("<IIQQQQQQ", 1, 7, 0, base, base, end, end, 0x1000)
+    phdrs += struct.pack("<IIQQQQQQ", 2, 6, offsets[2], addr[".dynamic"], addr[".dynamic"],
+                         dynamic_len, dynamic_len, 8)
+
+    out.write(ehdr + phdrs)
+    position = len(ehdr) + len(phdrs)
+    for s, o in zip(sections, offsets):
+        out.write(bytes(o - position))
+        head, chunks = s[8], s[9]
+        out.write(head)
+        if chunks is not None:
+            _write_exact(out, chunks, s[3] - len(head))
+        position = o + s[3]
+    out.write(bytes(shoff - position))
+    name_offsets = [0] + [shstrtab.index(b"\x00" + s[0].encode() + b"\x00") + 1 for s in sections]
+    out.write(bytes(64))
+    for s, o, name in zip(sections, offsets, name_offsets[1:]):
+        _, sh_type, flags, sh_size, link, info, align, entsize = s[:8]
+        sh_addr = addr[s[0]] if flags & 2 else 0
+        out.write(struct.pack("<IIQQQQIIQQ", name, sh_type, flags, sh_addr, o, sh_size, link, info, align, entsize))
+    return end
+
+
+# --- scripts -----------------------------------------------------------------
+def _b64_lines(rng, n=8):
+    return [base64.b64encode(rng.bytes(57)).decode() for _ in range(n)]
+
+
+def _script_units(rng, kind, profile):
+    """Endless (header, unit generator) for one script kind."""
+    words = [w.replace('"', "'") for w in profile["words"]]
+    # per-sample pools indexed in batches: numpy calls per unit would cap output at a few MB/s
+    urls = [_url(rng) for _ in range(64)]
+    blobs = [_b64_lines(rng, int(rng.integers(1, 12))) for _ in range(64)]
+
+    def units():
+        i = 0
+        while True:
+            picks = rng.integers(0, 64, (4096, 3)).tolist()
+            for u, w, b in picks:
+                i += 1
+                url, word, blob = urls[u], words[w % len(words)], blobs[b]
+                if kind == "python":
+                    yield (f"def task_{i}(url={url!r}):\n    note = {word!r}\n"
+                           f"    return os.getenv('HOME', ''), len(note), url\n\n"
+                           f"PAYLOAD_{i} = (\n" + "".join(f"    {line!r}\n" for line in blob) + ")\n\n")
+                elif kind == "shell":
+                    yield (f"fetch_{i}() {{\n  curl -s -o /tmp/item_{i} \"{url}\"\n  echo \"{word}\"\n}}\n"
+                           f"cat <<'EOF' > /tmp/blob_{i}.b64\n" + "\n".join(blob) + "\nEOF\n\n")
+                elif kind == "powershell":
+                    yield (f"$url{i} = \"{url}\"\nWrite-Output \"{word}\"\n"
+                           f"$bytes{i} = [Convert]::FromBase64String(\"{''.join(blob)}\")\n\n")
+                elif kind == "batch":
+                    yield (f"set ITEM{i}=item{w}\necho {word}\n"
+                           f"ping -n 1 {url.split('/')[2]} >nul\n" + "".join(f"rem {line}\n" for line in blob))
+                else:
+                    yield (f"var url{i} = \"{url}\";\nfunction task{i}(x) {{ return x + \"{word}\"; }}\n"
+                           f"var blob{i} = \"{''.join(blob)}\";\n\n")
+
+    headers = {
+        "python": "#!/usr/bin/env python3\nimport os\nimport base64\nimport socket\n\n",
+        "shell": "#!/bin/sh\nexport LANG=C\ncd /tmp\n\n",
+        "powershell": "Set-StrictMode -Version Latest\n$work = Join-Path $env:TEMP \"work\"\n\n",
+        "batch": "@echo off\nsetlocal\n\n",
+        "javascript": "\"use strict\";\n\n",
+    }
+    return headers[kind], units()
+
+
+def write_script(out, size, rng, profile, kind):
+    """A `kind` script of about `size` bytes; units are whole, so it may end slightly short."""
+    header, units = _script_units(rng, kind, profile)
+    data = header.encode()
+    written, pending = 0, [data]
+    pending_len = len(data)
+    for unit in units:
+        unit = unit.encode()
+        if written + pending_len + len(unit) > size and written + pending_len > 0:
+            break
+        pending.append(unit)
+        pending_len += len(unit)
+        if pending_len >= CHUNK:
+            out.write(b"".join(pending))
+            written += pending_len
+            pending, pending_len = [], 0
+    out.write(b"".join(pending))
+    return written + pending_len
+
+
+# --- archives ----------------------------------------------------------------
+def write_zip(out, size, rng, profile, depth=1):
+    """
+    A zip of 2-8 PE/ELF/script members whose sizes add up to about `size`;
+    with depth > 0 one member is itself a nested zip (depth - 1 further levels).
+    """
+    n = int(rng.integers(2, 9))
+    shares = rng.dirichlet(np.ones(n))
+    with zipfile.ZipFile(out, "w") as zf:
+        for i, share in enumerate(shares):
+            member_size = max(int(size * share), KB)
+            kind = "zip" if depth > 0 and i == 0 else str(rng.choice(["pe", "elf", "script"]))
+            name, script_kind = member_name(rng, profile, kind, f"{_word(rng)}_{i}")
+            # large members are stored, as installers do: deflating GBs would dominate generation time
+            stored = kind == "zip" or member_size > 8 * MB or rng.random() < 0.3
+            method = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+            info = zipfile.ZipInfo(name, date_time=(2024, 1, 1, 0, 0, 0))
+            info.compress_type = method
+            with zf.open(info, "w", force_zip64=member_size > GB) as member:
+                write_sample(member, kind, member_size, rng, profile, depth - 1, script_kind)
+
+
+def member_name(rng, profile, kind, stem):
+    """(file name, script kind or None) for a sample of `kind`."""
+    if kind == "script":
+        script_kind = str(rng.choice(profile["scripts"]))
+        return stem + SCRIPT_EXTENSIONS[script_kind], script_kind
+    return stem + EXTENSIONS[kind], None
+
+
+def write_sample(out, kind, size, rng, profile, depth=1, script_kind=None):
+    """Write one sample of `kind` ("pe", "elf", "zip", "script") to `out`."""
+    if kind == "pe":
+        return write_pe(out, size, rng, profile)
+    if kind == "elf":
+        return write_elf(out, size, rng, profile)
+    if kind == "zip":
+        return write_zip(out, size, rng, profile, depth)
+    return write_script(out, size, rng, profile, script_kind or str(rng.choice(profile["scripts"])))
+
+
+def sample_bytes(kind, size, seed=0, family="netclient", **kwargs):
+    """A small sample in memory, for benchmarks."""
+    buffer = io.BytesIO()
+    write_sample(buffer, kind, size, np.random.default_rng(seed), FAMILIES[family], **kwargs)
+    return buffer.getvalue()
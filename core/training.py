@@ -0,0 +1,384 @@
+# core/training.py
+import os
+import hashlib
+import logging
+import tempfile
+from array import array
+from collections import defaultdict
+from itertools import islice
+
+import joblib
+import numpy as np
+from sklearn.model_selection import train_test_split
+from sklearn.utils import resample
+
+from core.features import extract_features_from_file, PRIMARY_FEATURES
+from core.feature_index import (ExtendedFeatures, FrequencyIndex, TokenSpool, sample_tokens,
+                                DEFAULT_TOP_K, DEFAULT_MIN_DF)
+from core.opcodes import opcode_ngrams_from_file
+from core.utils import shannon_entropy, extract_printable_strings
+
+MODELS_DIR = os.path.join(os.path.dirname(__file__), '../models')
+TRAINING_X_PATH = os.path.join(MODELS_DIR, 'training_X.npy')
+TRAINING_Y_PATH = os.path.join(MODELS_DIR, 'training_y.npy')
+
+# PRIMARY_FEATURES counts + file size, entropy, strings, imports, functions, params
+DERIVED_FEATURES = ["file_size", "entropy", "num_strings", "num_imports", "num_functions", "num_params"]
+BASE_WIDTH = len(PRIMARY_FEATURES) + len(DERIVED_FEATURES)
+
+
+def feature_names(opcode_width=0, extended=None):
+    """Column names of the training vector, in vectorize() order."""
+    return (list(PRIMARY_FEATURES) + DERIVED_FEATURES + [f"opcode_ngram[{i}]" for i in range(opcode_width)]
+            + (extended.names() if extended else []))
+
+
+def vectorize(feats, file_path, opcode_width=0, extended=None):
+    """
+    Build numeric vector for a sample.
+    - Count occurrences of PRIMARY_FEATURES from combined keys
+    - Add derived features: file size, entropy, num_strings, num_imports, num_functions
+    - With opcode_width > 0, append the hashed opcode n-gram block (core.opcodes)
+    - With an ExtendedFeatures list (core.feature_index), append its token presence block
+    """
+    combined = []
+
+    # Flatten features into a list for counting primary features
+    for key in PRIMARY_FEATURES:
+        if key in feats:
+            combined.extend([key] * feats.get(key, 0))
+
+    # Count functions and imports (optional)
+    funcs = feats.get("functions", [])
+    imports = feats.get("imports", [])
+    combined.extend(funcs)
+    combined.extend(imports)
+
+    # Vectorize primary features
+    counts = [combined.count(f) for f in PRIMARY_FEATURES]
+
+    # Derived numeric features
+    try:
+        file_size = os.path.getsize(file_path)
+    except Exception:
+        file_size = 0
+
+    entropy = shannon_entropy(file_path)
+
+    # Number of strings
+    num_strings = len(feats.get("strings", [])) or len(extract_printable_strings(file_path))
+
+    # Number of imports / functions
+    num_imports = len(imports)
+    num_functions = len(funcs)
+    num_params = sum(len(p) for p in feats.get("params", {}).values()) if feats.get("params") else 0
+
+    # Final vector
+    vector = counts + [file_size, entropy, num_strings, num_imports, num_functions, num_params]
+    if opcode_width:
+        vector += opcode_ngrams_from_file(file_path, opcode_width).tolist()
+    if extended:
+        vector += extended.vector(sample_tokens(feats))
+    return vector
+
+
+class ExtendedSelection:
+    """
+    --extended-features K, chosen during a build_dataset*() pass: every
+    sample's tokens are spooled as it is extracted, and once the labels are
+    known only the rows `training_rows(y)` returns (default: split_holdout's
+    train side) are indexed, so held-out labels never pick a column. The
+    result is in `features`, `entries` and `documents` after the build.
+    """
+
+    def __init__(self, k=DEFAULT_TOP_K, min_df=DEFAULT_MIN_DF, training_rows=None):
+        self.k = k
+        self.min_df = min_df
+        self.training_rows = training_rows or (lambda y: split_holdout(y)[0])
+        self.entries = self.documents = None
+        self.features = ExtendedFeatures()
+
+    def select(self, spool, y):
+        train = np.zeros(len(y), dtype=bool)
+        train[self.training_rows(y)] = True
+        with FrequencyIndex(tmp_dir=MODELS_DIR) as index:
+            for row, tokens in enumerate(spool):
+                if train[row]:
+                    index.add_tokens(y[row], tokens)
+            self.entries = index.select(self.k, self.min_df)
+            self.documents = dict(index.documents)
+        logging.info("[+] Selected %d extended features from the %d training samples",
+                     len(self.entries), int(train.sum()))
+        self.features = ExtendedFeatures((e["kind"], e["token"]) for e in self.entries)
+        return self.features
+
+
+def _extended_rows(tokens, extended, n):
+    """The next n rows of `extended` presence columns from a TokenSpool iterator."""
+    return np.array([extended.vector(t) for t in islice(tokens, n)], dtype=np.float64).reshape(n, len(extended))
+
+
+def build_dataset(base_dir, opcode_width=0, extended=None, selection=None):
+    """
+    Extract and vectorize every sample under base_dir/<family>/.
+    With an ExtendedSelection, the extended columns are chosen after the pass
+    from the same extraction (see ExtendedSelection) and appended.
+    Returns (X, y) as NumPy arrays, or (None, None) if nothing usable was found.
+    """
+    X = []
+    y = []
+
+    logging.info("[+] Scanning dataset: %s", base_dir)
+    if not os.path.isdir(base_dir):
+        logging.error("[!] Dataset folder not found")
+        return None, None
+
+    spool = TokenSpool(tmp_dir=MODELS_DIR) if selection else None
+    try:
+        for family in os.listdir(base_dir):
+            family_dir = os.path.join(base_dir, family)
+            if not os.path.isdir(family_dir):
+                continue
+            for fname in os.listdir(family_dir):
+                file_path = os.path.join(family_dir, fname)
+                try:
+                    feats = extract_features_from_file(file_path)
+                    if not feats or not isinstance(feats, dict):
+                        continue
+                    vec = vectorize(feats, file_path, opcode_width, None if selection else extended)
+                    X.append(vec)
+                    y.append(family)
+                    if selection:
+                        spool.add(feats)
+                except Exception as e:
+                    logging.warning("[!] Skipped %s: %s", file_path, e)
+
+        if not X:
+            logging.error("[!] No valid features found")
+            return None, None
+
+        X = np.array(X)
+        y = np.array(y)
+        if selection:
+            extended = selection.select(spool, y)
+            X = np.hstack([X, _extended_rows(iter(spool), extended, len(y))])
+    finally:
+        if spool is not None:
+            spool.close()
+    logging.info("[+] Collected %d samples across %d classes", len(y), len(set(y)))
+    return X, y
+
+
+def iter_dataset_files(base_dir):
+    """Yield (family, file_path) for every sample under base_dir/<family>/, in a stable order."""
+    for family in sorted(os.listdir(base_dir)):
+        family_dir = os.path.join(base_dir, family)
+        if not os.path.isdir(family_dir):
+            continue
+        for fname in sorted(os.listdir(family_dir)):
+            yield family, os.path.join(family_dir, fname)
+
+
+def build_dataset_on_disk(base_dir, opcode_width=0, x_path=TRAINING_X_PATH, y_path=TRAINING_Y_PATH,
+                          chunk_rows=4096, extended=None, selection=None):
+    """
+    Out-of-core variant of build_dataset: vectors are written to disk a chunk
+    at a time and the stored training matrix is assembled from them, so memory
+    use does not grow with the corpus. An ExtendedSelection's columns are
+    added while the matrix is assembled. Returns the matrix memory-mapped
+    (X read-only, y as labels), or (None, None) if nothing usable was found.
+    """
+    logging.info("[+] Scanning dataset: %s (streaming to %s)", base_dir, x_path)
+    if not os.path.isdir(base_dir):
+        logging.error("[!] Dataset folder not found")
+        return None, None
+
+    width = BASE_WIDTH + opcode_width + (0 if selection else len(extended or ()))
+    directory = os.path.dirname(os.path.abspath(x_path))
+    os.makedirs(directory, exist_ok=True)
+    families, codes = [], array("H")
+    buffer = np.empty((chunk_rows, width), dtype=np.float64)
+    fill = rows = 0
+    fd, raw_path = tempfile.mkstemp(dir=directory, prefix=".tmp_rows_")
+    spool = TokenSpool(tmp_dir=directory) if selection else None
+    try:
+        with os.fdopen(fd, "wb") as raw:
+            for family, file_path in iter_dataset_files(base_dir):
+                try:
+                    feats = extract_features_from_file(file_path)
+                    if not feats or not isinstance(feats, dict):
+                        continue
+                    buffer[fill] = vectorize(feats, file_path, opcode_width, None if selection else extended)
+                except Exception as e:
+                    logging.warning("[!] Skipped %s: %s", file_path, e)
+                    continue
+                if selection:
+                    spool.add(feats)
+                if family not in families:
+                    families.append(family)
+                codes.append(families.index(family))
+                fill += 1
+                if fill == chunk_rows:
+                    raw.write(buffer.tobytes())
+                    rows += fill
+                    fill = 0
+            raw.write(buffer[:fill].tobytes())
+            rows += fill
+
+        if not rows:
+            logging.error("[!] No valid features found")
+            return None, None
+
+        # Copy the raw rows into a real .npy (header + data) chunk by chunk
+        source = np.memmap(raw_path, dtype=np.float64, mode="r", shape=(rows, width))
+        labels = np.array(families)
+        if selection:
+            extended = selection.select(spool, labels[np.frombuffer(codes, np.uint16)])
+            tokens = iter(spool)      # consumed in order, one chunk of rows at a time
+
+            def row_chunk(a, b):
+                block = source[a:b]
+                return np.hstack([block, _extended_rows(tokens, extended, len(block))])
+
+            width += len(extended)
+        else:
+            def row_chunk(a, b):
+                return source[a:b]
+        for path, dtype, shape, chunk in (
+                (x_path, np.float64, (rows, width), row_chunk),
+                (y_path, labels.dtype, (rows,), lambda a, b: labels[np.frombuffer(codes, np.uint16)[a:b]])):
+            tmp_path = os.path.join(directory, f".tmp_{os.path.basename(path)}")
+            target = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype, shape=shape)
+            for start in range(0, rows, chunk_rows):
+                target[start:start + chunk_rows] = chunk(start, start + chunk_rows)
+            target.flush()
+            del target
+            os.replace(tmp_path, path)
+        del source
+    finally:
+        os.remove(raw_path)
+        if spool is not None:
+            spool.close()
+
+    logging.info("[+] Collected %d samples across %d classes", rows, len(families))
+    return load_training_matrix(x_path, y_path, mmap=True)
+
+
+def load_or_build_dataset(base_dir, reuse=False, opcode_width=0, extended=None, selection=None):
+    """
+    Extract the dataset once and store it as the shared training matrix.
+    With reuse=True the stored matrix is returned as-is when present and of the
+    expected width (BASE_WIDTH + opcode_width + extended tokens), skipping
+    extraction; never with an ExtendedSelection, whose width is not known yet.
+    """
+    width = BASE_WIDTH + opcode_width + len(extended or ())
+    if reuse and selection is None:
+        X, y = load_training_matrix()
+        if X is not None and X.shape[1] == width:
+            logging.info("[+] Loaded stored training matrix (%d x %d)", X.shape[0], X.shape[1])
+            return X, y
+        if X is not None:
+            logging.info("[+] Stored training matrix has %d columns, expected %d; re-extracting",
+                         X.shape[1], width)
+
+    X, y = build_dataset(base_dir, opcode_width, extended, selection)
+    if X is None:
+        return None, None
+
+    # Keep the raw matrix so later runs (and update_model.py) skip extraction
+    save_training_matrix(X, y)
+    logging.info("[+] Stored training matrix (%d x %d)", X.shape[0], X.shape[1])
+    return X, y
+
+
+def split_holdout(y, test_size=0.2, random_state=42):
+    """
+    Stratified (train indices, held-out indices) of the raw, unbalanced
+    training matrix. Oversample only the train side afterwards: split after
+    balance_classes() and the held-out rows are copies of training rows.
+    """
+    return train_test_split(np.arange(len(y)), test_size=test_size, stratify=y, random_state=random_state)
+
+
+def holdout_record(X, y, test_idx):
+    """
+    What a pipeline held out, stored with it as "held_out": the matrix size
+    and a digest of the held-out rows, so a later split_holdout() of the
+    stored matrix can be checked to give the very same rows.
+    """
+    digest = hashlib.sha256()
+    digest.update(np.asarray(test_idx, dtype=np.int64).tobytes())
+    digest.update(np.ascontiguousarray(X[test_idx], dtype=np.float64).tobytes())
+    digest.update("\0".join(str(label) for label in y[test_idx]).encode())
+    return {"rows": int(len(y)), "samples": int(len(test_idx)), "sha256": digest.hexdigest()}
+
+
+def balance_classes(X, y, random_state=42):
+    """
+    Oversample minority classes so every label has as many rows as the largest one.
+    Returns (X_balanced, y_balanced, max_count).
+    """
+    by_label = defaultdict(list)
+    for xv, label in zip(X, y):
+        by_label[label].append(xv)
+
+    max_count = max(len(lst) for lst in by_label.values())
+    X_balanced, y_balanced = [], []
+    for label, items in by_label.items():
+        items_res = resample(items, replace=True, n_samples=max_count, random_state=random_state) \
+            if len(items) < max_count else items
+        X_balanced.extend(items_res)
+        y_balanced.extend([label] * len(items_res))
+
+    return np.array(X_balanced), np.array(y_balanced), max_count
+
+
+def _atomic_write(path, write):
+    """Write through a temp file in the target directory, then rename over `path`."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=os.path.splitext(path)[1])
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def save_training_matrix(X, y, x_path=TRAINING_X_PATH, y_path=TRAINING_Y_PATH):
+    """Store the raw (unscaled, unbalanced) training vectors and their family labels."""
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y, dtype=str)
+    _atomic_write(x_path, lambda f: np.save(f, X))
+    _atomic_write(y_path, lambda f: np.save(f, y))
+
+
+def load_training_matrix(x_path=TRAINING_X_PATH, y_path=TRAINING_Y_PATH, mmap=False):
+    """Load the stored training matrix. Returns (None, None) if it was never saved."""
+    if not (os.path.exists(x_path) and os.path.exists(y_path)):
+        return None, None
+    X = np.load(x_path, mmap_mode="r" if mmap else None)
+    y = np.load(y_path, mmap_mode="r" if mmap else None)
+    return X, y
+
+
+def pipeline_version(model_path):
+    """Return the version of the published pipeline at `model_path` (0 if none)."""
+    try:
+        return int(joblib.load(model_path).get("version", 1))
+    except Exception:
+        return 0
+
+
+def publish_pipeline(pipeline, model_path):
+    """
+    Atomically replace the pipeline at `model_path`.
+    Readers (core.classifier) either see the old file or the new one, never a partial write.
+    """
+    _atomic_write(model_path, lambda f: joblib.dump(pipeline, f))
+    return model_path
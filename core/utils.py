@@ -1,23 +1,26 @@
 # core/utils.py
 import os
 import re
-import math
 import hashlib
-from collections import Counter
+
+import numpy as np
 
 def shannon_entropy(file_path):
     """Calculate Shannon entropy of a file."""
     try:
         with open(file_path, "rb") as f:
-            data = f.read()
-        if not data:
-            return 0.0
-        counts = Counter(data)
-        probs = [c / len(data) for c in counts.values()]
-        return -sum(p * math.log2(p) for p in probs if p > 0)
+            return byte_entropy(f.read())
     except Exception:
         return 0.0
 
+def byte_entropy(data):
+    """Shannon entropy of a bytes object (bits per byte)."""
+    if not data:
+        return 0.0
+    counts = np.bincount(np.frombuffer(data, dtype=np.uint8), minlength=256)
+    probs = counts[counts > 0] / len(data)
+    return float(-(probs * np.log2(probs)).sum())
+
 def extract_printable_strings(file_path, min_len=4):
     """Extract printable strings from a binary file."""
     try:
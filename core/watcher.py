@@ -0,0 +1,274 @@
+# core/watcher.py
+import os
+import json
+import time
+import queue
+import select
+import signal
+import struct
+import ctypes
+import threading
+import stat as stat_mode
+from collections import deque, OrderedDict
+
+from core.utils import get_sha256
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT = struct.Struct("iIII")
+
+MAX_REMEMBERED = 100000     # queued files and hashes kept for deduplication, least recently seen dropped first
+
+
+def _remember(lru, key, value=None, limit=MAX_REMEMBERED):
+    lru[key] = value
+    lru.move_to_end(key)
+    if len(lru) > limit:
+        lru.popitem(last=False)
+
+
+class Inotify:
+    """Minimal ctypes binding to Linux inotify; raises OSError where unavailable."""
+
+    def __init__(self):
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            init = libc.inotify_init1
+        except (OSError, AttributeError):
+            raise OSError("inotify is not available on this platform")
+        self._libc = libc
+        self.fd = init(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs = {}
+
+    def add_watch(self, directory, mask=IN_CLOSE_WRITE | IN_MOVED_TO | IN_MODIFY):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {directory}")
+        self._dirs[wd] = directory
+
+    def read_events(self, timeout):
+        """Return [(path, mask)] for events arriving within `timeout` seconds."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + _EVENT.size <= len(data):
+            wd, mask, _, name_len = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset:offset + name_len].rstrip(b"\0")
+            offset += name_len
+            if wd in self._dirs and name:
+                events.append((os.path.join(self._dirs[wd], os.fsdecode(name)), mask))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class WatchMetrics:
+    """Thread-safe counters plus a window of recent end-to-end latencies."""
+
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self.counts = {"enqueued": 0, "processed": 0, "failed": 0, "duplicates": 0}
+
+    def incr(self, key):
+        with self._lock:
+            self.counts[key] += 1
+
+    def record_latency(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def snapshot(self, queue_depth):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            counts = dict(self.counts)
+
+        def pct(p):
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 3) if latencies else None
+
+        return dict(counts, queue_depth=queue_depth, latency_p50_s=pct(0.50),
+                    latency_p95_s=pct(0.95), latency_max_s=round(latencies[-1], 3) if latencies else None)
+
+
+class FolderWatcher:
+    """
+    Watch one or more inbox directories and feed finished samples to warm workers.
+
+    A file is considered complete once its size and mtime have not changed for
+    `settle` seconds (inotify close/move events only wake the check up early).
+    Dotfiles and anything but regular files are ignored. Files are deduplicated
+    by SHA-256 before they are queued (the last `max_remembered` paths and
+    hashes are kept), and `workers` threads call `handler(path, sha256)` for
+    each one, so the handler need not hash the file again. `handler` runs
+    in-process, so whatever it imports (the loaded model, lief, capstone)
+    stays warm.
+    """
+
+    def __init__(self, directories, handler, workers=2, poll_interval=2.0, settle=2.0,
+                 use_inotify=True, metrics_path=None, metrics_interval=30.0, extra_metrics=None,
+                 max_remembered=MAX_REMEMBERED):
+        self.directories = [os.path.abspath(d) for d in directories]
+        self.handler = handler
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.settle = settle
+        self.metrics_path = metrics_path
+        self.metrics_interval = metrics_interval
+        self.extra_metrics = extra_metrics      # callable returning more snapshot fields
+        self.metrics = WatchMetrics()
+        self.queue = queue.Queue()
+        self._stop = threading.Event()
+        self._pending = {}      # path -> (size, mtime_ns, stable_since, first_seen)
+        self.max_remembered = max_remembered
+        self._done = OrderedDict()          # path -> (size, mtime_ns) already queued, LRU
+        self._seen_hashes = OrderedDict()   # sha256 -> None, LRU
+        self._inotify = None
+        if use_inotify:
+            try:
+                self._inotify = Inotify()
+                for d in self.directories:
+                    self._inotify.add_watch(d)
+            except OSError as e:
+                print(f"[!] inotify unavailable ({e}); falling back to polling")
+                self._inotify = None
+
+    # --- discovery -------------------------------------------------------
+    def _scan(self):
+        for directory in self.directories:
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if entry.is_file(follow_symlinks=False):
+                            self._touch(entry.path)
+            except FileNotFoundError:
+                continue
+
+    def _touch(self, path):
+        """Start (or restart) the settle timer for a file whose size/mtime changed."""
+        if os.path.basename(path).startswith("."):
+            return
+        try:
+            st = os.lstat(path)
+        except OSError:
+            self._pending.pop(path, None)
+            return
+        if not stat_mode.S_ISREG(st.st_mode):
+            self._pending.pop(path, None)
+            return
+        key = (st.st_size, st.st_mtime_ns)
+        if self._done.get(path) == key:
+            self._done.move_to_end(path)
+            return
+        now = time.monotonic()
+        prev = self._pending.get(path)
+        if prev is None:
+            self._pending[path] = key + (now, now)
+        elif prev[:2] != key:
+            self._pending[path] = key + (now, prev[3])
+
+    def _promote_settled(self):
+        now = time.monotonic()
+        for path, (size, mtime_ns, stable_since, first_seen) in list(self._pending.items()):
+            self._touch(path)
+            current = self._pending.get(path)
+            if current is None or current[2] != stable_since or now - stable_since < self.settle:
+                continue
+            del self._pending[path]
+            _remember(self._done, path, (size, mtime_ns), self.max_remembered)
+            sha256 = get_sha256(path)
+            if sha256 is None:
+                continue
+            if sha256 in self._seen_hashes:
+                self._seen_hashes.move_to_end(sha256)
+                self.metrics.incr("duplicates")
+                continue
+            _remember(self._seen_hashes, sha256, limit=self.max_remembered)
+            self.metrics.incr("enqueued")
+            self.queue.put((path, sha256, first_seen))
+
+    # --- workers ---------------------------------------------------------
+    def _worker(self):
+        while not self._stop.is_set():
+            try:
+                path, sha256, first_seen = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                self.handler(path, sha256)
+                self.metrics.incr("processed")
+            except Exception as e:
+                print(f"[!] Failed to analyze {path}: {e}")
+                self.metrics.incr("failed")
+            finally:
+                self.metrics.record_latency(time.monotonic() - first_seen)
+                self.queue.task_done()
+
+    def _publish_metrics(self):
+        snapshot = self.metrics.snapshot(self.queue.qsize())
+        if self.extra_metrics is not None:
+            snapshot.update(self.extra_metrics())
+        print(f"[+] Watch metrics: {snapshot}")
+        if self.metrics_path:
+            tmp = self.metrics_path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(snapshot, f, indent=4)
+            os.replace(tmp, self.metrics_path)
+
+    def run(self):
+        mode = "inotify" if self._inotify else f"polling every {self.poll_interval}s"
+        print(f"[+] Watching {', '.join(self.directories)} ({mode}, {self.workers} workers)")
+        threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(self.workers)]
+        for t in threads:
+            t.start()
+
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda *_: self.stop())
+
+        self._scan()
+        last_scan = last_metrics = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                if self._inotify:
+                    # Wake on events, but keep ticking so settle timers expire
+                    timeout = min(self.poll_interval, self.settle / 2) if self._pending else self.poll_interval
+                    for path, _ in self._inotify.read_events(timeout):
+                        self._touch(path)
+                else:
+                    time.sleep(self.poll_interval)
+                    self._scan()
+
+                now = time.monotonic()
+                # Periodic rescan also catches anything inotify missed (queue overflow, NFS)
+                if self._inotify and now - last_scan >= 60:
+                    self._scan()
+                    last_scan = now
+                self._promote_settled()
+                if now - last_metrics >= self.metrics_interval:
+                    self._publish_metrics()
+                    last_metrics = now
+        except KeyboardInterrupt:
+            print("[+] Stopping watcher...")
+        finally:
+            self._stop.set()
+            for t in threads:
+                t.join()
+            if self._inotify:
+                self._inotify.close()
+            self._publish_metrics()
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,318 @@
+# core/workqueue.py
+"""
+Durable work queue for scans spread over several machines.
+
+A coordinator enqueues sample paths or SHA-256s into one SQLite file on
+shared storage; any number of worker nodes claim batches under a time-limited
+lease, heartbeat while they work and mark each job done. SHA-256s, and paths
+under the coordinator's --sample-root, are stored relative to the root and
+resolved against each node's own --sample-root, so the share may be mounted
+at a different place on every node. A lease that is not renewed (the node crashed, hung or lost
+the share) expires and its jobs go back to the queue on the next claim, so no
+work is lost. Every state change is a short BEGIN IMMEDIATE transaction, which
+SQLite serializes across processes and hosts through its file lock.
+
+    python cli.py --enqueue /archive --sample-root /archive --queue /mnt/shared/scan.sqlite      (coordinator)
+    python cli.py --queue-worker --sample-root /mnt/archive --queue /mnt/shared/scan.sqlite    (each node)
+"""
+import os
+import re
+import time
+import socket
+import sqlite3
+import threading
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from core.pipeline import iter_sample_paths
+from core.report_generator import write_json_report, DEFAULT_STRING_LIMIT
+from core.scheduler import Scheduler
+from core.supervisor import SupervisedPool, DEFAULT_WALL_TIME, DEFAULT_CPU_TIME, DEFAULT_RSS_MB, DEFAULT_MAX_TASKS
+
+DEFAULT_QUEUE_PATH = "scan_queue.sqlite"
+DEFAULT_LEASE = 300.0        # seconds a claim stays valid without a heartbeat
+DEFAULT_CLAIM_BATCH = 16
+MAX_ATTEMPTS = 3             # leases a job may lose before it is marked failed
+
+_SHA256 = re.compile(r"^[0-9a-fA-F]{64}$")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id            INTEGER PRIMARY KEY,
+    path          TEXT NOT NULL UNIQUE,              -- absolute, relative to the sample root, or the SHA-256
+    sha256        TEXT,
+    state         TEXT NOT NULL DEFAULT 'queued',   -- queued | leased | done | failed
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    lease_owner   TEXT,
+    lease_expires REAL,
+    enqueued_at   REAL NOT NULL,
+    finished_at   REAL,
+    result        TEXT                               -- report path, or the error
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, id);
+"""
+
+
+def node_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def resolve_sample(item, sample_root=None):
+    """
+    (path, sha256) for a queue item: a path as given, or a SHA-256 looked up
+    as <root>/<sha> or <root>/<sha[:2]>/<sha> (MalwareBazaar-style layouts).
+    """
+    if _SHA256.match(item) and sample_root:
+        sha = item.lower()
+        for candidate in (os.path.join(sample_root, sha), os.path.join(sample_root, sha[:2], sha)):
+            if os.path.isfile(candidate):
+                return candidate, sha
+        return None, sha
+    return item, None
+
+
+def _queue_key(path, sample_root):
+    """Path as stored in the queue: relative to sample_root when it lies under it, else absolute."""
+    path = os.path.abspath(path)
+    if sample_root:
+        root = os.path.abspath(sample_root)
+        if os.path.commonpath([path, root]) == root:
+            return os.path.relpath(path, root)
+    return path
+
+
+def locate_job(path, sha256, sample_root=None):
+    """Local file for a claimed job, or None: SHA-256 jobs and relative paths resolve against sample_root."""
+    if sha256 is not None and path == sha256:
+        return resolve_sample(sha256, sample_root)[0] if sample_root else None
+    if os.path.isabs(path):
+        return path
+    return os.path.join(sample_root, path) if sample_root else None
+
+
+class WorkQueue:
+    def __init__(self, path=DEFAULT_QUEUE_PATH, timeout=60.0):
+        self.path = path
+        # isolation_level=None: transactions are explicit, so claims can take the write lock up front
+        self._db = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()     # the heartbeat thread shares the connection
+        # rollback journal rather than WAL: WAL needs shared memory, which network filesystems lack
+        self._db.execute("PRAGMA journal_mode=DELETE")
+        self._db.executescript(_SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def _transaction(self, fn):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._db)
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+            return result
+
+    # --- coordinator ------------------------------------------------------
+    def enqueue(self, items, sample_root=None, chunk=1000):
+        """
+        Add paths/SHA-256s (files, or directories walked recursively). With
+        sample_root, SHA-256s are queued as they are and paths under the root
+        relative to it; nodes resolve both against their own root. Items
+        already in the queue are skipped, so re-running a coordinator is safe.
+        Returns (added, skipped, unresolved); unresolved counts SHA-256s not
+        found under the coordinator's root, which are queued anyway.
+        """
+        added = skipped = unresolved = 0
+        rows = []
+
+        def flush():
+            nonlocal added, skipped
+            now = time.time()
+
+            def insert(db):
+                before = db.total_changes
+                db.executemany("INSERT OR IGNORE INTO jobs (path, sha256, enqueued_at) VALUES (?, ?, ?)",
+                               [(p, s, now) for p, s in rows])
+                return db.total_changes - before
+
+            n = self._transaction(insert)
+            added += n
+            skipped += len(rows) - n
+            rows.clear()
+
+        for item in items:
+            if _SHA256.match(item) and sample_root:
+                sha = item.lower()
+                if resolve_sample(sha, sample_root)[0] is None:
+                    print(f"[!] No sample for {sha} under {sample_root}; queued for the nodes to resolve")
+                    unresolved += 1
+                rows.append((sha, sha))
+            else:
+                rows.extend((_queue_key(p, sample_root), None) for p in iter_sample_paths([item]))
+            if len(rows) >= chunk:
+                flush()
+        if rows:
+            flush()
+        return added, skipped, unresolved
+
+    def requeue_failed(self):
+        return self._transaction(lambda db: db.execute(
+            "UPDATE jobs SET state = 'queued', attempts = 0, result = NULL WHERE state = 'failed'").rowcount)
+
+    def pending(self):
+        """Jobs still queued or leased to some node."""
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM jobs WHERE state IN ('queued', 'leased')").fetchone()[0]
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+            owners = dict(self._db.execute(
+                "SELECT lease_owner, COUNT(*) FROM jobs WHERE state = 'leased' GROUP BY lease_owner").fetchall())
+        return {"counts": {s: counts.get(s, 0) for s in ("queued", "leased", "done", "failed")},
+                "leases": owners}
+
+    # --- worker nodes -----------------------------------------------------
+    def claim(self, owner, n=DEFAULT_CLAIM_BATCH, lease=DEFAULT_LEASE):
+        """
+        Lease up to n queued jobs to `owner`: [(id, path, sha256)]. Expired
+        leases are returned to the queue first (or failed after MAX_ATTEMPTS).
+        """
+        def take(db):
+            now = time.time()
+            db.execute("UPDATE jobs SET state = 'failed', lease_owner = NULL, finished_at = ?, "
+                       "result = 'lease expired ' || attempts || ' times' "
+                       "WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?", (now, now, MAX_ATTEMPTS))
+            db.execute("UPDATE jobs SET state = 'queued', lease_owner = NULL "
+                       "WHERE state = 'leased' AND lease_expires < ?", (now,))
+            rows = db.execute("SELECT id, path, sha256 FROM jobs WHERE state = 'queued' ORDER BY id LIMIT ?",
+                              (n,)).fetchall()
+            db.executemany("UPDATE jobs SET state = 'leased', lease_owner = ?, lease_expires = ?, "
+                           "attempts = attempts + 1 WHERE id = ?", [(owner, now + lease, r[0]) for r in rows])
+            return rows
+
+        return self._transaction(take)
+
+    def heartbeat(self, owner, ids, lease=DEFAULT_LEASE):
+        """Extend the lease on `ids` still held by `owner`. Returns the ids that were lost."""
+        if not ids:
+            return set()
+
+        def renew(db):
+            expires = time.time() + lease
+            held = set()
+            for job_id in ids:
+                if db.execute("UPDATE jobs SET lease_expires = ? WHERE id = ? AND state = 'leased' "
+                              "AND lease_owner = ?", (expires, job_id, owner)).rowcount:
+                    held.add(job_id)
+            return set(ids) - held
+
+        return self._transaction(renew)
+
+    def complete(self, owner, job_id, result, failed=False):
+        """Record a finished job; ignored (False) if the lease has passed to another node."""
+        return bool(self._transaction(lambda db: db.execute(
+            "UPDATE jobs SET state = ?, lease_owner = NULL, finished_at = ?, result = ? "
+            "WHERE id = ? AND state = 'leased' AND lease_owner = ?",
+            ("failed" if failed else "done", time.time(), result, job_id, owner)).rowcount))
+
+    def release(self, owner):
+        """Give back every job `owner` still holds (clean shutdown)."""
+        return self._transaction(lambda db: db.execute(
+            "UPDATE jobs SET state = 'queued', lease_owner = NULL, attempts = MAX(attempts - 1, 0) "
+            "WHERE state = 'leased' AND lease_owner = ?", (owner,)).rowcount)
+
+
+def run_worker(queue_path=DEFAULT_QUEUE_PATH, workers=None, claim_batch=DEFAULT_CLAIM_BATCH,
+               lease=DEFAULT_LEASE, idle_exit=True, poll_interval=5.0, sample_root=None,
+               string_limit=DEFAULT_STRING_LIMIT, string_sampling="top",
+               wall_time=DEFAULT_WALL_TIME, cpu_time=DEFAULT_CPU_TIME, rss_mb=DEFAULT_RSS_MB,
+               max_tasks=DEFAULT_MAX_TASKS, scheduler_options=None):
+    """
+    Claim, analyze and complete jobs until none is queued or leased to any
+    node (or forever with idle_exit=False): while other nodes hold leases the
+    worker keeps polling, so it can pick up their jobs if the leases expire.
+    Relative paths and SHA-256s are resolved against `sample_root`. Up to
+    2 x workers jobs are held at once, ordered by core.scheduler
+    (`scheduler_options`); a heartbeat thread renews their lease every
+    lease/3 seconds.
+    """
+    queue = WorkQueue(queue_path)
+    owner = node_id()
+    workers = workers or os.cpu_count() or 1
+    scheduler = Scheduler(workers, **(scheduler_options or {}))
+    in_flight = {}           # future -> (job id, path)
+    held = set()
+    held_lock = threading.Lock()
+    stop = threading.Event()
+    done = failed = lost = 0
+
+    def heartbeat():
+        while not stop.wait(lease / 3):
+            with held_lock:
+                ids = set(held)
+            try:
+                for job_id in queue.heartbeat(owner, ids, lease):
+                    print(f"[!] Lease on job {job_id} lost; another node will redo it")
+            except sqlite3.Error as e:
+                print(f"[!] Heartbeat failed: {e}")
+
+    beat = threading.Thread(target=heartbeat, daemon=True)
+    beat.start()
+    print(f"[+] Queue worker {owner} on {queue_path} ({workers} workers)")
+    start = time.perf_counter()
+    try:
+        with SupervisedPool(workers, wall_time=wall_time, cpu_time=cpu_time, rss_mb=rss_mb,
+                            string_limit=string_limit, string_sampling=string_sampling,
+                            max_tasks=max_tasks, scheduler=scheduler) as pool:
+            while True:
+                if len(in_flight) < workers * 2:
+                    jobs = queue.claim(owner, min(claim_batch, workers * 2 - len(in_flight)), lease)
+                    for job_id, path, sha256 in jobs:
+                        with held_lock:
+                            if job_id in held:   # our own lease expired and we re-claimed it: still running
+                                continue
+                        local = locate_job(path, sha256, sample_root)
+                        if local is None:
+                            print(f"[!] Job {job_id}: cannot resolve {path} (--sample-root {sample_root})")
+                            lost += not queue.complete(owner, job_id, f"not found under {sample_root}", failed=True)
+                            failed += 1
+                            continue
+                        with held_lock:
+                            held.add(job_id)
+                        in_flight[pool.submit(local, sha256)] = (job_id, local)
+                    if not in_flight:
+                        if idle_exit and not queue.pending():
+                            break
+                        time.sleep(poll_interval)
+                        continue
+                finished, _ = wait(list(in_flight), timeout=poll_interval, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    job_id, path = in_flight.pop(future)
+                    try:
+                        report = future.result()
+                        status = report.get("status")
+                        out = write_json_report(report)
+                        ok = queue.complete(owner, job_id, status or out, failed=status is not None)
+                        failed += status is not None
+                        done += status is None
+                    except Exception as e:
+                        ok = queue.complete(owner, job_id, f"{type(e).__name__}: {e}", failed=True)
+                        failed += 1
+                    lost += not ok
+                    with held_lock:
+                        held.discard(job_id)
+    except KeyboardInterrupt:
+        print("[+] Stopping queue worker...")
+    finally:
+        stop.set()
+        released = queue.release(owner)
+        queue.close()
+        scheduler.cost_model.save()
+    elapsed = time.perf_counter() - start
+    print(f"[+] Queue worker {owner}: {done} done, {failed} failed, {lost} finished after losing the lease, "
+          f"{released} released in {elapsed:.1f}s ({(done + failed) / elapsed if elapsed else 0:.1f} samples/s)")
+    if scheduler.latency_report():
+        print(scheduler.latency_report())
+    return done, failed
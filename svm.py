@@ -1,19 +1,19 @@
-# train_model.py
+# svm.py
 import os
-import re
-import math
-import joblib
+import json
+import time
+import argparse
 import logging
-from collections import Counter, defaultdict
 
 import numpy as np
 from sklearn.svm import SVC
-from sklearn.model_selection import train_test_split, StratifiedKFold, cross_val_score
+from sklearn.model_selection import StratifiedKFold, cross_val_score
 from sklearn.metrics import classification_report, confusion_matrix
 from sklearn.preprocessing import StandardScaler, LabelEncoder
-from sklearn.utils import resample
 
-from core.features import extract_features_from_file, PRIMARY_FEATURES
+from core.approx_svm import ApproxSVM, predict_proba_batched
+from core.features import PRIMARY_FEATURES
+from core.training import BASE_WIDTH, load_or_build_dataset, pipeline_version, publish_pipeline, split_holdout
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 
@@ -22,130 +22,112 @@ MODEL_PATH = "models/svm.pkl"
 RANDOM_STATE = 42
 
 
-def shannon_entropy(file_path):
-    try:
-        with open(file_path, "rb") as f:
-            data = f.read()
-        if not data:
-            return 0.0
-        counts = Counter(data)
-        probs = [c / len(data) for c in counts.values()]
-        return -sum(p * math.log2(p) for p in probs if p > 0)
-    except Exception:
-        return 0.0
-
-
-def extract_printable_strings(file_path, min_len=4):
-    try:
-        with open(file_path, "rb") as f:
-            raw = f.read().decode("latin1")
-        return re.findall(r'[\x20-\x7E]{%d,}' % min_len, raw)
-    except Exception:
-        return []
-
-
-def vectorize(feats, file_path):
-    combined = []
-
-    for key in ["HTTP", "FTP", "SMTP", "DNS",
-                "os.system", "subprocess", "eval", "exec",
-                "open", "socket", "shutil", "ctypes", "getenv"]:
-        if key in feats:
-            combined.extend([key] * feats.get(key, 0))
-
-    funcs = feats.get("functions", [])
-    imports = feats.get("imports", [])
-    combined.extend(funcs)
-    combined.extend(imports)
-
-    counts = [combined.count(f) for f in PRIMARY_FEATURES]
-
-    try:
-        file_size = os.path.getsize(file_path)
-    except Exception:
-        file_size = 0
+def build_exact_svm():
+    return SVC(
+        kernel="rbf",
+        C=3,
+        gamma="scale",
+        probability=True,
+        class_weight="balanced",
+        random_state=42,
+    )
 
-    entropy = shannon_entropy(file_path)
-    num_strings = len(feats.get("strings", [])) or len(extract_printable_strings(file_path))
-    num_imports = len(imports)
-    num_functions = len(funcs)
-    num_params = sum(len(p) for p in feats.get("params", {}).values()) if feats.get("params") else 0
 
-    return counts + [file_size, entropy, num_strings, num_imports, num_functions, num_params]
+def grow_corpus(X, y, n_samples, random_state=RANDOM_STATE):
+    """
+    Draw n_samples rows from the corpus. Beyond its real size rows are resampled
+    with slight jitter to emulate a larger corpus. Only grow a training side:
+    jittered copies on both sides of a split are near-duplicates.
+    """
+    rng = np.random.default_rng(random_state)
+    if n_samples <= len(X):
+        idx = rng.choice(len(X), size=n_samples, replace=False)
+        return X[idx], y[idx]
+    idx = rng.integers(0, len(X), size=n_samples)
+    jitter = rng.normal(0, 0.01, size=(n_samples, X.shape[1]))
+    return X[idx] + jitter, y[idx]
+
+
+def benchmark(X_train, y_train, X_test, y_test, sizes, n_components):
+    """
+    Fit the exact SVC and the approximation on the training rows grown to each
+    size, and score both on the same real held-out rows, never grown.
+    """
+    logging.info("[+] Benchmarking exact SVC vs approximate SVM (%d kernel components, %d real held-out samples)",
+                 n_components, len(y_test))
+    header = f"{'train':>9} {'model':<8} {'fit s':>9} {'acc':>7} {'ms/sample@batch':>16}"
+    lines = [header, "-" * len(header)]
+    for n in sizes:
+        X_n, y_n = grow_corpus(X_train, y_train, n)
+        for name, model in (("exact", build_exact_svm()),
+                            ("approx", ApproxSVM(n_components=n_components, class_weight="balanced"))):
+            start = time.perf_counter()
+            model.fit(X_n, y_n)
+            fit_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            proba = predict_proba_batched(model, X_test)
+            infer_ms = (time.perf_counter() - start) * 1000 / len(X_test)
+            acc = float((model.classes_[np.argmax(proba, axis=1)] == y_test).mean())
+            lines.append(f"{n:>9} {name:<8} {fit_time:>9.2f} {acc:>7.4f} {infer_ms:>16.4f}")
+    logging.info("\n%s", "\n".join(lines))
 
 
 def main():
-    X = []
-    y = []
-
-    logging.info("[+] Scanning dataset: %s", BASE_DIR)
-    if not os.path.isdir(BASE_DIR):
-        logging.error("[!] Dataset folder not found")
+    parser = argparse.ArgumentParser(description="Train the SVM malware family model")
+    parser.add_argument("--mode", choices=["exact", "approx"], default="exact",
+                        help="exact: RBF SVC (default); approx: kernel approximation + linear SVM, "
+                             "for corpora beyond a few tens of thousands of samples")
+    parser.add_argument("--kernel-map", choices=["nystroem", "fourier"], default="nystroem",
+                        help="Kernel approximation used by --mode approx")
+    parser.add_argument("--components", type=int, default=300,
+                        help="Kernel approximation components for --mode approx (default: 300)")
+    parser.add_argument("--no-cv", action="store_true", help="Skip 10-fold cross-validation")
+    parser.add_argument("--benchmark", type=int, nargs="*", metavar="N",
+                        help="Compare exact and approx fit/inference time at these training set sizes "
+                             "(default: the real training split) and exit; accuracy is on the real held-out rows")
+    parser.add_argument("--jobs", type=int, default=-1,
+                        help="Parallel CV jobs (default: all cores; use 1 under the VS Code debugger)")
+    parser.add_argument("--reuse-matrix", action="store_true",
+                        help="Use the stored training matrix instead of re-extracting the dataset")
+    args = parser.parse_args()
+
+    X, y = load_or_build_dataset(BASE_DIR, reuse=args.reuse_matrix)
+    if X is None:
         return
 
-    for family in os.listdir(BASE_DIR):
-        family_dir = os.path.join(BASE_DIR, family)
-        if not os.path.isdir(family_dir):
-            continue
-        for fname in os.listdir(family_dir):
-            file_path = os.path.join(family_dir, fname)
-            try:
-                feats = extract_features_from_file(file_path)
-                if not feats or not isinstance(feats, dict):
-                    continue
-                vec = vectorize(feats, file_path)
-                X.append(vec)
-                y.append(family)
-            except Exception as e:
-                logging.warning("[!] Skipped %s: %s", file_path, e)
-
-    if not X:
-        logging.error("[!] No valid features found")
-        return
-
-    X = np.array(X)
-    y = np.array(y)
-    logging.info("[+] Collected %d samples across %d classes", len(y), len(set(y)))
-
-    # Balance
-    by_label = defaultdict(list)
-    for xv, label in zip(X, y):
-        by_label[label].append(xv)
-
-    max_count = max(len(lst) for lst in by_label.values())
-    X_balanced, y_balanced = [], []
-    for label, items in by_label.items():
-        items_res = resample(items, replace=True, n_samples=max_count, random_state=RANDOM_STATE) \
-            if len(items) < max_count else items
-        X_balanced.extend(items_res)
-        y_balanced.extend([label] * len(items_res))
-
-    X = np.array(X_balanced)
-    y_str = np.array(y_balanced)
-    logging.info("[+] Balanced dataset to %d per class (total %d)", max_count, len(y_str))
+    # Hold out real samples first; class weights balance the families instead of
+    # oversampling, which would put copies of training rows in the held-out set
+    train_idx, test_idx = split_holdout(y, random_state=RANDOM_STATE)
+    logging.info("[+] Training on %d samples (%d held out), classes weighted by inverse frequency",
+                 len(train_idx), len(test_idx))
 
     # Encode + scale
     label_encoder = LabelEncoder()
-    y = label_encoder.fit_transform(y_str)
+    y = label_encoder.fit_transform(y)
     scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
+    X_train = scaler.fit_transform(X[train_idx])
+    X_test = scaler.transform(X[test_idx])
+    y_train, y_test = y[train_idx], y[test_idx]
+    X_scaled = scaler.transform(X)
 
-    X_train, X_test, y_train, y_test = train_test_split(
-        X_scaled, y, test_size=0.2, stratify=y, random_state=RANDOM_STATE
-    )
+    if args.benchmark is not None:
+        benchmark(X_train, y_train, X_test, y_test, args.benchmark or [len(y_train)], args.components)
+        return
 
     # --------------------------
     #      SVM MODEL HERE
     # --------------------------
-    logging.info("[+] Training SVM classifier (RBF kernel)...")
-    model = SVC(
-        kernel="rbf",
-        C=3,
-        gamma="scale",
-        probability=True,
-        random_state=42,
-    )
+    if args.mode == "approx":
+        logging.info("[+] Training approximate SVM (%s, %d components, SGD linear SVM)...",
+                     args.kernel_map, args.components)
+        model = ApproxSVM(kernel_map=args.kernel_map, n_components=args.components, class_weight="balanced")
+    else:
+        logging.info("[+] Training SVM classifier (RBF kernel)...")
+        model = build_exact_svm()
+    start = time.perf_counter()
     model.fit(X_train, y_train)
+    logging.info("[+] Fit took %.2fs", time.perf_counter() - start)
 
     # Evaluate
     y_pred = model.predict(X_test)
@@ -156,30 +138,28 @@ def main():
     logging.info("[+] Confusion matrix:\n%s", cm)
 
     # 10-fold Cross-validation
-    logging.info("[+] Running 10-fold cross-validation...")
-
-    cv = StratifiedKFold(n_splits=10, shuffle=True, random_state=RANDOM_STATE)
-
-# Use n_jobs=1 to avoid debugpy issues in VS Code
-    scores = cross_val_score(
-        model,
-        X_scaled,
-        y,
-        cv=cv,
-        scoring="accuracy",
-        n_jobs=1
-    )
+    if not args.no_cv:
+        logging.info("[+] Running 10-fold cross-validation...")
 
-    logging.info("[+] 10-fold CV accuracy: %.4f ± %.4f", scores.mean(), scores.std())
+        cv = StratifiedKFold(n_splits=10, shuffle=True, random_state=RANDOM_STATE)
+        scores = cross_val_score(
+            model,
+            X_scaled,
+            y,
+            cv=cv,
+            scoring="accuracy",
+            n_jobs=args.jobs
+        )
 
+        logging.info("[+] 10-fold CV accuracy: %.4f ± %.4f", scores.mean(), scores.std())
 
     # Save
-    os.makedirs(os.path.dirname(MODEL_PATH) or ".", exist_ok=True)
-    joblib.dump({"model": model, "scaler": scaler, "label_encoder": label_encoder}, MODEL_PATH)
-    logging.info("[+] Saved pipeline to %s", MODEL_PATH)
+    version = pipeline_version(MODEL_PATH) + 1
+    publish_pipeline({"model": model, "scaler": scaler, "label_encoder": label_encoder,
+                      "version": version, "base_width": BASE_WIDTH, "opcode_ngram_width": 0}, MODEL_PATH)
+    logging.info("[+] Saved pipeline v%d to %s", version, MODEL_PATH)
 
     # Save PRIMARY_FEATURES
-    import json
     features_path = os.path.join(os.path.dirname(MODEL_PATH), "primary_features.json")
     with open(features_path, "w") as f:
         json.dump(PRIMARY_FEATURES, f)
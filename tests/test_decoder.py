@@ -0,0 +1,36 @@
+import base64
+import marshal
+import zlib
+
+from core.decoder import decode_layers
+
+
+def _dropper(payload):
+    return b'import marshal, base64\nexec(marshal.loads(base64.b64decode("' + base64.b64encode(payload) + b'")))\n'
+
+
+def test_marshal_dumps_of_compile_is_decoded():
+    # marshal.dumps(compile(...)) writes the plain b"c" type byte
+    payload = marshal.dumps(compile("import socket\nhost = 'evil.example'\nsocket.create_connection(host)", "x", "exec"))
+    assert payload[:1] == b"c"
+    layers = decode_layers(_dropper(payload))
+    assert [layer.encoding for layer in layers] == ["base64", "marshal"]
+    assert b"evil.example" in layers[-1].data
+
+
+def test_referenced_code_object_is_decoded():
+    # a code object with other references is written with FLAG_REF: b"\xe3"
+    code = compile("import os\nos.system('id')", "x", "exec")
+    blob = marshal.dumps(code)
+    assert blob[:1] == b"\xe3"
+    layers = decode_layers(_dropper(blob))
+    assert layers and layers[-1].encoding == "marshal"
+    assert b"system" in layers[-1].data
+
+
+def test_text_starting_with_c_is_not_taken_for_marshal():
+    text = b"class Loader:\n    url = 'http://evil.example/payload'\n" * 2
+    layers = decode_layers(b'exec(zlib.decompress(base64.b64decode("'
+                           + base64.b64encode(zlib.compress(text)) + b'")))')
+    assert [layer.encoding for layer in layers] == ["base64", "zlib"]
+    assert layers[-1].data == text
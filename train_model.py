@@ -1,157 +1,105 @@
 # train_model.py
 import os
-import re
-import math
-import joblib
+import json
+import argparse
 import logging
-from collections import Counter, defaultdict
 
-import numpy as np
+try:
+    import resource
+except ImportError:  # not available on Windows; the peak RSS line is then skipped
+    resource = None
+
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split, StratifiedKFold, cross_val_score
+from sklearn.model_selection import StratifiedKFold, cross_val_score
 from sklearn.metrics import classification_report, confusion_matrix
 from sklearn.preprocessing import StandardScaler, LabelEncoder
-from sklearn.utils import resample
 
-from core.features import extract_features_from_file, PRIMARY_FEATURES  # Import primary features
+from core.features import PRIMARY_FEATURES  # Import primary features
+from core.feature_index import (DEFAULT_MIN_DF, DEFAULT_TOP_K, EXTENDED_FEATURES_PATH, ExtendedFeatures,
+                                load_extended_features, save_extended_features)
+from core.incremental import DEFAULT_CHUNK_ROWS, DEFAULT_EPOCHS, incremental_models, train_incremental, training_rows
+from core.model_selection import candidate_models, evaluate_candidates, format_leaderboard
+from core.opcodes import DEFAULT_WIDTH as OPCODE_WIDTH
+from core.training import (BASE_WIDTH, ExtendedSelection, build_dataset_on_disk, holdout_record,
+                           load_or_build_dataset, load_training_matrix, pipeline_version, publish_pipeline,
+                           split_holdout)
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 
 BASE_DIR = "dataset"
 MODEL_PATH = "models/malware_pipeline.pkl"
+INCREMENTAL_MODEL_PATH = "models/incremental_pipeline.pkl"   # --out-of-core default: never the production model
 RANDOM_STATE = 42
 
 
-def shannon_entropy(file_path):
-    try:
-        with open(file_path, "rb") as f:
-            data = f.read()
-        if not data:
-            return 0.0
-        counts = Counter(data)
-        probs = [c / len(data) for c in counts.values()]
-        return -sum(p * math.log2(p) for p in probs if p > 0)
-    except Exception:
-        return 0.0
+def select_model(X, y, names, n_jobs):
+    """Compare every candidate model on one shared feature matrix and print a leaderboard."""
+    label_encoder = LabelEncoder()
+    y_enc = label_encoder.fit_transform(y)
 
+    # Selection runs on the raw (unbalanced) matrix with class weights: oversampled
+    # duplicates would leak between OOB/CV folds and inflate the scores. The split
+    # is train()'s, whose held-out rows never took part in choosing extended features.
+    train_idx, test_idx = split_holdout(y, random_state=RANDOM_STATE)
+    y_train, y_test = y_enc[train_idx], y_enc[test_idx]
+    scaler = StandardScaler()
+    X_train = scaler.fit_transform(X[train_idx])
+    X_test = scaler.transform(X[test_idx])
 
-def extract_printable_strings(file_path, min_len=4):
-    try:
-        with open(file_path, "rb") as f:
-            raw = f.read().decode("latin1")
-        return re.findall(r'[\x20-\x7E]{%d,}' % min_len, raw)
-    except Exception:
-        return []
+    rows = evaluate_candidates(X_train, y_train, X_test, y_test, names=names,
+                               n_jobs=n_jobs, random_state=RANDOM_STATE)
+    logging.info("[+] Model leaderboard (%d train / %d held-out samples):\n%s",
+                 len(y_train), len(y_test), format_leaderboard(rows))
 
 
-def vectorize(feats, file_path):
+def extended_features(args, rows=None):
     """
-    Build numeric vector for a sample.
-    - Count occurrences of PRIMARY_FEATURES from combined keys
-    - Add derived features: file size, entropy, num_strings, num_imports, num_functions
+    (extended, selection) for --extended-features K: the saved list when
+    --reuse-matrix and it has K tokens, else an ExtendedSelection that picks
+    them from the training rows (`rows(y)`, default: train()'s split) during
+    extraction. (None, None) without the option.
     """
-    combined = []
-
-    # Flatten features into a list for counting primary features
-    for key in ["HTTP", "FTP", "SMTP", "DNS",
-                "os.system", "subprocess", "eval", "exec",
-                "open", "socket", "shutil", "ctypes", "getenv"]:
-        if key in feats:
-            combined.extend([key] * feats.get(key, 0))
-
-    # Count functions and imports (optional)
-    funcs = feats.get("functions", [])
-    imports = feats.get("imports", [])
-    combined.extend(funcs)
-    combined.extend(imports)
-
-    # Vectorize primary features
-    counts = [combined.count(f) for f in PRIMARY_FEATURES]
-
-    # Derived numeric features
-    try:
-        file_size = os.path.getsize(file_path)
-    except Exception:
-        file_size = 0
-
-    entropy = shannon_entropy(file_path)
-
-    # Number of strings
-    num_strings = len(feats.get("strings", [])) or len(extract_printable_strings(file_path))
-
-    # Number of imports / functions
-    num_imports = len(imports)
-    num_functions = len(funcs)
-    num_params = sum(len(p) for p in feats.get("params", {}).values()) if feats.get("params") else 0
-
-    # Final vector
-    return counts + [file_size, entropy, num_strings, num_imports, num_functions, num_params]
-
-
-def main():
-    X = []
-    y = []
-
-    logging.info("[+] Scanning dataset: %s", BASE_DIR)
-    if not os.path.isdir(BASE_DIR):
-        logging.error("[!] Dataset folder not found")
-        return
-
-    for family in os.listdir(BASE_DIR):
-        family_dir = os.path.join(BASE_DIR, family)
-        if not os.path.isdir(family_dir):
-            continue
-        for fname in os.listdir(family_dir):
-            file_path = os.path.join(family_dir, fname)
-            try:
-                feats = extract_features_from_file(file_path)
-                if not feats or not isinstance(feats, dict):
-                    continue
-                vec = vectorize(feats, file_path)
-                X.append(vec)
-                y.append(family)
-            except Exception as e:
-                logging.warning("[!] Skipped %s: %s", file_path, e)
-
-    if not X:
-        logging.error("[!] No valid features found")
-        return
-
-    X = np.array(X)
-    y = np.array(y)
-    logging.info("[+] Collected %d samples across %d classes", len(y), len(set(y)))
-
-    # --- Balance classes ---
-    by_label = defaultdict(list)
-    for xv, label in zip(X, y):
-        by_label[label].append(xv)
-
-    max_count = max(len(lst) for lst in by_label.values())
-    X_balanced, y_balanced = [], []
-    for label, items in by_label.items():
-        items_res = resample(items, replace=True, n_samples=max_count, random_state=RANDOM_STATE) \
-            if len(items) < max_count else items
-        X_balanced.extend(items_res)
-        y_balanced.extend([label] * len(items_res))
+    if not args.extended_features:
+        return None, None
+    if args.reuse_matrix:
+        tokens = load_extended_features()
+        if len(tokens) == args.extended_features:
+            logging.info("[+] Using the %d extended features in %s", len(tokens), EXTENDED_FEATURES_PATH)
+            return ExtendedFeatures(tokens), None
+    return None, ExtendedSelection(args.extended_features, args.min_df, rows)
+
+
+def save_selection(selection):
+    """Store an ExtendedSelection's tokens once the build made it; returns its ExtendedFeatures."""
+    save_extended_features(selection.entries, selection.documents)
+    logging.info("[+] Saved %d extended features to %s; most informative: %s", len(selection.entries),
+                 EXTENDED_FEATURES_PATH,
+                 ", ".join(f"{e['kind']}:{e['token']!r}" for e in selection.entries[:5]))
+    return selection.features
+
+
+def train(X, y, n_jobs, run_cv, opcode_width=0, extended=None):
+    label_encoder = LabelEncoder()
+    label_encoder.fit(y)
 
-    X = np.array(X_balanced)
-    y_str = np.array(y_balanced)
-    logging.info("[+] Balanced dataset to %d per class (total %d)", max_count, len(y_str))
+    # Hold out real samples; class weights balance the families instead of
+    # oversampling, so every training row is distinct and the OOB estimate honest
+    train_idx, test_idx = split_holdout(y, random_state=RANDOM_STATE)
+    logging.info("[+] Training on %d samples (%d held out), classes weighted by inverse frequency",
+                 len(train_idx), len(test_idx))
 
     # Encode and scale
-    label_encoder = LabelEncoder()
-    y = label_encoder.fit_transform(y_str)
     scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
-
-    # Train/test split
-    X_train, X_test, y_train, y_test = train_test_split(
-        X_scaled, y, test_size=0.2, stratify=y, random_state=RANDOM_STATE
-    )
+    X_train = scaler.fit_transform(X[train_idx])
+    y_train = label_encoder.transform(y[train_idx])
+    X_test = scaler.transform(X[test_idx])
+    y_test = label_encoder.transform(y[test_idx])
 
     logging.info("[+] Training RandomForestClassifier...")
-    model = RandomForestClassifier(n_estimators=200, n_jobs=-1, random_state=RANDOM_STATE)
+    model = RandomForestClassifier(n_estimators=200, oob_score=True, class_weight="balanced", n_jobs=n_jobs,
+                                   random_state=RANDOM_STATE)
     model.fit(X_train, y_train)
+    logging.info("[+] Out-of-bag accuracy: %.4f", model.oob_score_)
 
     # Evaluate
     y_pred = model.predict(X_test)
@@ -161,31 +109,122 @@ def main():
     cm = confusion_matrix(y_test_names, y_pred_names, labels=label_encoder.classes_)
     logging.info("[+] Confusion matrix:\n%s", cm)
 
-    # Cross-validation
-    # 10-Fold Cross-Validation
-    logging.info("[+] Running 10-fold cross-validation...")
-    cv = StratifiedKFold(n_splits=10, shuffle=True, random_state=RANDOM_STATE)
-
-    # Use n_jobs=1 because VS Code debugger crashes with multiprocessing
-    scores = cross_val_score(model, X_scaled, y, cv=cv, scoring="accuracy", n_jobs=1)
-
-    logging.info("[+] 10-fold CV accuracy: %.4f ± %.4f", scores.mean(), scores.std())
-
-    
-
+    # 10-Fold Cross-Validation (the OOB estimate above makes this optional)
+    if run_cv:
+        logging.info("[+] Running 10-fold cross-validation...")
+        cv = StratifiedKFold(n_splits=10, shuffle=True, random_state=RANDOM_STATE)
+        # on the unbalanced matrix: oversampled copies would land in both sides of a fold
+        scores = cross_val_score(model, scaler.transform(X), label_encoder.transform(y), cv=cv,
+                                 scoring="accuracy", n_jobs=n_jobs)
+        logging.info("[+] 10-fold CV accuracy: %.4f ± %.4f", scores.mean(), scores.std())
 
     # Save pipeline
-    os.makedirs(os.path.dirname(MODEL_PATH) or ".", exist_ok=True)
-    joblib.dump({"model": model, "scaler": scaler, "label_encoder": label_encoder}, MODEL_PATH)
-    logging.info("[+] Saved pipeline to %s", MODEL_PATH)
+    version = pipeline_version(MODEL_PATH) + 1
+    publish_pipeline({"model": model, "scaler": scaler, "label_encoder": label_encoder,
+                      "version": version, "base_width": BASE_WIDTH,
+                      "opcode_ngram_width": opcode_width,
+                      "extended_features": extended.tokens if extended else [],
+                      "held_out": holdout_record(X, y, test_idx)}, MODEL_PATH)
+    logging.info("[+] Saved pipeline v%d to %s", version, MODEL_PATH)
 
     # Save PRIMARY_FEATURES for later use
-    import json
     features_path = os.path.join(os.path.dirname(MODEL_PATH), "primary_features.json")
     with open(features_path, "w") as f:
         json.dump(PRIMARY_FEATURES, f)
     logging.info("[+] Saved PRIMARY_FEATURES to %s", features_path)
 
 
+def train_out_of_core(args):
+    """
+    Stream the dataset into the memory-mapped training matrix (or reuse it)
+    and train an incremental model on it; memory stays bounded by --chunk-rows.
+    """
+    # extended features come from train_incremental()'s own training rows
+    extended, selection = extended_features(args, lambda y: training_rows(len(y), random_state=RANDOM_STATE))
+    X = y = None
+    width = BASE_WIDTH + args.opcode_ngrams + len(extended or ())
+    if args.reuse_matrix and selection is None:
+        X, y = load_training_matrix(mmap=True)
+        if X is not None and X.shape[1] != width:
+            logging.info("[+] Stored training matrix has %d columns, expected %d; re-extracting",
+                         X.shape[1], width)
+            X = y = None
+    if X is None:
+        X, y = build_dataset_on_disk(BASE_DIR, args.opcode_ngrams, chunk_rows=args.chunk_rows,
+                                     extended=extended, selection=selection)
+        if X is None:
+            return
+        if selection:
+            extended = save_selection(selection)
+    logging.info("[+] Training %s out of core on %d x %d (chunks of %d rows, %d epochs)",
+                 args.incremental_model, X.shape[0], X.shape[1], args.chunk_rows, args.epochs)
+
+    model, scaler, label_encoder, metrics = train_incremental(
+        X, y, args.incremental_model, epochs=args.epochs, chunk_rows=args.chunk_rows, random_state=RANDOM_STATE)
+    logging.info("[+] Holdout accuracy %.4f, balanced accuracy %.4f (%d samples)",
+                 metrics["accuracy"], metrics["balanced_accuracy"], metrics["holdout_samples"])
+    logging.info("[+] Confusion matrix (%s):\n%s", ", ".join(label_encoder.classes_), metrics["confusion_matrix"])
+
+    version = pipeline_version(args.output) + 1
+    publish_pipeline({"model": model, "scaler": scaler, "label_encoder": label_encoder,
+                      "version": version, "base_width": BASE_WIDTH,
+                      "opcode_ngram_width": args.opcode_ngrams,
+                      "extended_features": extended.tokens if extended else []}, args.output)
+    logging.info("[+] Saved pipeline v%d to %s", version, args.output)
+    if resource is not None:
+        logging.info("[+] Peak RSS: %.1f MB", resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train or compare malware family models")
+    parser.add_argument("--select", action="store_true",
+                        help="Compare all candidate models and print a leaderboard instead of training")
+    parser.add_argument("--models", nargs="+", choices=sorted(candidate_models()),
+                        help="Restrict --select to these candidates")
+    parser.add_argument("--jobs", type=int, default=-1,
+                        help="Parallel jobs (default: all cores; use 1 under the VS Code debugger)")
+    parser.add_argument("--cv", action="store_true", help="Also run 10-fold cross-validation")
+    parser.add_argument("--reuse-matrix", action="store_true",
+                        help="Use the stored training matrix instead of re-extracting the dataset")
+    parser.add_argument("--opcode-ngrams", type=int, nargs="?", const=OPCODE_WIDTH, default=0, metavar="WIDTH",
+                        help=f"Append hashed opcode 1-3-gram features (default width: {OPCODE_WIDTH})")
+    parser.add_argument("--extended-features", type=int, nargs="?", const=DEFAULT_TOP_K, default=0, metavar="K",
+                        help=f"Index the training split's strings and imports and append presence columns for "
+                             f"the K most family-informative ones (default K: {DEFAULT_TOP_K}; saved to "
+                             f"{EXTENDED_FEATURES_PATH})")
+    parser.add_argument("--min-df", type=int, default=DEFAULT_MIN_DF,
+                        help=f"Samples a token must appear in to be an extended feature (default: {DEFAULT_MIN_DF})")
+    ooc = parser.add_argument_group("out-of-core training (corpora larger than memory)")
+    ooc.add_argument("--out-of-core", action="store_true",
+                     help="Stream features to a memory-mapped matrix and train an incremental model on it")
+    ooc.add_argument("--incremental-model", choices=sorted(incremental_models()), default="sgd",
+                     help="sgd: logistic regression by SGD (default); nb: Gaussian naive Bayes")
+    ooc.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS,
+                     help=f"Rows held in memory at a time (default: {DEFAULT_CHUNK_ROWS})")
+    ooc.add_argument("--epochs", type=int, default=DEFAULT_EPOCHS,
+                     help=f"Passes over the matrix (default: {DEFAULT_EPOCHS})")
+    ooc.add_argument("--output", default=INCREMENTAL_MODEL_PATH,
+                     help=f"Where the pipeline is published (default: {INCREMENTAL_MODEL_PATH}, to add to "
+                          f"models/ensemble.json; only an explicit {MODEL_PATH} replaces the production model)")
+    args = parser.parse_args()
+
+    if args.out_of_core:
+        train_out_of_core(args)
+        return
+
+    extended, selection = extended_features(args)
+    X, y = load_or_build_dataset(BASE_DIR, reuse=args.reuse_matrix, opcode_width=args.opcode_ngrams,
+                                 extended=extended, selection=selection)
+    if X is None:
+        return
+    if selection:
+        extended = save_selection(selection)
+
+    if args.select:
+        select_model(X, y, args.models, args.jobs)
+    else:
+        train(X, y, args.jobs, args.cv, args.opcode_ngrams, extended)
+
+
 if __name__ == "__main__":
     main()
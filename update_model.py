@@ -0,0 +1,121 @@
+# update_model.py
+"""
+Grow the published RandomForest with a handful of new samples instead of retraining.
+
+    python update_model.py --family XWorm new_samples/ extra.exe
+
+New vectors are appended to the stored training matrix (models/training_X.npy,
+written by train_model.py), extra trees are fitted with warm_start and the
+pipeline is republished atomically with its version bumped.
+"""
+import os
+import argparse
+import logging
+
+import joblib
+import numpy as np
+from sklearn.utils.class_weight import compute_class_weight
+
+from core.features import extract_features_from_file
+from core.feature_index import ExtendedFeatures
+from core.training import (balance_classes, load_training_matrix, save_training_matrix, vectorize,
+                           publish_pipeline)
+from train_model import MODEL_PATH, RANDOM_STATE
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+
+def iter_sample_paths(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for fname in sorted(os.listdir(path)):
+                full_path = os.path.join(path, fname)
+                if os.path.isfile(full_path):
+                    yield full_path
+        elif os.path.isfile(path):
+            yield path
+        else:
+            logging.warning("[!] Not found: %s", path)
+
+
+def vectorize_samples(paths, opcode_width=0, extended=None):
+    X = []
+    for file_path in iter_sample_paths(paths):
+        try:
+            feats = extract_features_from_file(file_path)
+            if not feats or not isinstance(feats, dict):
+                continue
+            X.append(vectorize(feats, file_path, opcode_width, extended))
+        except Exception as e:
+            logging.warning("[!] Skipped %s: %s", file_path, e)
+    return X
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally update the malware family model")
+    parser.add_argument("--family", required=True, help="Family label of the new samples")
+    parser.add_argument("--trees", type=int, default=20, help="Number of trees to add (default: 20)")
+    parser.add_argument("--model", default=MODEL_PATH, help="Pipeline to update")
+    parser.add_argument("paths", nargs="+", help="Sample files or directories")
+    args = parser.parse_args()
+
+    pipeline = joblib.load(args.model)
+    model = pipeline["model"]
+    scaler = pipeline["scaler"]
+    label_encoder = pipeline["label_encoder"]
+
+    if args.family not in label_encoder.classes_:
+        logging.error("[!] Unknown family %r (known: %s). A new class needs a full train_model.py run.",
+                      args.family, ", ".join(label_encoder.classes_))
+        return
+
+    X_old, y_old = load_training_matrix()
+    if X_old is None:
+        logging.error("[!] No stored training matrix found. Run train_model.py once first.")
+        return
+
+    X_new = vectorize_samples(args.paths, pipeline.get("opcode_ngram_width", 0),
+                              ExtendedFeatures(pipeline.get("extended_features", ())))
+    if not X_new:
+        logging.error("[!] No valid features found in the new samples")
+        return
+    X_new = np.array(X_new, dtype=np.float64)
+    if X_new.shape[1] != X_old.shape[1]:
+        logging.error("[!] Vector width changed (%d != %d). Retrain with train_model.py.",
+                      X_new.shape[1], X_old.shape[1])
+        return
+
+    X = np.concatenate([X_old, X_new])
+    y = np.concatenate([y_old, np.array([args.family] * len(X_new))])
+
+    # The scaler stays fixed: refitting it would shift the inputs of the existing trees.
+    # Forests trained with class_weight="balanced" keep weighting; older ones were fitted on oversampled rows.
+    X_fit, y_fit = X, y
+    if getattr(model, "class_weight", None) is None:
+        X_fit, y_fit, _ = balance_classes(X, y, random_state=RANDOM_STATE)
+    X_scaled = scaler.transform(X_fit)
+    y_enc = label_encoder.transform(y_fit)
+    if getattr(model, "class_weight", None) is not None:
+        # "balanced" weights of the grown matrix as a fixed dict: sklearn warns on the preset with warm_start
+        classes = np.unique(y_enc)
+        model.set_params(class_weight=dict(zip(classes, compute_class_weight("balanced", classes=classes, y=y_enc))))
+
+    old_trees = model.n_estimators
+    model.set_params(warm_start=True, n_estimators=old_trees + args.trees)
+    model.fit(X_scaled, y_enc)
+    model.set_params(warm_start=False)
+    logging.info("[+] Grew forest from %d to %d trees", old_trees, model.n_estimators)
+
+    pipeline["version"] = pipeline.get("version", 1) + 1
+    # the new trees were fitted on train()'s held-out rows too: there is no held-out set any more
+    pipeline.pop("held_out", None)
+    publish_pipeline(pipeline, args.model)
+    logging.info("[+] Published pipeline v%d to %s", pipeline["version"], args.model)
+
+    # Only now: a failed fit or publish must not leave the samples appended, or a rerun adds them twice
+    save_training_matrix(X, y)
+    logging.info("[+] Appended %d samples to the training matrix (total %d)", len(X_new), len(y))
+
+
+if __name__ == "__main__":
+    main()